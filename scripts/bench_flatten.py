@@ -0,0 +1,50 @@
+"""Compare flatten_dict with the compiled Flattener (dict and Sample output) on typical poll payloads.
+
+Usage: python scripts/bench_flatten.py [--number N]
+"""
+import argparse
+import timeit
+from dvm_mesura.core.helpers import Flattener, flatten_dict
+
+P1_PAYLOAD = {
+    "wifi_ssid": "home", "wifi_strength": 72, "smr_version": 50, "meter_model": "ISKRA 2M550T-1012",
+    "unique_id": "00112233445566778899AABBCCDDEEFF", "active_tariff": 2,
+    "total_power_import_kwh": 13779.338, "total_power_import_t1_kwh": 10830.511,
+    "total_power_import_t2_kwh": 2948.827, "total_power_export_kwh": 0.0,
+    "total_power_export_t1_kwh": 0.0, "total_power_export_t2_kwh": 0.0,
+    "active_power_w": -543, "active_power_l1_w": -676, "active_power_l2_w": 133, "active_power_l3_w": 0,
+    "active_voltage_l1_v": 235.4, "active_voltage_l2_v": 234.9, "active_voltage_l3_v": 236.1,
+    "active_current_a": 2.5, "active_current_l1_a": -2.9, "active_current_l2_a": 0.6, "active_current_l3_a": 0.0,
+    "voltage_sag_l1_count": 1, "voltage_swell_l1_count": 0, "any_power_fail_count": 4,
+    "long_power_fail_count": 5, "total_gas_m3": 2569.646, "gas_timestamp": 210606140010,
+    "external": [{"unique_id": "0001", "type": "gas_meter", "timestamp": 210606140010, "value": 2569.646, "unit": "m3"}],
+}
+
+WEATHER_PAYLOAD = {
+    "lat": 50.8317, "lon": 5.7671, "timezone": "Europe/Amsterdam", "timezone_offset": 3600,
+    "current": {
+        "dt": 1700000000, "sunrise": 1699943000, "sunset": 1699977000, "temp": 283.15, "feels_like": 282.1,
+        "pressure": 1013, "humidity": 81, "dew_point": 280.0, "uvi": 0.3, "clouds": 75, "visibility": 10000,
+        "wind_speed": 4.1, "wind_deg": 220, "wind_gust": 8.2,
+        "weather": [{"id": 803, "main": "Clouds", "description": "broken clouds", "icon": "04d"}],
+        "rain": {"1h": 0.21},
+    },
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark payload flattening")
+    parser.add_argument("--number", type=int, default=100_000, help="Payloads flattened per measurement")
+    args = parser.parse_args()
+
+    for name, payload, exclude in (("P1", P1_PAYLOAD, {"external"}), ("OpenWeatherMap", WEATHER_PAYLOAD, None)):
+        flattener = Flattener(exclude)
+        assert flattener(payload) == flatten_dict(payload, exclude) == flattener(payload)
+        generic = min(timeit.repeat(lambda: flatten_dict(payload, exclude), number=args.number, repeat=3))
+        compiled = min(timeit.repeat(lambda: flattener(payload), number=args.number, repeat=3))
+        sample = min(timeit.repeat(lambda: flattener.sample(payload), number=args.number, repeat=3))
+        print(f"{name:15} flatten_dict {generic / args.number * 1e6:6.2f} us  "
+              f"Flattener {compiled / args.number * 1e6:6.2f} us ({generic / compiled:.1f}x)  "
+              f"Flattener.sample {sample / args.number * 1e6:6.2f} us ({generic / sample:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,177 @@
 from __future__ import annotations
 import asyncio
 import csv
+import gzip
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, TextIO
 from ..core.base import Backend
 
+class CSVFile:
+    """The open, live ``<source>.csv`` of one source."""
+
+    def __init__(self, path: Path, handle: TextIO, fieldnames: List[str], day: str):
+        self.path = path
+        self.handle = handle
+        self.fieldnames = fieldnames
+        self.writer = csv.DictWriter(handle, fieldnames=fieldnames, restval="")
+        self.day = day
+
 class CSVBackend(Backend):
-    """CSV backend with separate files per source."""
-    
-    def __init__(self, data_dir: str | Path):
+    """CSV backend with separate files per source.
+
+    Each source is appended to ``<source>.csv`` through a handle that stays
+    open; buffered rows are flushed every ``flush_interval`` seconds and on
+    close. The header is cached per source: rows missing a column get an
+    empty cell, while a row with new columns rotates the file so the new
+    header starts a fresh file.
+
+    With ``rotate`` the live file is also rotated when the first row of a
+    new (UTC) day arrives. Rotated files are named
+    ``<source>.<YYYY-MM-DD>[.<n>].csv`` and gzipped in the background.
+    """
+
+    def __init__(self, data_dir: str | Path, flush_interval: float = 5.0, rotate: bool = True,
+                 compress: bool = True, buffer_size: int = 64 * 1024):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.rotate = rotate
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self._files: Dict[str, CSVFile] = {}
+        self._lock = threading.Lock()
+        self._compressors: List[threading.Thread] = []
+        self._flush_task: asyncio.Task | None = None
+        if compress:
+            # Archives left uncompressed by an earlier run
+            for path in self.data_dir.glob("*.[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*.csv"):
+                self._compress_later(path)
 
     async def write(self, data: Dict[str, Any], source_name: str) -> None:
         """Write data to a CSV file named after the source_name."""
-        csv_path = self.data_dir / f"{source_name}.csv"
-        file_exists = csv_path.exists()
-        
         try:
-            # We use to_thread for file I/O to avoid blocking the event loop
-            await asyncio.to_thread(self._sync_write, data, csv_path, file_exists)
+            await self.write_many([data], source_name)
         except Exception as e:
             print(f"Error writing to CSV ({source_name}): {e}")
 
-    def _sync_write(self, data: Dict[str, Any], csv_path: Path, file_exists: bool) -> None:
-        """Synchronous write implementation called via asyncio.to_thread."""
-        with open(csv_path, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=data.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(data)
+    async def write_many(self, rows: List[Dict[str, Any]], source_name: str) -> None:
+        """Append rows to the source's CSV file; errors are raised, not printed."""
+        if self._flush_task is None and self.flush_interval > 0:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+        # We use to_thread for file I/O to avoid blocking the event loop
+        await asyncio.to_thread(self._sync_write_many, rows, source_name)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self._sync_flush)
+            except Exception as e:
+                print(f"Error flushing CSV files: {e}")
+
+    async def flush(self) -> None:
+        await asyncio.to_thread(self._sync_flush)
+
+    async def close(self) -> None:
+        """Flush and close all files and wait for background compression."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await asyncio.to_thread(self._sync_close)
+
+    def _sync_write_many(self, rows: List[Dict[str, Any]], source_name: str) -> None:
+        with self._lock:
+            for data in rows:
+                day = self._row_day(data)
+                current = self._files.get(source_name) or self._open(source_name, data, day)
+                if any(key not in current.fieldnames for key in data):
+                    # Schema drift: keep the old file intact and start a new one
+                    self._rotate(source_name, current.day)
+                    current = self._open(source_name, data, day)
+                elif self.rotate and day > current.day:
+                    self._rotate(source_name, current.day)
+                    current = self._open(source_name, data, day)
+                current.writer.writerow(data)
+
+    def _sync_flush(self) -> None:
+        with self._lock:
+            for current in self._files.values():
+                current.handle.flush()
+
+    def _sync_close(self) -> None:
+        with self._lock:
+            for current in self._files.values():
+                current.handle.close()
+            self._files.clear()
+            compressors, self._compressors = self._compressors, []
+        for thread in compressors:
+            thread.join()
+
+    @staticmethod
+    def _row_day(data: Dict[str, Any]) -> str:
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str) and len(timestamp) >= 10 and timestamp[4] == "-":
+            return timestamp[:10]
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def _open(self, source_name: str, data: Dict[str, Any], day: str) -> CSVFile:
+        """Open the live file, reusing the header of an existing one."""
+        path = self.data_dir / f"{source_name}.csv"
+        fieldnames = list(data.keys())
+        if path.exists() and path.stat().st_size > 0:
+            with open(path, newline="") as f:
+                header = next(csv.reader(f), [])
+            if header and all(key in header for key in fieldnames):
+                # Keep appending under the existing header
+                fieldnames = header
+                modified = datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+                day = min(day, modified.strftime("%Y-%m-%d"))
+            else:
+                modified = datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+                self._archive(path, source_name, modified.strftime("%Y-%m-%d"))
+
+        handle = open(path, "a", newline="", buffering=self.buffer_size)
+        current = CSVFile(path, handle, fieldnames, day)
+        if handle.tell() == 0:
+            current.writer.writeheader()
+        self._files[source_name] = current
+        return current
+
+    def _rotate(self, source_name: str, day: str) -> None:
+        current = self._files.pop(source_name)
+        current.handle.close()
+        self._archive(current.path, source_name, day)
+
+    def _archive(self, path: Path, source_name: str, day: str) -> None:
+        n = 0
+        while True:
+            stem = f"{source_name}.{day}" + (f".{n}" if n else "")
+            target = self.data_dir / f"{stem}.csv"
+            if not target.exists() and not target.with_name(target.name + ".gz").exists():
+                break
+            n += 1
+        os.replace(path, target)
+        if self.compress:
+            self._compress_later(target)
+
+    def _compress_later(self, path: Path) -> None:
+        thread = threading.Thread(target=self._compress, args=(path,), name=f"csv-gzip-{path.name}", daemon=True)
+        self._compressors = [t for t in self._compressors if t.is_alive()] + [thread]
+        thread.start()
+
+    @staticmethod
+    def _compress(path: Path) -> None:
+        target = path.with_name(path.name + ".gz")
+        tmp = target.with_name(target.name + ".tmp")
+        try:
+            with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, target)
+            path.unlink()
+        except Exception as e:
+            print(f"Error compressing {path.name}: {e}")
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import random
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Advisory file locks are not available on this platform (e.g. Windows);
+    # WriterLock becomes a no-op and SQLite's own busy handling remains.
+    fcntl = None  # type: ignore[assignment]
+
+def is_busy_error(error: Exception) -> bool:
+    """True for SQLite errors caused by another connection holding the write lock."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+def lock_path(db_path: str | Path) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.name + ".lock")
+
+class WriterLock:
+    """Advisory ``<db>.lock`` file electing a single writer per database.
+
+    Every process that writes to a database (the pollers, retention, and the
+    maintenance commands) takes this lock around each transaction, so writers
+    from different processes queue up on the lock file instead of racing for
+    SQLite's write lock and running into "database is locked".
+    """
+
+    def __init__(self, db_path: str | Path, timeout: float = 30.0, poll: float = 0.05):
+        self.path = lock_path(db_path)
+        self.timeout = timeout
+        self.poll = poll
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._file = None
+
+    def acquire(self) -> None:
+        if fcntl is None:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a+")
+        if self._try_lock():
+            return
+
+        self.waits += 1
+        start = time.monotonic()
+        try:
+            while True:
+                # Jittered polling so competing processes do not wake in lockstep
+                time.sleep(self.poll * random.uniform(0.5, 1.5))
+                if self._try_lock():
+                    return
+                if time.monotonic() - start > self.timeout:
+                    raise TimeoutError(f"Timed out after {self.timeout}s waiting for writer lock {self.path}")
+        finally:
+            self.wait_seconds += time.monotonic() - start
+
+    def _try_lock(self) -> bool:
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def release(self) -> None:
+        if fcntl is not None and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> WriterLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
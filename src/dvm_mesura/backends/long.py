@@ -0,0 +1,147 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Mapping, Tuple, TYPE_CHECKING
+from ..core.helpers import EPOCH_MS_COLUMN
+
+if TYPE_CHECKING:
+    from .sqlite import SQLiteDatabase
+
+class LongFormat:
+    """Stores selected sources as narrow ``(ts_ms, series_id, value)`` rows.
+
+    For a source ``evohome`` this maintains:
+
+    * ``evohome_series``: dictionary of series, one per former column and entity,
+    * ``evohome_samples``: one row per non-null value, keyed by ``(series_id, ts_ms)``
+      so per-series range queries are an index seek,
+    * a view that pivots the samples back to the familiar wide shape. It is
+      named ``evohome`` unless a wide table of that name already exists, in
+      which case it is called ``evohome_wide``.
+
+    A source that writes several rows per timestamp (one per location or
+    meter) needs its key column in ``keys`` (e.g. ``{"evohome": "system_id"}``):
+    the key value becomes the series' ``entity``, so rows of different
+    entities never overwrite each other, and the view has one row per
+    timestamp and entity with the key column restored.
+
+    New keys only add a dictionary row and rebuild the view; the storage
+    tables never change shape.
+    """
+
+    def __init__(self, tables: Iterable[str], keys: Mapping[str, str] | None = None):
+        self.tables = set(tables)
+        # table -> key column telling apart the entities written at one timestamp
+        self.keys: Dict[str, str] = dict(keys or {})
+        # table -> {(entity, series name): series_id}
+        self._series: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._views: Dict[str, str] = {}
+
+    def __contains__(self, table_name: str) -> bool:
+        return table_name in self.tables
+
+    def reset(self) -> None:
+        """Forget cached series ids (e.g. after the connection was closed)."""
+        self._series.clear()
+        self._views.clear()
+
+    def view_name(self, db: SQLiteDatabase, table_name: str) -> str:
+        view = self._views.get(table_name)
+        if view is None:
+            row = db.conn.execute("SELECT type FROM sqlite_master WHERE name=?", (table_name,)).fetchone()
+            view = f"{table_name}_wide" if row and row[0] == "table" else table_name
+            self._views[table_name] = view
+        return view
+
+    def _load(self, db: SQLiteDatabase, table_name: str) -> Dict[Tuple[str, str], int]:
+        series = self._series.get(table_name)
+        if series is not None:
+            return series
+        db.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name}_series (series_id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "entity TEXT NOT NULL DEFAULT '', UNIQUE (name, entity))"
+        )
+        columns = [row[1] for row in db.conn.execute(f"PRAGMA table_info({table_name}_series)")]
+        upgraded = "entity" not in columns
+        if upgraded:
+            self._add_entity(db, table_name)
+        db.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table_name}_samples ("{EPOCH_MS_COLUMN}" INTEGER NOT NULL, '
+            f'series_id INTEGER NOT NULL, value, PRIMARY KEY (series_id, "{EPOCH_MS_COLUMN}")) WITHOUT ROWID'
+        )
+        db.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_samples_{EPOCH_MS_COLUMN} "
+            f'ON {table_name}_samples ("{EPOCH_MS_COLUMN}")'
+        )
+        series = self._read_series(db, table_name)
+        self._series[table_name] = series
+        if upgraded:
+            self._rebuild_view(db, table_name)
+        return series
+
+    @staticmethod
+    def _add_entity(db: SQLiteDatabase, table_name: str) -> None:
+        """Upgrade a series dictionary from before entities (names were unique); ids are kept."""
+        db.conn.execute(
+            f"CREATE TABLE {table_name}_series_new (series_id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "entity TEXT NOT NULL DEFAULT '', UNIQUE (name, entity))"
+        )
+        db.conn.execute(f"INSERT INTO {table_name}_series_new (series_id, name) SELECT series_id, name FROM {table_name}_series")
+        db.conn.execute(f"DROP TABLE {table_name}_series")
+        db.conn.execute(f"ALTER TABLE {table_name}_series_new RENAME TO {table_name}_series")
+
+    @staticmethod
+    def _read_series(db: SQLiteDatabase, table_name: str) -> Dict[Tuple[str, str], int]:
+        return {(entity, name): sid for sid, name, entity
+                in db.conn.execute(f"SELECT series_id, name, entity FROM {table_name}_series")}
+
+    def _rebuild_view(self, db: SQLiteDatabase, table_name: str) -> None:
+        view = self.view_name(db, table_name)
+        # Re-read the dictionary: other processes may have added series too
+        self._series[table_name].update(self._read_series(db, table_name))
+        names = [row[0] for row in db.conn.execute(
+            f"SELECT name FROM {table_name}_series GROUP BY name ORDER BY min(series_id)"
+        )]
+        pivots = [
+            f"max(CASE WHEN s.name = '{name.replace(chr(39), chr(39) * 2)}' THEN value END) "
+            f'AS "{name.replace(chr(34), chr(34) * 2)}"'
+            for name in names
+        ]
+        key = self.keys.get(table_name)
+        entity = f", NULLIF(s.entity, '') AS \"{key}\"" if key else ""
+        db.conn.execute(f"DROP VIEW IF EXISTS {view}")
+        db.conn.execute(
+            f'CREATE VIEW {view} AS SELECT "{EPOCH_MS_COLUMN}", '
+            f"strftime('%Y-%m-%dT%H:%M:%SZ', \"{EPOCH_MS_COLUMN}\" / 1000, 'unixepoch') AS timestamp{entity}, "
+            f"{', '.join(pivots)} FROM {table_name}_samples JOIN {table_name}_series AS s USING (series_id) "
+            f'GROUP BY "{EPOCH_MS_COLUMN}", s.entity'
+        )
+
+    def insert(self, db: SQLiteDatabase, table_name: str, data: Mapping[str, Any]) -> None:
+        """Add one sample inside the caller's transaction. ``None`` values are not stored."""
+        ts_ms = data.get(EPOCH_MS_COLUMN)
+        if not isinstance(ts_ms, int):
+            raise ValueError(f"Long-format rows for '{table_name}' need a timestamp")
+        series = self._load(db, table_name)
+        key = self.keys.get(table_name)
+        entity = "" if key is None or data.get(key) is None else str(data[key])
+
+        values = []
+        added = False
+        for name, value in data.items():
+            if name in (EPOCH_MS_COLUMN, "timestamp", key) or value is None:
+                continue
+            sid = series.get((entity, name))
+            if sid is None:
+                db.conn.execute(f"INSERT OR IGNORE INTO {table_name}_series (name, entity) VALUES (?, ?)", (name, entity))
+                sid = db.conn.execute(
+                    f"SELECT series_id FROM {table_name}_series WHERE name=? AND entity=?", (name, entity)
+                ).fetchone()[0]
+                series[(entity, name)] = sid
+                added = True
+            values.append((ts_ms, sid, value))
+
+        if added:
+            self._rebuild_view(db, table_name)
+        db.conn.executemany(
+            f'INSERT OR REPLACE INTO {table_name}_samples ("{EPOCH_MS_COLUMN}", series_id, value) VALUES (?, ?, ?)',
+            values,
+        )
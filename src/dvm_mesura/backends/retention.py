@@ -0,0 +1,150 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+from ..core.helpers import EPOCH_MS_COLUMN
+from .locking import WriterLock
+
+FOREVER = None
+
+def parse_retention_spec(spec: str) -> Dict[str, int | None]:
+    """Parse 'energy=90d;energy_1h=forever' into max ages in milliseconds (None = keep forever)."""
+    policy: Dict[str, int | None] = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        table, _, age = part.partition("=")
+        table, age = table.strip().replace("-", "_"), age.strip().lower()
+        if not table:
+            raise ValueError(f"Invalid retention spec: {part}. Use format like 'energy=90d'")
+        if age == "forever":
+            policy[table] = FOREVER
+            continue
+        match = re.match(r"^(\d+)([hdw])$", age)
+        if not match:
+            raise ValueError(f"Invalid retention age: {age}. Use format like '48h', '90d', '12w' or 'forever'")
+        value, unit = match.groups()
+        policy[table] = int(value) * {"h": 3_600_000, "d": 86_400_000, "w": 604_800_000}[unit]
+    return policy
+
+class RetentionTask:
+    """Deletes expired rows from a database in small batches, then reclaims space.
+
+    Each batch is its own short transaction so the live writers never wait
+    long for the write lock. Afterwards free pages are released with
+    ``PRAGMA incremental_vacuum`` and the WAL is checkpointed. That only
+    works on databases created with ``auto_vacuum=INCREMENTAL``; for older
+    files a warning (once) points to ``mesura-migrate --vacuum``. When
+    cancelled, the pass stops after the batch in progress.
+    """
+
+    def __init__(self, db_path: str | Path, policy: Dict[str, int | None], interval: float = 3600.0,
+                 batch_size: int = 1000, pause: float = 0.05):
+        self.db_path = Path(db_path).absolute()
+        self.policy = policy
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._vacuum_warned = False
+        self.stop = threading.Event()
+
+    async def run(self):
+        """Enforce the policy every ``interval`` seconds until cancelled."""
+        while True:
+            worker = asyncio.ensure_future(asyncio.to_thread(self.enforce))
+            try:
+                deleted = await asyncio.shield(worker)
+                if any(deleted.values()):
+                    summary = ", ".join(f"{t}: {n}" for t, n in deleted.items() if n)
+                    print(f"Retention on {self.db_path.name} removed rows ({summary})")
+            except asyncio.CancelledError:
+                # A thread cannot be cancelled: ask it to stop after the current batch and wait for it
+                self.stop.set()
+                with contextlib.suppress(Exception):
+                    await worker
+                break
+            except Exception as e:
+                print(f"Error enforcing retention on {self.db_path}: {e}")
+            try:
+                await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                break
+
+    def enforce(self, now_ms: int | None = None) -> Dict[str, int]:
+        """Apply the policy once. Returns the number of rows deleted per table."""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        deleted: Dict[str, int] = {}
+        if not self.db_path.exists():
+            return deleted
+
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        lock = WriterLock(self.db_path)
+        try:
+            for table, max_age in self.policy.items():
+                if self.stop.is_set():
+                    return deleted
+                if max_age is FOREVER:
+                    continue
+                deleted[table] = self._expire(conn, lock, table, now_ms - max_age)
+            if any(deleted.values()) and not self.stop.is_set():
+                with lock:
+                    if self._incremental(conn):
+                        # incremental_vacuum frees pages as the statement is stepped
+                        conn.execute("PRAGMA incremental_vacuum").fetchall()
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            lock.close()
+            conn.close()
+        return deleted
+
+    def _incremental(self, conn: sqlite3.Connection) -> bool:
+        """True when the file uses incremental auto-vacuum; warns once otherwise."""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return True
+        if not self._vacuum_warned:
+            self._vacuum_warned = True
+            print(f"Warning: {self.db_path.name} does not use incremental auto-vacuum, so expired rows do not shrink "
+                  f"the file. Run 'mesura-migrate --vacuum' once (pollers stopped) to switch it.")
+        return False
+
+    def _expire(self, conn: sqlite3.Connection, lock: WriterLock, table: str, cutoff_ms: int) -> int:
+        row = conn.execute("SELECT type FROM sqlite_master WHERE name=?", (table,)).fetchone()
+        if row and row[0] == "view":
+            # Long-format source: expire the narrow samples behind the view
+            table = f"{table}_samples"
+            row = conn.execute("SELECT type FROM sqlite_master WHERE name=?", (table,)).fetchone()
+        if not row:
+            return 0
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if EPOCH_MS_COLUMN in columns:
+            where, cutoff = f'"{EPOCH_MS_COLUMN}" < ?', cutoff_ms
+        elif "timestamp" in columns:
+            where = '"timestamp" < ?'
+            cutoff = datetime.fromtimestamp(cutoff_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        else:
+            return 0
+
+        total = 0
+        while not self.stop.is_set():
+            if table.endswith("_samples"):
+                # WITHOUT ROWID table: batch on the primary key instead
+                sql = (f'DELETE FROM {table} WHERE (series_id, "{EPOCH_MS_COLUMN}") IN '
+                       f'(SELECT series_id, "{EPOCH_MS_COLUMN}" FROM {table} WHERE {where} LIMIT ?)')
+            else:
+                sql = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)"
+            with lock:
+                cursor = conn.execute(sql, (cutoff, self.batch_size))
+                conn.commit()
+            total += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                return total
+            # Give the pollers a chance to take the write lock between batches
+            self.stop.wait(self.pause)
+        return total
@@ -0,0 +1,350 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, TYPE_CHECKING
+from ..core.helpers import EPOCH_MS_COLUMN
+from .locking import WriterLock
+
+if TYPE_CHECKING:
+    from .sqlite import SQLiteDatabase
+
+STATE_TABLE = "_rollup_state"
+AGGREGATES = ("min", "max", "avg", "last", "count")
+
+def parse_resolution(resolution: str) -> int:
+    """Parse a rollup resolution such as '1m', '1h' or '1d' to milliseconds."""
+    match = re.match(r"^(\d+)([mhd])$", resolution.lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid rollup resolution: {resolution}. Use format like '1m', '1h', '1d'")
+    value, unit = match.groups()
+    return int(value) * {"m": 60_000, "h": 3_600_000, "d": 86_400_000}[unit]
+
+def parse_rollup_spec(spec: str) -> Dict[str, List[str]]:
+    """Parse 'energy=1h,1d;weather=1h' into {'energy': ['1h', '1d'], 'weather': ['1h']}."""
+    rollups: Dict[str, List[str]] = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        source, _, resolutions = part.partition("=")
+        res_list = [r.strip() for r in resolutions.split(",") if r.strip()]
+        for r in res_list:
+            parse_resolution(r)
+        if not source.strip() or not res_list:
+            raise ValueError(f"Invalid rollup spec: {part}. Use format like 'energy=1h,1d'")
+        rollups[source.strip().replace("-", "_")] = res_list
+    return rollups
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class Bucket:
+    """Running min/max/avg/last of every numeric column within one time bucket."""
+
+    __slots__ = ("samples", "last_ms", "values")
+
+    def __init__(self):
+        self.samples = 0
+        self.last_ms = -1
+        # column -> [min, max, avg, last, count]
+        self.values: Dict[str, List[Any]] = {}
+
+    def add(self, ts_ms: int, row: Dict[str, Any], columns: Iterable[str]) -> None:
+        self.samples += 1
+        newer = ts_ms >= self.last_ms
+        self.last_ms = max(self.last_ms, ts_ms)
+        for col in columns:
+            value = row.get(col)
+            if not is_number(value):
+                continue
+            agg = self.values.get(col)
+            if agg is None:
+                self.values[col] = [value, value, float(value), value, 1]
+                continue
+            agg[0] = min(agg[0], value)
+            agg[1] = max(agg[1], value)
+            agg[4] += 1
+            agg[2] += (value - agg[2]) / agg[4]
+            if newer:
+                agg[3] = value
+
+class RollupEngine:
+    """Maintains ``<table>_<resolution>`` rollup tables for raw sample tables.
+
+    Each rollup row covers one bucket (keyed by its start in ``ts_ms``) and
+    holds min/max/avg/last/count for every numeric column of the raw table,
+    as recorded in the ``SQLiteDatabase`` schema cache. Rows can be rolled
+    up as they are inserted (``apply``) or by a pass over the raw table
+    that resumes from a per-table watermark (``catch_up``).
+
+    Every raw row at or below the watermark is rolled up, every row above it
+    is not. ``apply`` only rolls up rows above the watermark (and moves it)
+    once no older rows are waiting for ``catch_up``; until then those rows
+    are left to the catch-up pass, so no row is counted twice.
+    """
+
+    def __init__(self, rollups: Dict[str, List[str]], chunk_ms: int = 86_400_000):
+        self.rollups = {t: [(r, parse_resolution(r)) for r in res] for t, res in rollups.items()}
+        self.chunk_ms = chunk_ms
+        # Tables whose watermark was current when this process started rolling up live
+        self._live: set[str] = set()
+        self._upserts: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+
+    def add(self, rollups: Dict[str, List[str]]) -> None:
+        """Merge more resolutions into the spec, e.g. from another backend on the same database."""
+        for table_name, resolutions in rollups.items():
+            current = self.rollups.setdefault(table_name, [])
+            for r in resolutions:
+                spec = (r, parse_resolution(r))
+                if all(res_ms != spec[1] for _, res_ms in current):
+                    current.append(spec)
+
+    def tables_for(self, table_name: str) -> List[str]:
+        return [f"{table_name}_{r}" for r, _ in self.rollups.get(table_name, [])]
+
+    def numeric_columns(self, db: SQLiteDatabase, table_name: str) -> Tuple[str, ...]:
+        schema = db.schemas.get(table_name) or db._load_schema(table_name)
+        if schema is None:
+            return ()
+        return tuple(
+            c for c, t in schema.columns.items()
+            if c != EPOCH_MS_COLUMN and t.upper() in ("INTEGER", "REAL")
+        )
+
+    def _ensure_table(self, db: SQLiteDatabase, rollup_table: str, columns: Tuple[str, ...]) -> None:
+        schema = db.schemas.get(rollup_table)
+        if schema is None:
+            db.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {rollup_table} "
+                f'("{EPOCH_MS_COLUMN}" INTEGER PRIMARY KEY, "timestamp" TEXT, "samples" INTEGER, "last_ms" INTEGER)'
+            )
+            schema = db._load_schema(rollup_table)
+        for col in columns:
+            if f"{col}_count" in schema.columns:
+                continue
+            for agg in AGGREGATES:
+                col_type = "INTEGER" if agg == "count" else "REAL"
+                try:
+                    db.conn.execute(f'ALTER TABLE {rollup_table} ADD COLUMN "{col}_{agg}" {col_type}')
+                except sqlite3.OperationalError as e:
+                    if "duplicate column" not in str(e).lower():
+                        raise
+                schema.columns[f"{col}_{agg}"] = col_type
+
+    def _upsert_sql(self, rollup_table: str, columns: Tuple[str, ...]) -> str:
+        key = (rollup_table, columns)
+        sql = self._upserts.get(key)
+        if sql is not None:
+            return sql
+        names = [EPOCH_MS_COLUMN, "timestamp", "samples", "last_ms"]
+        updates = ["samples = samples + excluded.samples", "last_ms = max(last_ms, excluded.last_ms)"]
+        for col in columns:
+            names += [f"{col}_{agg}" for agg in AGGREGATES]
+            mn, mx, avg, last, cnt = (f'"{col}_{agg}"' for agg in AGGREGATES)
+            updates += [
+                f"{mn} = min(coalesce({mn}, excluded.{mn}), coalesce(excluded.{mn}, {mn}))",
+                f"{mx} = max(coalesce({mx}, excluded.{mx}), coalesce(excluded.{mx}, {mx}))",
+                f"{avg} = CASE WHEN coalesce({cnt}, 0) + excluded.{cnt} = 0 THEN {avg} "
+                f"ELSE (coalesce({avg}, 0) * coalesce({cnt}, 0) + coalesce(excluded.{avg}, 0) * excluded.{cnt}) "
+                f"/ (coalesce({cnt}, 0) + excluded.{cnt}) END",
+                f"{last} = CASE WHEN excluded.{last} IS NOT NULL AND excluded.last_ms >= last_ms "
+                f"THEN excluded.{last} ELSE {last} END",
+                f"{cnt} = coalesce({cnt}, 0) + excluded.{cnt}",
+            ]
+        col_sql = ", ".join(f'"{n}"' for n in names)
+        placeholders = ", ".join(["?"] * len(names))
+        sql = (
+            f"INSERT INTO {rollup_table} ({col_sql}) VALUES ({placeholders}) "
+            f'ON CONFLICT("{EPOCH_MS_COLUMN}") DO UPDATE SET {", ".join(updates)}'
+        )
+        self._upserts[key] = sql
+        return sql
+
+    def _write_buckets(self, db: SQLiteDatabase, table_name: str, columns: Tuple[str, ...],
+                       buckets: Dict[Tuple[str, int], Bucket]) -> None:
+        by_table: Dict[str, List[List[Any]]] = {}
+        for (rollup_table, start_ms), bucket in buckets.items():
+            params: List[Any] = [
+                start_ms,
+                datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                bucket.samples,
+                bucket.last_ms,
+            ]
+            for col in columns:
+                agg = bucket.values.get(col)
+                params += agg if agg is not None else [None, None, None, None, 0]
+            by_table.setdefault(rollup_table, []).append(params)
+        for rollup_table, rows in by_table.items():
+            self._ensure_table(db, rollup_table, columns)
+            db.conn.executemany(self._upsert_sql(rollup_table, columns), rows)
+
+    def _bucketize(self, table_name: str, rows: Iterable[Dict[str, Any]],
+                   columns: Tuple[str, ...]) -> Tuple[Dict[Tuple[str, int], Bucket], int]:
+        buckets: Dict[Tuple[str, int], Bucket] = {}
+        max_ms = -1
+        for row in rows:
+            ts_ms = row.get(EPOCH_MS_COLUMN)
+            if not isinstance(ts_ms, int):
+                continue
+            max_ms = max(max_ms, ts_ms)
+            for res, res_ms in self.rollups[table_name]:
+                key = (f"{table_name}_{res}", ts_ms - ts_ms % res_ms)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = Bucket()
+                bucket.add(ts_ms, row, columns)
+        return buckets, max_ms
+
+    def _watermark(self, db: SQLiteDatabase, table_name: str) -> int:
+        db.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (source TEXT PRIMARY KEY, watermark_ms INTEGER)"
+        )
+        row = db.conn.execute(f"SELECT watermark_ms FROM {STATE_TABLE} WHERE source=?", (table_name,)).fetchone()
+        return row[0] if row else -1
+
+    def _set_watermark(self, db: SQLiteDatabase, table_name: str, watermark_ms: int) -> None:
+        db.conn.execute(
+            f"INSERT INTO {STATE_TABLE} (source, watermark_ms) VALUES (?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET watermark_ms = max(watermark_ms, excluded.watermark_ms)",
+            (table_name, watermark_ms),
+        )
+
+    def apply(self, db: SQLiteDatabase, table_name: str, rows: List[Dict[str, Any]]) -> None:
+        """Roll up freshly inserted rows inside the caller's open transaction.
+
+        Never backfills: while older raw rows still wait for ``catch_up``,
+        only rows at or below the watermark are rolled up here.
+        """
+        if table_name not in self.rollups or not rows:
+            return
+        if table_name not in self._live:
+            watermark = self._watermark(db, table_name)
+            newer = sum(1 for row in rows if isinstance(row.get(EPOCH_MS_COLUMN), int)
+                        and row[EPOCH_MS_COLUMN] > watermark)
+            # Any row above the watermark besides the ones just inserted is a backlog
+            backlog = db.conn.execute(
+                f'SELECT 1 FROM {table_name} WHERE "{EPOCH_MS_COLUMN}" > ? LIMIT 1 OFFSET ?', (watermark, newer)
+            ).fetchone()
+            if backlog is not None:
+                rows = [row for row in rows if isinstance(row.get(EPOCH_MS_COLUMN), int)
+                        and row[EPOCH_MS_COLUMN] <= watermark]
+                if rows:
+                    columns = self.numeric_columns(db, table_name)
+                    self._write_buckets(db, table_name, columns, self._bucketize(table_name, rows, columns)[0])
+                return
+            self._live.add(table_name)
+        columns = self.numeric_columns(db, table_name)
+        buckets, max_ms = self._bucketize(table_name, rows, columns)
+        if buckets:
+            self._write_buckets(db, table_name, columns, buckets)
+            self._set_watermark(db, table_name, max_ms)
+
+    def catch_up(self, db: SQLiteDatabase, table_name: str, lock: WriterLock | None = None,
+                 pause: float = 0.0, stop: threading.Event | None = None) -> int:
+        """Roll up raw rows newer than the watermark. Returns the number of rows processed.
+
+        Works through the backlog ``chunk_ms`` at a time, each chunk in its own
+        short transaction that also advances the watermark, so live writers
+        only wait for one chunk and an interrupted pass resumes where it
+        stopped. Runs until no rows above the watermark are left, or until
+        ``stop`` is set (checked between chunks).
+        """
+        if table_name not in self.rollups:
+            return 0
+        columns = self.numeric_columns(db, table_name)
+        if not columns or EPOCH_MS_COLUMN not in db.schemas[table_name].columns:
+            return 0
+        if db.conn.in_transaction:
+            db.conn.commit()
+
+        select_cols = ", ".join(f'"{c}"' for c in (EPOCH_MS_COLUMN,) + columns)
+        names = (EPOCH_MS_COLUMN,) + columns
+        processed = 0
+        while stop is None or not stop.is_set():
+            with lock if lock is not None else contextlib.nullcontext():
+                # Take the write lock up front: the watermark must not move between reading and advancing it
+                db.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    watermark = self._watermark(db, table_name)
+                    start, end = db.conn.execute(
+                        f'SELECT min("{EPOCH_MS_COLUMN}"), max("{EPOCH_MS_COLUMN}") FROM {table_name} '
+                        f'WHERE "{EPOCH_MS_COLUMN}" > ?', (watermark,)
+                    ).fetchone()
+                    if start is None:
+                        db.conn.rollback()
+                        return processed
+                    end = min(start - 1 + self.chunk_ms, end)
+                    cursor = db.conn.execute(
+                        f'SELECT {select_cols} FROM {table_name} WHERE "{EPOCH_MS_COLUMN}" > ? AND "{EPOCH_MS_COLUMN}" <= ?',
+                        (watermark, end),
+                    )
+                    rows = [dict(zip(names, r)) for r in cursor]
+                    buckets, max_ms = self._bucketize(table_name, rows, columns)
+                    if buckets:
+                        self._write_buckets(db, table_name, columns, buckets)
+                    self._set_watermark(db, table_name, max_ms)
+                    db.conn.commit()
+                except Exception:
+                    db.conn.rollback()
+                    raise
+            processed += len(rows)
+            # Give the pollers a chance to take the write lock between chunks
+            if stop is None:
+                time.sleep(pause)
+            else:
+                stop.wait(pause)
+        return processed
+
+class RollupTask:
+    """Background catch-up pass that backfills rollups from the raw tables.
+
+    Runs once at startup on its own connection, so the live writer only
+    ever rolls up the rows it inserts; see ``RollupEngine.catch_up``. When
+    cancelled, the pass stops after the chunk in progress.
+    """
+
+    def __init__(self, db_path: str | Path, rollups: Dict[str, List[str]], chunk_ms: int = 86_400_000,
+                 pause: float = 0.05):
+        self.db_path = Path(db_path).absolute()
+        self.engine = RollupEngine(rollups, chunk_ms)
+        self.pause = pause
+        self.stop = threading.Event()
+
+    async def run(self):
+        worker = asyncio.ensure_future(asyncio.to_thread(self.catch_up))
+        try:
+            processed = await asyncio.shield(worker)
+            if any(processed.values()):
+                summary = ", ".join(f"{t}: {n}" for t, n in processed.items() if n)
+                print(f"Rollup catch-up on {self.db_path.name} processed rows ({summary})")
+        except asyncio.CancelledError:
+            # A thread cannot be cancelled: ask it to stop after the current chunk and wait for it
+            self.stop.set()
+            with contextlib.suppress(Exception):
+                await worker
+        except Exception as e:
+            print(f"Error catching up rollups on {self.db_path}: {e}")
+
+    def catch_up(self) -> Dict[str, int]:
+        """Catch up every table once. Returns the number of rows processed per table."""
+        from .sqlite import SQLiteDatabase
+
+        processed: Dict[str, int] = {}
+        if not self.db_path.exists():
+            return processed
+        db = SQLiteDatabase(self.db_path)
+        lock = WriterLock(self.db_path)
+        try:
+            for table_name in self.engine.rollups:
+                if self.stop.is_set():
+                    break
+                processed[table_name] = self.engine.catch_up(db, table_name, lock, self.pause, self.stop)
+        finally:
+            lock.close()
+            db.close()
+        return processed
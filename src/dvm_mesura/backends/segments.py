@@ -0,0 +1,453 @@
+from __future__ import annotations
+import asyncio
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+from ..core.base import Backend
+from ..core.helpers import EPOCH_MS_COLUMN, with_epoch_ms
+
+BLOCK_MAGIC = b"MSB1"
+_LEN = struct.Struct(">I")
+# Bit pattern used for missing numeric values; distinct from float('nan')
+NULL_BITS = 0x7FF8_0000_0000_0001
+# Integers up to 2**53 survive the round trip through a float64
+MAX_EXACT_INT = 2 ** 53
+
+class BitWriter:
+    """Accumulates a big-endian bit stream."""
+
+    def __init__(self):
+        self._acc = 0
+        self.nbits = 0
+
+    def write(self, value: int, nbits: int) -> None:
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+
+    def to_bytes(self) -> bytes:
+        pad = -self.nbits % 8
+        return (self._acc << pad).to_bytes((self.nbits + pad) // 8, "big")
+
+class BitReader:
+    """Reads a bit stream produced by ``BitWriter``."""
+
+    def __init__(self, data: bytes):
+        self._value = int.from_bytes(data, "big")
+        self._remaining = len(data) * 8
+
+    def read(self, nbits: int) -> int:
+        self._remaining -= nbits
+        return (self._value >> self._remaining) & ((1 << nbits) - 1)
+
+def _signed(value: int, nbits: int) -> int:
+    return value - (1 << nbits) if value >= 1 << (nbits - 1) else value
+
+# (prefix, prefix length, payload bits) for delta-of-delta timestamp buckets
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12), (0b11110, 5, 32))
+
+def encode_timestamps(bits: BitWriter, timestamps: List[int]) -> None:
+    """Delta-of-delta encode integers, e.g. epoch-ms timestamps or counters."""
+    prev = prev_delta = 0
+    for i, ts in enumerate(timestamps):
+        if i == 0:
+            bits.write(ts, 64)
+        elif i == 1:
+            prev_delta = ts - prev
+            bits.write(prev_delta, 64)
+        else:
+            delta = ts - prev
+            dod = delta - prev_delta
+            prev_delta = delta
+            if dod == 0:
+                bits.write(0, 1)
+            else:
+                for prefix, prefix_len, nbits in _DOD_BUCKETS:
+                    if -(1 << (nbits - 1)) <= dod < 1 << (nbits - 1):
+                        bits.write(prefix, prefix_len)
+                        bits.write(dod, nbits)
+                        break
+                else:
+                    bits.write(0b11111, 5)
+                    bits.write(dod, 64)
+        prev = ts
+
+def decode_timestamps(bits: BitReader, count: int) -> List[int]:
+    timestamps: List[int] = []
+    prev = delta = 0
+    for i in range(count):
+        if i == 0:
+            ts = _signed(bits.read(64), 64)
+        elif i == 1:
+            delta = _signed(bits.read(64), 64)
+            ts = prev + delta
+        else:
+            if bits.read(1) == 0:
+                dod = 0
+            else:
+                nbits = 64
+                for _, prefix_len, bucket_bits in _DOD_BUCKETS:
+                    if prefix_len == 5:
+                        nbits = bucket_bits if bits.read(1) == 0 else 64
+                        break
+                    if bits.read(1) == 0:
+                        nbits = bucket_bits
+                        break
+                dod = _signed(bits.read(nbits), nbits)
+            delta += dod
+            ts = prev + delta
+        timestamps.append(ts)
+        prev = ts
+    return timestamps
+
+def _float_bits(value: Any) -> int:
+    if value is None:
+        return NULL_BITS
+    return struct.unpack(">Q", struct.pack(">d", float(value)))[0]
+
+def encode_floats(bits: BitWriter, values: List[Any]) -> None:
+    """Gorilla XOR encoding; ``None`` is stored as a reserved NaN pattern."""
+    prev = 0
+    lead, length = -1, 0
+    for i, value in enumerate(values):
+        current = _float_bits(value)
+        if i == 0:
+            bits.write(current, 64)
+            prev = current
+            continue
+        xor = current ^ prev
+        prev = current
+        if xor == 0:
+            bits.write(0, 1)
+            continue
+        bits.write(1, 1)
+        new_lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if lead >= 0 and new_lead >= lead and trail >= 64 - lead - length:
+            # Meaningful bits fit in the previous window
+            bits.write(0, 1)
+            bits.write(xor >> (64 - lead - length), length)
+        else:
+            lead, length = new_lead, 64 - new_lead - trail
+            bits.write(1, 1)
+            bits.write(lead, 5)
+            bits.write(length & 0x3F, 6)  # 64 is stored as 0
+            bits.write(xor >> trail, length)
+
+def decode_floats(bits: BitReader, count: int) -> List[int]:
+    """Decode to raw 64-bit patterns (see ``_bits_to_value``)."""
+    out: List[int] = []
+    prev = 0
+    lead, length = 0, 0
+    for i in range(count):
+        if i == 0:
+            prev = bits.read(64)
+        elif bits.read(1) == 1:
+            if bits.read(1) == 1:
+                lead = bits.read(5)
+                length = bits.read(6) or 64
+            prev ^= bits.read(length) << (64 - lead - length)
+        out.append(prev)
+    return out
+
+def _bits_to_value(raw: int, kind: str) -> Any:
+    if raw == NULL_BITS:
+        return None
+    value = struct.unpack(">d", struct.pack(">Q", raw))[0]
+    return int(value) if kind == "i" else value
+
+# Largest number of decimals tried when storing floats as scaled integers
+MAX_DECIMALS = 6
+
+def _decimals(values: List[Any]) -> int | None:
+    """Smallest scale at which every float is exactly ``round(v * 10**k) / 10**k``."""
+    k = 0
+    for v in values:
+        while k <= MAX_DECIMALS:
+            scale = 10 ** k
+            if abs(v) * scale < MAX_EXACT_INT and round(v * scale) / scale == v:
+                break
+            k += 1
+        else:
+            return None
+    scale = 10 ** k
+    if all(round(v * scale) / scale == v for v in values):
+        return k
+    return None
+
+def _column_kind(values: List[Any]) -> str:
+    """Pick the encoding for one column of a block.
+
+    * ``i``: integers without gaps, delta-of-delta encoded (counters),
+    * ``d<k>``: floats with at most ``k`` decimals, scaled to integers and
+      delta-of-delta encoded (P1 readings have three decimals),
+    * ``x`` / ``xi``: Gorilla XOR floats (``xi`` restores ints); allows ``None``,
+    * ``s``: anything else, stored run-length encoded in the block header.
+    """
+    has_null = has_float = non_finite = False
+    for v in values:
+        if v is None:
+            has_null = True
+        elif isinstance(v, bool) or not isinstance(v, (int, float)):
+            return "s"
+        elif isinstance(v, float):
+            has_float = True
+            non_finite = non_finite or not math.isfinite(v)
+        elif abs(v) >= MAX_EXACT_INT:
+            return "s"
+    if has_null or non_finite:
+        return "x" if has_float else "xi"
+    if not has_float:
+        return "i"
+    decimals = _decimals(values)
+    return "x" if decimals is None else f"d{decimals}"
+
+def _rle(values: List[Any]) -> List[List[Any]]:
+    runs: List[List[Any]] = []
+    for v in values:
+        if runs and runs[-1][0] == v and type(runs[-1][0]) is type(v):
+            runs[-1][1] += 1
+        else:
+            runs.append([v, 1])
+    return runs
+
+def encode_block(timestamps: List[int], rows: List[Dict[str, Any]]) -> bytes:
+    """Serialize rows (already sorted by timestamp) into one self-describing block."""
+    names: List[str] = []
+    seen = set()
+    for row in rows:
+        for key in row:
+            if key not in seen:
+                seen.add(key)
+                names.append(key)
+
+    bits = BitWriter()
+    encode_timestamps(bits, timestamps)
+    columns: List[Tuple[str, str]] = []
+    strings: Dict[str, List[List[Any]]] = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        kind = _column_kind(values)
+        columns.append((name, kind))
+        if kind == "s":
+            strings[name] = _rle(values)
+        elif kind == "i":
+            encode_timestamps(bits, values)
+        elif kind.startswith("d"):
+            scale = 10 ** int(kind[1:])
+            encode_timestamps(bits, [round(v * scale) for v in values])
+        else:
+            encode_floats(bits, values)
+
+    header = json.dumps({
+        "n": len(rows), "t0": timestamps[0], "t1": timestamps[-1],
+        "columns": columns, "strings": strings,
+    }, separators=(",", ":")).encode()
+    payload = bits.to_bytes()
+    return BLOCK_MAGIC + _LEN.pack(len(header)) + header + _LEN.pack(len(payload)) + payload
+
+def _decode_column(bits: BitReader, kind: str, count: int, runs: List[List[Any]] | None) -> List[Any]:
+    if kind == "s":
+        values: List[Any] = []
+        for value, run in runs or []:
+            values.extend([value] * run)
+        return values
+    if kind == "i":
+        return decode_timestamps(bits, count)
+    if kind.startswith("d"):
+        scale = 10 ** int(kind[1:])
+        return [n / scale for n in decode_timestamps(bits, count)]
+    as_int = kind == "xi"
+    return [_bits_to_value(raw, "i" if as_int else "f") for raw in decode_floats(bits, count)]
+
+def iter_blocks(buf, start_ms: int | None = None, end_ms: int | None = None
+                ) -> Iterator[Tuple[Dict[str, Any], List[int], Dict[str, List[Any]]]]:
+    """Yield ``(header, timestamps, columns)`` for blocks overlapping the range.
+
+    Blocks outside the range are skipped using only their header.
+    """
+    pos, size = 0, len(buf)
+    while pos + 8 <= size:
+        if buf[pos:pos + 4] != BLOCK_MAGIC:
+            raise ValueError(f"Corrupt segment block at offset {pos}")
+        (header_len,) = _LEN.unpack_from(buf, pos + 4)
+        header = json.loads(bytes(buf[pos + 8:pos + 8 + header_len]))
+        pos += 8 + header_len
+        (payload_len,) = _LEN.unpack_from(buf, pos)
+        payload_start, pos = pos + 4, pos + 4 + payload_len
+        if (start_ms is not None and header["t1"] < start_ms) or (end_ms is not None and header["t0"] > end_ms):
+            continue
+
+        count = header["n"]
+        bits = BitReader(bytes(buf[payload_start:pos]))
+        timestamps = decode_timestamps(bits, count)
+        columns = {
+            name: _decode_column(bits, kind, count, header["strings"].get(name))
+            for name, kind in header["columns"]
+        }
+        yield header, timestamps, columns
+
+class SegmentBackend(Backend):
+    """Time-partitioned, compressed segment store.
+
+    Each source is written to ``<data_dir>/<source>/<partition>.seg`` files,
+    one per day (or month). Rows are buffered into blocks of ``block_size``
+    rows; each block stores its timestamps delta-of-delta encoded and its
+    numeric columns XOR (Gorilla) encoded, or delta-of-delta encoded when
+    they are integers or short decimals (see ``_column_kind``), preceded by
+    a small header with the block's time range. ``index.json`` per source
+    records the time range of every segment, so range reads only open (and
+    ``mmap``) the segments they need and only decode overlapping blocks.
+
+    Up to ``block_size - 1`` rows per source live only in memory until the
+    block is written; ``flush()``/``close()`` write partial blocks.
+    """
+
+    def __init__(self, data_dir: str | Path, partition: str = "day", block_size: int = 60):
+        if partition not in ("day", "month"):
+            raise ValueError(f"Invalid partition: {partition}. Use 'day' or 'month'")
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.partition = partition
+        self.block_size = block_size
+        # source -> (partition key, [(ts_ms, row)])
+        self._open: Dict[str, Tuple[str, List[Tuple[int, Dict[str, Any]]]]] = {}
+        self._lock = threading.Lock()
+
+    def partition_key(self, ts_ms: int) -> str:
+        fmt = "%Y-%m-%d" if self.partition == "day" else "%Y-%m"
+        return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime(fmt)
+
+    async def write(self, data: Dict[str, Any], source_name: str) -> None:
+        """Buffer a row; full blocks are compressed and appended in a worker thread."""
+        try:
+            await self.write_many([data], source_name)
+        except Exception as e:
+            print(f"Error writing segment ({source_name}): {e}")
+
+    async def write_many(self, rows: List[Dict[str, Any]], source_name: str) -> None:
+        """Buffer rows and write the blocks they complete; errors are raised, not printed."""
+        to_write = []
+        for data in rows:
+            row = dict(with_epoch_ms(data))
+            ts_ms = row.pop(EPOCH_MS_COLUMN, None)
+            if not isinstance(ts_ms, int):
+                ts_ms = int(time.time() * 1000)
+            row.pop("timestamp", None)
+
+            key = self.partition_key(ts_ms)
+            current = self._open.get(source_name)
+            if current is not None and current[0] != key:
+                to_write.append((source_name, current[0], current[1]))
+                current = None
+            if current is None:
+                current = (key, [])
+                self._open[source_name] = current
+            current[1].append((ts_ms, row))
+            if len(current[1]) >= self.block_size:
+                to_write.append((source_name, key, current[1]))
+                del self._open[source_name]
+
+        if to_write:
+            await asyncio.to_thread(self._sync_write_blocks, to_write)
+
+    async def flush(self) -> None:
+        """Write all partially filled blocks."""
+        pending = [(source, key, rows) for source, (key, rows) in self._open.items()]
+        self._open.clear()
+        if pending:
+            await asyncio.to_thread(self._sync_write_blocks, pending)
+
+    async def close(self) -> None:
+        await self.flush()
+
+    def _sync_write_blocks(self, blocks: List[Tuple[str, str, List[Tuple[int, Dict[str, Any]]]]]) -> None:
+        with self._lock:
+            for source_name, key, samples in blocks:
+                samples.sort(key=lambda item: item[0])
+                timestamps = [ts for ts, _ in samples]
+                block = encode_block(timestamps, [row for _, row in samples])
+
+                source_dir = self.data_dir / source_name
+                source_dir.mkdir(parents=True, exist_ok=True)
+                with open(source_dir / f"{key}.seg", "ab") as f:
+                    f.write(block)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._update_index(source_dir, f"{key}.seg", timestamps[0], timestamps[-1], len(samples))
+
+    def _update_index(self, source_dir: Path, segment: str, t0: int, t1: int, rows: int) -> None:
+        index = self.load_index(source_dir)
+        entry = index.get(segment)
+        if entry is None:
+            index[segment] = [t0, t1, rows]
+        else:
+            index[segment] = [min(entry[0], t0), max(entry[1], t1), entry[2] + rows]
+        tmp = source_dir / "index.json.tmp"
+        tmp.write_text(json.dumps(index, sort_keys=True))
+        os.replace(tmp, source_dir / "index.json")
+
+    @staticmethod
+    def load_index(source_dir: Path) -> Dict[str, List[int]]:
+        try:
+            return json.loads((source_dir / "index.json").read_text())
+        except FileNotFoundError:
+            return {}
+
+    def read_columns(self, source_name: str, start_ms: int | None = None,
+                     end_ms: int | None = None) -> Dict[str, List[Any]]:
+        """Read a time range as columns: ``{"ts_ms": [...], "<column>": [...]}``, sorted by time.
+
+        Only rows already written to disk are returned.
+        """
+        source_dir = self.data_dir / source_name
+        index = self.load_index(source_dir)
+        wanted = sorted(
+            name for name, (t0, t1, _) in index.items()
+            if (start_ms is None or t1 >= start_ms) and (end_ms is None or t0 <= end_ms)
+        )
+
+        result: Dict[str, List[Any]] = {EPOCH_MS_COLUMN: []}
+        for name in wanted:
+            path = source_dir / name
+            if not path.exists() or path.stat().st_size == 0:
+                continue
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for _, timestamps, columns in iter_blocks(buf, start_ms, end_ms):
+                    keep = [
+                        i for i, ts in enumerate(timestamps)
+                        if (start_ms is None or ts >= start_ms) and (end_ms is None or ts <= end_ms)
+                    ]
+                    offset = len(result[EPOCH_MS_COLUMN])
+                    result[EPOCH_MS_COLUMN].extend(timestamps[i] for i in keep)
+                    for col, values in columns.items():
+                        target = result.setdefault(col, [None] * offset)
+                        target.extend(values[i] for i in keep)
+                    for col, target in result.items():
+                        if len(target) < offset + len(keep):
+                            target.extend([None] * (offset + len(keep) - len(target)))
+
+        order = sorted(range(len(result[EPOCH_MS_COLUMN])), key=result[EPOCH_MS_COLUMN].__getitem__)
+        if order != list(range(len(order))):
+            result = {col: [values[i] for i in order] for col, values in result.items()}
+        return result
+
+    def read_range(self, source_name: str, start_ms: int | None = None,
+                   end_ms: int | None = None) -> List[Dict[str, Any]]:
+        """Read a time range as row dicts (with ``timestamp`` and ``ts_ms``)."""
+        columns = self.read_columns(source_name, start_ms, end_ms)
+        names = list(columns)
+        rows = []
+        for values in zip(*(columns[n] for n in names)):
+            row = {n: v for n, v in zip(names, values) if v is not None}
+            row["timestamp"] = datetime.fromtimestamp(
+                row[EPOCH_MS_COLUMN] / 1000, tz=timezone.utc
+            ).strftime('%Y-%m-%dT%H:%M:%SZ')
+            rows.append(row)
+        return rows
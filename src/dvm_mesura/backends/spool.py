@@ -0,0 +1,117 @@
+from __future__ import annotations
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from ..core.base import Backend
+from ..core.spool import Spool
+
+class SpooledBackend(Backend):
+    """Wraps a backend so failed or slow writes are spooled to disk and replayed.
+
+    A write that raises or takes longer than ``timeout`` seconds is appended
+    to the spool instead. While the spool holds rows, new rows are appended
+    behind them so order is kept, and a replay task feeds the backlog to the
+    backend's ``write_many`` in batches of ``batch_size`` until it is empty.
+    A backlog left by a previous run is replayed as soon as the backend is
+    created inside the event loop, or by ``run`` (a background task that
+    also checks the spool every ``check_interval`` seconds), without
+    waiting for the next write.
+
+    Delivery is at-least-once: a write that completes after its timeout
+    fired is replayed as well.
+    """
+
+    def __init__(self, backend: Backend, spool_path: str | Path, timeout: float = 10.0,
+                 batch_size: int = 500, retry_interval: float = 5.0, max_retry_interval: float = 300.0,
+                 check_interval: float = 60.0):
+        self.backend = backend
+        self.spool = Spool(spool_path)
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.check_interval = check_interval
+        self.spooled = 0
+        self.replayed = 0
+        self._replay_task: asyncio.Task | None = None
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # Created before the event loop started: run() starts the replay
+        else:
+            if self.spool.pending:
+                self._start_replay()
+
+    @property
+    def name(self) -> str:
+        return self.spool.path.name
+
+    async def write(self, data: Dict[str, Any], source_name: str) -> None:
+        try:
+            await self.write_many([data], source_name)
+        except Exception as e:
+            print(f"Error writing to spool {self.name} ({source_name}): {e}")
+
+    async def write_many(self, rows: List[Dict[str, Any]], source_name: str) -> None:
+        """Write rows in one backend call, or spool them all; only spool errors are raised."""
+        if not self.spool.pending:
+            try:
+                await asyncio.wait_for(self.backend.write_many(rows, source_name), self.timeout)
+                return
+            except asyncio.TimeoutError:
+                print(f"Write to {type(self.backend).__name__} ({source_name}) timed out; spooling")
+            except Exception as e:
+                print(f"Error writing to {type(self.backend).__name__} ({source_name}): {e}; spooling")
+        for data in rows:
+            await asyncio.to_thread(self.spool.append, source_name, data)
+            self.spooled += 1
+        self._start_replay()
+
+    async def run(self) -> None:
+        """Start replaying whenever the spool holds rows, checking every ``check_interval`` seconds."""
+        while True:
+            if self.spool.pending:
+                self._start_replay()
+            await asyncio.sleep(self.check_interval)
+
+    def _start_replay(self) -> None:
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.create_task(self.replay())
+
+    async def replay(self) -> None:
+        """Write spooled rows back in order, retrying with backoff until the spool is empty."""
+        delay = self.retry_interval
+        while self.spool.pending:
+            batch = await asyncio.to_thread(self.spool.read_batch, self.batch_size)
+            try:
+                await self._replay_batch(batch)
+                delay = self.retry_interval
+            except Exception as e:
+                print(f"Replaying spool {self.name} failed ({e}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(self.max_retry_interval, delay * 2)
+        if self.replayed:
+            print(f"Spool {self.name} replayed ({self.replayed} rows)")
+            self.replayed = 0
+
+    async def _replay_batch(self, batch: List[Tuple[int, str, Dict[str, Any]]]) -> None:
+        # Consecutive rows of the same source go to the backend together
+        i = 0
+        while i < len(batch):
+            j = i
+            while j + 1 < len(batch) and batch[j + 1][1] == batch[i][1]:
+                j += 1
+            rows = [row for _, _, row in batch[i:j + 1]]
+            await asyncio.wait_for(self.backend.write_many(rows, batch[i][1]), self.timeout * max(1, len(rows) / 100))
+            await asyncio.to_thread(self.spool.consume, batch[j][0])
+            self.replayed += len(rows)
+            i = j + 1
+
+    async def close(self) -> None:
+        """Stop replaying (the spool is kept for the next start) and close the backend."""
+        if self._replay_task is not None and not self._replay_task.done():
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+        if self.spool.pending:
+            print(f"Spool {self.name} still holds rows; they are replayed on the next start")
+        await self.backend.close()
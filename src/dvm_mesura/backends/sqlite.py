@@ -1,95 +1,536 @@
 from __future__ import annotations
 import asyncio
+import queue
+import random
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
 from ..core.base import Backend
+from .locking import WriterLock, is_busy_error
+from .long import LongFormat
+from .rollup import RollupEngine
+from ..core.helpers import EPOCH_MS_COLUMN, with_epoch_ms
+from ..core.record import RecordBatch, Sample, Schema
+
+def column_type(value: Any) -> str:
+    """Map a Python value to the SQLite column type used for new columns."""
+    if isinstance(value, int):
+        return "INTEGER"
+    elif isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+class TableSchema:
+    """Cached view of a table's columns and the INSERT statements compiled for it."""
+
+    def __init__(self, name: str, columns: Dict[str, str] | None = None):
+        self.name = name
+        # column name -> declared type, in table order
+        self.columns: Dict[str, str] = dict(columns or {})
+        self.indexed = False
+        self._inserts: Dict[Tuple[str, ...], str] = {}
+        # Record schemas (see core.record) whose columns all exist in the table
+        self.known: set[Schema] = set()
+
+    def insert_sql(self, columns: Tuple[str, ...]) -> str:
+        """Return the (cached) INSERT statement for a given column set."""
+        sql = self._inserts.get(columns)
+        if sql is None:
+            placeholders = ", ".join(["?"] * len(columns))
+            col_names = ", ".join([f'"{c}"' for c in columns])
+            sql = f"INSERT INTO {self.name} ({col_names}) VALUES ({placeholders})"
+            self._inserts[columns] = sql
+        return sql
+
+class SQLiteDatabase:
+    """A long-lived connection to one database file plus its schema cache.
+
+    Each database file has one instance, owned by its ``DatabaseWriter``
+    thread, so steady-state writes are a single cached ``execute``.
+    """
+
+    def __init__(self, db_path: Path, busy_timeout: float = 5.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.schemas: Dict[str, TableSchema] = {}
+        self.rollups: RollupEngine | None = None
+        self.long = LongFormat(())
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # ``timeout`` installs SQLite's busy handler (PRAGMA busy_timeout)
+            self._conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self.schemas.clear()
+        self.long.reset()
+
+    def _load_schema(self, table_name: str) -> TableSchema | None:
+        cursor = self.conn.execute(f"PRAGMA table_info({table_name})")
+        columns = {row[1]: row[2] for row in cursor.fetchall()}
+        if not columns:
+            return None
+        schema = TableSchema(table_name, columns)
+        self.schemas[table_name] = schema
+        return schema
+
+    def ensure_columns(self, table_name: str, data: Dict[str, Any]) -> TableSchema | None:
+        """Create the table or add missing columns. Only new keys touch the catalog.
+
+        Tables carrying the epoch-millisecond column also get an index on it.
+        """
+        schema = self.schemas.get(table_name)
+        if isinstance(data, Sample):
+            # Rows sharing a record schema are checked once
+            if schema is not None and data.schema in schema.known:
+                return schema
+        elif schema is not None and all(k in schema.columns for k in data):
+            return schema
+        schema = self._evolve(table_name, data, schema)
+        if schema is not None and isinstance(data, Sample):
+            schema.known.add(data.schema)
+        if schema is not None and not schema.indexed and EPOCH_MS_COLUMN in schema.columns:
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table_name}_{EPOCH_MS_COLUMN} ON {table_name} ("{EPOCH_MS_COLUMN}")'
+            )
+            schema.indexed = True
+        return schema
+
+    def _evolve(self, table_name: str, data: Dict[str, Any], schema: TableSchema | None) -> TableSchema | None:
+        """Bring the table in line with the keys of ``data``."""
+        if schema is None:
+            schema = self._load_schema(table_name)
+
+        if schema is None:
+            cols_sql = [f'"{k}" {column_type(v)}' for k, v in data.items()]
+            if not cols_sql:
+                return None
+            self.conn.execute(f'CREATE TABLE {table_name} ({", ".join(cols_sql)})')
+            schema = TableSchema(table_name, {k: column_type(v) for k, v in data.items()})
+            self.schemas[table_name] = schema
+            return schema
+
+        for k, v in data.items():
+            if k in schema.columns:
+                continue
+            col_type = column_type(v)
+            try:
+                self.conn.execute(f'ALTER TABLE {table_name} ADD COLUMN "{k}" {col_type}')
+            except sqlite3.OperationalError as e:
+                # Another process may have added it since we cached the schema
+                if "duplicate column" not in str(e).lower():
+                    raise
+            schema.columns[k] = col_type
+        return schema
+
+    def insert_many(self, rows: List[Tuple[str, Dict[str, Any] | RecordBatch]]) -> None:
+        """Insert rows for any number of tables in a single transaction.
+
+        Consecutive rows sharing a table and column set go through one
+        ``executemany``; a ``RecordBatch`` goes through one ``executemany``
+        of its value tuples.
+        """
+        if not rows:
+            return
+        try:
+            batch: List[List[Any]] = []
+            current: Tuple[str, Tuple[str, ...]] | None = None
+            sql = ""
+            inserted: Dict[str, List[Dict[str, Any]]] = {}
+            for table_name, data in rows:
+                if table_name in self.long:
+                    for row in data if isinstance(data, RecordBatch) else [data]:
+                        self.long.insert(self, table_name, row)
+                    continue
+                if isinstance(data, RecordBatch):
+                    if batch:
+                        self.conn.executemany(sql, batch)
+                        batch, current = [], None
+                    self._insert_batch(table_name, data)
+                    if self.rollups is not None and table_name in self.rollups.rollups:
+                        inserted.setdefault(table_name, []).extend(data)
+                    continue
+                schema = self.ensure_columns(table_name, data)
+                if schema is None:
+                    continue
+                columns, values = _columns_and_values(data)
+                if (table_name, columns) != current:
+                    if batch:
+                        self.conn.executemany(sql, batch)
+                        batch = []
+                    current = (table_name, columns)
+                    sql = schema.insert_sql(columns)
+                batch.append(values)
+                inserted.setdefault(table_name, []).append(data)
+            if batch:
+                self.conn.executemany(sql, batch)
+            if self.rollups is not None:
+                for table_name, table_rows in inserted.items():
+                    self.rollups.apply(self, table_name, table_rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.schemas.clear()
+            self.long.reset()
+            raise
+
+    def _insert_batch(self, table_name: str, batch: RecordBatch) -> None:
+        if not len(batch):
+            return
+        # The first non-null value of each column decides its type when the column is new
+        types = Sample(batch.schema, tuple(next((v for v in column if v is not None), None) for column in batch.columns))
+        schema = self.ensure_columns(table_name, types)
+        if schema is not None:
+            self.conn.executemany(schema.insert_sql(batch.schema.columns), batch.value_rows())
+
+    def insert(self, table_name: str, data: Dict[str, Any] | RecordBatch) -> None:
+        """Insert one row (or one ``RecordBatch``) in its own transaction."""
+        if isinstance(data, RecordBatch):
+            self.insert_many([(table_name, data)])
+            return
+        if table_name in self.long:
+            try:
+                self.long.insert(self, table_name, data)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                self.long.reset()
+                raise
+            return
+        schema = self.ensure_columns(table_name, data)
+        if schema is None:
+            return
+        columns, values = _columns_and_values(data)
+        try:
+            try:
+                self.conn.execute(schema.insert_sql(columns), values)
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e) and "no column named" not in str(e):
+                    raise
+                # The cached schema is stale (table dropped/recreated by
+                # another tool); reload it once and retry.
+                self.schemas.pop(table_name, None)
+                schema = self.ensure_columns(table_name, data)
+                if schema is None:
+                    return
+                self.conn.execute(schema.insert_sql(columns), values)
+            if self.rollups is not None:
+                self.rollups.apply(self, table_name, [data])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+def _columns_and_values(data: Mapping[str, Any]) -> Tuple[Tuple[str, ...], Sequence[Any]]:
+    if isinstance(data, Sample):
+        return data.schema.columns, data.values
+    columns = tuple(data.keys())
+    return columns, [data[c] for c in columns]
+
+class DatabaseWriter(threading.Thread):
+    """Dedicated writer thread for one database file.
+
+    The thread owns the ``SQLiteDatabase`` connection and consumes rows from a
+    thread-safe queue, so writes never go through the shared default executor.
+    Each submitted row gets a ``concurrent.futures.Future`` that resolves once
+    the row is committed (or fails).
+
+    With ``batch_size`` 1 every row is committed as soon as it arrives, grouped
+    only with rows that are already waiting in the queue. With a larger
+    ``batch_size`` rows are group-committed once ``batch_size`` rows are
+    pending or ``flush_interval`` seconds after the first pending row.
+
+    Commits that hit another process's write lock are retried up to
+    ``max_retries`` times with jittered exponential backoff. With a
+    ``WriterLock`` every transaction is additionally wrapped in the
+    cross-process advisory lock.
+    """
+
+    # Upper bound on rows grouped into one transaction in unbuffered mode
+    MAX_GROUP = 500
+
+    def __init__(self, db: SQLiteDatabase, batch_size: int = 1, flush_interval: float = 5.0,
+                 lock: WriterLock | None = None, max_retries: int = 5, backoff: float = 0.1,
+                 max_backoff: float = 5.0):
+        super().__init__(name=f"sqlite-writer-{db.db_path.name}", daemon=True)
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = lock
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue: queue.Queue[Tuple[Any, Any, Future]] = queue.Queue()
+        self.users = 0
+        self.stats = {"rows": 0, "commits": 0, "errors": 0, "busy_retries": 0, "lock_waits": 0, "lock_wait_seconds": 0.0}
+
+    def submit(self, table_name: str, data: Dict[str, Any]) -> Future:
+        """Queue a row; the returned future resolves when it is committed."""
+        future: Future = Future()
+        self.queue.put((table_name, data, future))
+        return future
+
+    def submit_many(self, table_name: str, rows: List[Dict[str, Any]]) -> List[Future]:
+        """Queue rows so they are committed in the same transaction; one future per row."""
+        futures = [Future() for _ in rows]
+        self.queue.put((_MANY, [(table_name, data, future) for data, future in zip(rows, futures)], None))
+        return futures
+
+    def flush(self) -> Future:
+        """Commit everything queued before this call."""
+        future: Future = Future()
+        self.queue.put((_FLUSH, None, future))
+        return future
+
+    def stop(self) -> Future:
+        """Commit what is queued, close the connection and end the thread."""
+        future: Future = Future()
+        self.queue.put((_STOP, None, future))
+        return future
+
+    def run(self) -> None:
+        pending: List[Tuple[str, Dict[str, Any], Future]] = []
+        deadline: float | None = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                table_name, data, future = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._commit(pending)
+                pending, deadline = [], None
+                continue
+
+            if table_name is _FLUSH or table_name is _STOP:
+                self._commit(pending)
+                pending, deadline = [], None
+                if table_name is _STOP:
+                    self.db.close()
+                    if self.lock is not None:
+                        self.lock.close()
+                    future.set_result(None)
+                    return
+                future.set_result(None)
+                continue
+
+            if table_name is _MANY:
+                pending.extend(item for item in data if item[2].set_running_or_notify_cancel())
+            # Skip rows whose caller gave up waiting before we got to them
+            elif not future.set_running_or_notify_cancel():
+                continue
+            else:
+                pending.append((table_name, data, future))
+
+            if self.batch_size > 1:
+                if len(pending) >= self.batch_size:
+                    self._commit(pending)
+                    pending, deadline = [], None
+                elif deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            elif self.queue.empty() or len(pending) >= self.MAX_GROUP:
+                self._commit(pending)
+                pending = []
+
+    def _transaction(self, fn: Callable[..., None], *args: Any) -> None:
+        """Run one write transaction, retrying while another process holds the database."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.lock is None:
+                    return fn(*args)
+                waits = self.lock.waits
+                with self.lock:
+                    self.stats["lock_waits"] += self.lock.waits - waits
+                    self.stats["lock_wait_seconds"] = self.lock.wait_seconds
+                    return fn(*args)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.max_retries:
+                    raise
+                self.stats["busy_retries"] += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _commit(self, pending: List[Tuple[str, Dict[str, Any], Future]]) -> None:
+        if not pending:
+            return
+        try:
+            self._transaction(self.db.insert_many, [(table_name, data) for table_name, data, _ in pending])
+        except Exception:
+            # Fall back to one transaction per row so a single bad row (or a
+            # stale schema) does not take the rest of the batch down with it.
+            for table_name, data, future in pending:
+                try:
+                    self._transaction(self.db.insert, table_name, data)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    future.set_exception(e)
+                else:
+                    self.stats["rows"] += len(data) if isinstance(data, RecordBatch) else 1
+                    self.stats["commits"] += 1
+                    future.set_result(None)
+            return
+        self.stats["rows"] += sum(len(data) if isinstance(data, RecordBatch) else 1 for _, data, _ in pending)
+        self.stats["commits"] += 1
+        for _, _, future in pending:
+            future.set_result(None)
+
+# Control messages for DatabaseWriter
+_MANY = object()
+_FLUSH = object()
+_STOP = object()
+
+def _snapshot(data: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Copy a row the caller might still change; ``Sample`` rows are immutable."""
+    return data if isinstance(data, Sample) else dict(data)
 
 class SQLiteBackend(Backend):
     """SQLite backend with automatic schema evolution and concurrency protection."""
-    
-    # Class-level registry for locks, keyed by database path to ensure
-    # that multiple instances targeting the same file share the same lock.
-    _locks: Dict[Path, asyncio.Lock] = {}
 
-    def __init__(self, db_path: str | Path):
+    # Class-level registry keyed by database path so that multiple instances
+    # targeting the same file share one writer thread (and one connection).
+    # The first instance's writer options win; later conflicting ones are reported.
+    _writers: Dict[Path, DatabaseWriter] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_path: str | Path, batch_size: int = 1, flush_interval: float = 5.0,
+                 rollups: Dict[str, List[str]] | None = None, long_sources: Iterable[str] = (),
+                 series_keys: Dict[str, str] | None = None, busy_timeout: float = 5.0, max_retries: int = 5, writer_lock: bool = False):
+        """
+        Args:
+            db_path: SQLite database file.
+            batch_size: Rows to queue before a group commit. 1 (default) commits every row immediately.
+            flush_interval: Maximum seconds a queued row waits before it is committed.
+            rollups: Rollup resolutions per table, e.g. ``{"energy": ["1h", "1d"]}``,
+                maintained in the same transaction as the raw rows.
+            long_sources: Sources stored in long (narrow) format, see ``LongFormat``.
+            series_keys: Key column of long-format sources writing one row per entity
+                (e.g. ``{"evohome": "system_id"}``), so entities at the same timestamp stay apart.
+            busy_timeout: Seconds SQLite waits for another connection's write lock.
+            max_retries: Retries (with jittered backoff) of a transaction that still finds the database locked.
+            writer_lock: Coordinate with other processes through the ``<db>.lock`` advisory lock file.
+        """
         self.db_path = Path(db_path).absolute()
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        if self.db_path not in self._locks:
-            self._locks[self.db_path] = asyncio.Lock()
-        self._lock = self._locks[self.db_path]
-        
-        # Initialize WAL mode
+
+        # Initialize WAL mode. Incremental auto-vacuum only takes effect on a
+        # new file, so it has to be set first; it lets retention give pages back.
         with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
             conn.execute("PRAGMA journal_mode=WAL")
 
-    async def write(self, data: Dict[str, Any], source_name: str) -> None:
-        """Write data to a table named after the source_name."""
+        with self._registry_lock:
+            writer = self._writers.get(self.db_path)
+            if writer is None:
+                writer = DatabaseWriter(
+                    SQLiteDatabase(self.db_path, busy_timeout),
+                    batch_size,
+                    flush_interval,
+                    lock=WriterLock(self.db_path) if writer_lock else None,
+                    max_retries=max_retries,
+                )
+                self._writers[self.db_path] = writer
+                writer.start()
+            else:
+                self._check_shared(writer, batch_size=batch_size, flush_interval=flush_interval,
+                                   busy_timeout=busy_timeout, max_retries=max_retries, writer_lock=writer_lock)
+            writer.users += 1
+        self.writer = writer
+        self.db = writer.db
+        self.buffered = writer.batch_size > 1
+        self._closed = False
+
+        if rollups:
+            # Backends sharing the database share its rollup engine: merge the specs
+            if self.db.rollups is None:
+                self.db.rollups = RollupEngine(rollups)
+            else:
+                self.db.rollups.add(rollups)
+        if long_sources:
+            self.db.long.tables.update(s.replace("-", "_") for s in long_sources)
+        if series_keys:
+            self.db.long.keys.update((s.replace("-", "_"), key) for s, key in series_keys.items())
+
+    def _check_shared(self, writer: DatabaseWriter, **options: Any) -> None:
+        """Warn about options that differ from those of the writer this backend shares."""
+        current = {
+            "batch_size": writer.batch_size,
+            "flush_interval": writer.flush_interval,
+            "busy_timeout": writer.db.busy_timeout,
+            "max_retries": writer.max_retries,
+            "writer_lock": writer.lock is not None,
+        }
+        conflicts = [f"{name}={value!r} (using {current[name]!r})"
+                     for name, value in options.items() if value != current[name]]
+        if conflicts:
+            print(f"Warning: {self.db_path.name} already has a writer; ignoring {', '.join(conflicts)}")
+
+    def submit(self, data: Dict[str, Any], source_name: str) -> asyncio.Future:
+        """Queue a row and return an awaitable that resolves when it is committed."""
         table_name = source_name.replace("-", "_")
-        
-        async with self._lock:
-            # We run the blocking sqlite3 calls in a separate thread to keep the loop free
-            # although for this specific application, the lock already prevents concurrent writes.
-            await asyncio.to_thread(self._sync_write, data, table_name, source_name)
-
-    def _sync_write(self, data: Dict[str, Any], table_name: str, source_name: str) -> None:
-        """Synchronous write implementation called via asyncio.to_thread with a lock."""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Check if table exists
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-                table_exists = cursor.fetchone() is not None
-                
-                existing_cols = set()
-                if table_exists:
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    existing_cols = {row[1] for row in cursor.fetchall()}
-                
-                columns = list(data.keys())
-                
-                if not table_exists:
-                    cols_sql = []
-                    for k in columns:
-                        val = data[k]
-                        if isinstance(val, int):
-                            col_type = "INTEGER"
-                        elif isinstance(val, float):
-                            col_type = "REAL"
-                        else:
-                            col_type = "TEXT"
-                        cols_sql.append(f'"{k}" {col_type}')
-                    
-                    if not cols_sql:
-                        return
-
-                    create_sql = f'CREATE TABLE {table_name} ({", ".join(cols_sql)})'
-                    cursor.execute(create_sql)
-                else:
-                    for k in columns:
-                        if k not in existing_cols:
-                            val = data[k]
-                            if isinstance(val, int):
-                                col_type = "INTEGER"
-                            elif isinstance(val, float):
-                                col_type = "REAL"
-                            else:
-                                col_type = "TEXT"
-                            
-                            try:
-                                cursor.execute(f'ALTER TABLE {table_name} ADD COLUMN "{k}" {col_type}')
-                            except sqlite3.OperationalError as e:
-                                if "duplicate column" not in str(e).lower():
-                                    raise
-
-                placeholders = ", ".join(["?"] * len(columns))
-                col_names = ", ".join([f'"{c}"' for c in columns])
-                values = [data[c] for c in columns]
-                
-                cursor.execute(f"INSERT INTO {table_name} ({col_names}) VALUES ({placeholders})", values)
-                conn.commit()
+        return asyncio.wrap_future(self.writer.submit(table_name, with_epoch_ms(_snapshot(data))))
+
+    async def write(self, data: Dict[str, Any], source_name: str) -> None:
+        """Write data to a table named after the source_name.
 
+        In buffered mode this returns as soon as the row is queued.
+        """
+        future = self.submit(data, source_name)
+        if self.buffered:
+            future.add_done_callback(lambda f: self._report(f, source_name))
+            return
+        try:
+            await future
         except Exception as e:
             print(f"Error writing to SQLite ({source_name}): {e}")
+
+    async def write_many(self, rows: List[Dict[str, Any]] | RecordBatch, source_name: str) -> None:
+        """Write rows and wait until they are committed; errors are raised, not printed.
+
+        A ``RecordBatch`` is queued as one item and inserted column-wise with a single ``executemany``.
+        """
+        table_name = source_name.replace("-", "_")
+        if isinstance(rows, RecordBatch):
+            await asyncio.wrap_future(self.writer.submit(table_name, with_epoch_ms(rows)))
+            return
+        futures = self.writer.submit_many(table_name, [with_epoch_ms(_snapshot(data)) for data in rows])
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    @staticmethod
+    def _report(future: asyncio.Future, source_name: str) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error writing to SQLite ({source_name}): {future.exception()}")
+
+    async def flush(self) -> None:
+        """Wait until every row queued so far is committed."""
+        await asyncio.wrap_future(self.writer.flush())
+
+    async def close(self) -> None:
+        """Drain queued rows; the last backend using a file also stops its writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._registry_lock:
+            self.writer.users -= 1
+            last = self.writer.users == 0
+            if last and self._writers.get(self.db_path) is self.writer:
+                del self._writers[self.db_path]
+        if last:
+            await asyncio.wrap_future(self.writer.stop())
+            await asyncio.to_thread(self.writer.join)
+            stats = self.writer.stats
+            print(
+                f"SQLite writer {self.db_path.name}: {stats['rows']} rows in {stats['commits']} commits, "
+                f"{stats['errors']} errors, {stats['busy_retries']} busy retries, "
+                f"{stats['lock_waits']} lock waits ({stats['lock_wait_seconds']:.1f}s)"
+            )
+        else:
+            await self.flush()
@@ -1,7 +1,9 @@
 import sqlite3
 import argparse
 import csv
+import gzip
 from pathlib import Path
+from dvm_mesura.backends.locking import WriterLock
 
 def get_columns(cursor, table):
     cursor.execute(f"PRAGMA table_info({table})")
@@ -10,7 +12,9 @@ def get_columns(cursor, table):
 def merge_csv_to_db(csv_path, dest_db_path, dest_table):
     print(f"Merging {csv_path} into {dest_db_path} ({dest_table})...")
     
-    with open(csv_path, 'r', encoding='utf-8') as f:
+    # Rotated CSV files are gzipped by the CSV backend
+    opener = gzip.open if str(csv_path).endswith(".gz") else open
+    with opener(csv_path, 'rt', encoding='utf-8', newline='') as f:
         reader = csv.reader(f)
         try:
             headers = next(reader)
@@ -77,8 +81,14 @@ def merge_csv_to_db(csv_path, dest_db_path, dest_table):
 
     if rows_to_insert:
         try:
-            cur.executemany(query, rows_to_insert)
-            conn.commit()
+            # Hold the writer lock so live pollers queue up instead of failing
+            lock = WriterLock(dest_db_path, timeout=300)
+            try:
+                with lock:
+                    cur.executemany(query, rows_to_insert)
+                    conn.commit()
+            finally:
+                lock.close()
             inserted = len(rows_to_insert)
             print(f"Success! Inserted {inserted} new distinct rows.\n")
         except Exception as e:
@@ -114,9 +124,12 @@ def main():
     print(f"Target Database: {target_path}\n" + "="*40)
     
     for csv_name, dest_table in mappings:
-        csv_path = data_dir / csv_name
-        if csv_path.exists():
-            merge_csv_to_db(str(csv_path), str(target_path), dest_table)
+        # Rotated files (<name>.<date>[.<n>].csv[.gz]) first, then the live file
+        stem = csv_name[:-len(".csv")]
+        rotated = sorted(data_dir.glob(f"{stem}.[0-9]*.csv")) + sorted(data_dir.glob(f"{stem}.[0-9]*.csv.gz"))
+        for csv_path in rotated + [data_dir / csv_name]:
+            if csv_path.exists():
+                merge_csv_to_db(str(csv_path), str(target_path), dest_table)
 
 if __name__ == "__main__":
     main()
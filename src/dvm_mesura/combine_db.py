@@ -1,6 +1,7 @@
 import sqlite3
 import argparse
 from pathlib import Path
+from dvm_mesura.backends.locking import WriterLock
 
 def get_columns(cursor, table, db_prefix=""):
     cursor.execute(f"PRAGMA {db_prefix}table_info({table})")
@@ -53,8 +54,14 @@ def merge_db(source_db_path, source_table, dest_db_path, dest_table):
         """
         
     try:
-        cur.execute(query)
-        conn_dest.commit()
+        # Hold the writer lock so live pollers queue up instead of failing
+        lock = WriterLock(dest_db_path, timeout=300)
+        try:
+            with lock:
+                cur.execute(query)
+                conn_dest.commit()
+        finally:
+            lock.close()
         
         cur.execute(f"SELECT COUNT(*) FROM {dest_table}")
         final_count = cur.fetchone()[0]
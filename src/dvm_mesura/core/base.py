@@ -1,13 +1,24 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Protocol
+from typing import Any, Dict, List, Mapping, Protocol
+from .record import RecordBatch, Sample
 
 class Backend(Protocol):
-    """Protocol for storage backends."""
-    async def write(self, data: Dict[str, Any], source_name: str) -> None:
+    """Protocol for storage backends.
+
+    Rows are read-only mappings: plain dicts or ``Sample`` records. Backends
+    may also offer ``write_many(rows, source_name)`` for the rows of one poll.
+    ``write`` reports its errors itself; ``write_many`` raises them, so the
+    controller uses it to count failed writes.
+    """
+    async def write(self, data: Mapping[str, Any], source_name: str) -> None:
         """Write data to the storage backend."""
         ...
 
+    async def close(self) -> None:
+        """Flush pending data and release any open resources."""
+        ...
+
 class Monitor(ABC):
     """Base class for all monitors."""
     
@@ -19,6 +30,6 @@ class Monitor(ABC):
         """Fetch data from the source."""
         pass
 
-    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process/Flatten the source data."""
+    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any] | Sample | List[Dict[str, Any]] | RecordBatch | None:
+        """Process/Flatten the source data into one row, a list of rows or a ``RecordBatch``. Return None to skip the sample."""
         return data
@@ -1,68 +1,443 @@
 from __future__ import annotations
 import asyncio
+import heapq
+import itertools
+import math
+import random
 import signal
+import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, List, Dict, Any, Mapping, Optional, Tuple
 from .base import Backend, Monitor
+from .dedup import ChangeFilter
+from .record import RecordBatch, Sample
 from .helpers import parse_interval
+from .http import SessionManager
+from .spool import Spool
+
+# Backpressure policies for a full pipeline queue
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "spill")
+
+# Queue marker telling the sink stage that rows were spilled to disk
+_SPILLED = object()
 
 class PollingController:
-    """Manages the polling loop for a single monitor."""
+    """Manages the polling loop for a single monitor.
+
+    Polling runs as a pipeline: on every tick of the ``Scheduler`` the fetch
+    stage polls the monitor and puts the raw payload (with the tick time) on
+    a bounded queue; a sink stage processes the payloads and hands the rows
+    to every backend's own bounded write queue. Each backend has a writer
+    task that writes its rows in order, every write with its own
+    ``write_timeout``, so a stalled backend only holds up itself until its
+    write queue is full.
+
+    When storage falls behind and the queue is full, ``backpressure``
+    decides what happens to a new payload:
+
+    * ``block``: the fetch waits for room (ticks meanwhile are missed),
+    * ``drop_oldest``: the oldest queued payload is discarded,
+    * ``spill``: the payload's rows are appended to the ``spill_path``
+      journal; the sink replays spilled rows in order once it has caught up
+      with the queue.
+
+    Payloads are processed (``process_data`` and dedup) in one place, in tick
+    order: by the sink, or under ``spill`` by the fetch stage before the rows
+    are queued or spilled, so a spilled payload is never processed ahead of
+    an older queued one.
+    """
     
-    def __init__(self, monitor: Monitor, backends: List[Backend], interval_str: str):
+    def __init__(self, monitor: Monitor, backends: List[Backend], interval_str: str, write_timeout: float = 30.0,
+                 queue_size: int = 100, backpressure: str = "block", spill_path: str | Path | None = None,
+                 dedup: ChangeFilter | None = None):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Invalid backpressure policy: {backpressure}. Use one of {', '.join(BACKPRESSURE_POLICIES)}")
+        if backpressure == "spill" and spill_path is None:
+            raise ValueError("The 'spill' backpressure policy needs a spill_path")
         self.monitor = monitor
         self.backends = backends
         self.interval_seconds = parse_interval(interval_str)
+        self.write_timeout = write_timeout
         self.name = monitor.name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.backpressure = backpressure
+        self.spool = Spool(spill_path) if backpressure == "spill" else None
+        self.dedup = dedup
+        self.pipeline = {"fetched": 0, "skipped": 0, "processed": 0, "dropped": 0, "spilled": 0, "max_depth": 0}
+        # backend name -> counters; see backend_name()
+        self.stats: Dict[str, Dict[str, int]] = {
+            self.backend_name(b): {"writes": 0, "errors": 0, "timeouts": 0} for b in backends
+        }
+        # One write queue and writer task per backend, in the order of self.backends
+        self.write_queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in backends]
+        self.writers: List[asyncio.Task] = []
 
-    async def run(self):
-        """Infinite polling loop."""
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def backend_name(self, backend: Backend) -> str:
+        name = type(backend).__name__
+        duplicates = [b for b in self.backends if type(b).__name__ == name]
+        return name if len(duplicates) == 1 else f"{name}#{duplicates.index(backend)}"
+
+    async def run(self, scheduler: Scheduler | None = None):
+        """Run the pipeline until cancelled.
+
+        Fetches are triggered by ``scheduler``; without one the controller
+        runs a private scheduler, so it also works standalone.
+        """
         print(f"Starting controller for {self.name} (interval: {self.interval_seconds}s)")
+        own_scheduler = scheduler is None
+        if own_scheduler:
+            scheduler = Scheduler()
+        sink = asyncio.create_task(self.sink())
+        scheduler.add(self)
+        try:
+            if own_scheduler:
+                await scheduler.run()
+            else:
+                await asyncio.get_running_loop().create_future()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await scheduler.remove(self)
+            # Give queued payloads a chance to reach the backends
+            try:
+                await asyncio.wait_for(self.queue.join(), self.write_timeout)
+            except asyncio.TimeoutError:
+                print(f"Controller for {self.name}: {self.queue_depth} queued payloads not written")
+            sink.cancel()
+            await asyncio.gather(sink, return_exceptions=True)
+            await self.drain()
+            print(f"Controller for {self.name} stopped ({self.status()}).")
+
+    def status(self) -> str:
+        p = self.pipeline
+        status = (f"queue {self.queue_depth}/{self.queue.maxsize} (max {p['max_depth']}), fetched {p['fetched']}, "
+                  f"skipped {p['skipped']}, dropped {p['dropped']}, spilled {p['spilled']}")
+        if self.dedup is not None:
+            status += f", unchanged {self.dedup.suppressed}"
+        return status
+
+    async def fetch(self, scheduled: float):
+        """Poll the monitor once for the tick at ``scheduled`` (epoch seconds) and enqueue the payload."""
+        try:
+            raw_data = await self.monitor.fetch_data()
+            # Rows are stamped with the (aligned) tick, not the moment the response arrived
+            fetched_at = datetime.fromtimestamp(scheduled, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            self.pipeline["fetched"] += 1
+            await self.enqueue((fetched_at, raw_data))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in controller for {self.name}: {e}")
+
+    async def enqueue(self, item: Tuple[str, Any]):
+        """Queue a fetched payload, applying the backpressure policy when the queue is full."""
+        if self.spool is not None:
+            # Process here, in tick order, whether the rows are queued or spilled
+            rows = self.process(*item)
+            self.pipeline["processed"] += 1
+            if not rows:
+                return
+            if self.spool.pending or self.queue.full():
+                # Keep order: once spilling, everything goes to the journal until it is replayed
+                for row in rows:
+                    await asyncio.to_thread(self.spool.append, self.name, row)
+                self.pipeline["spilled"] += 1
+                if self.queue.empty():
+                    self.queue.put_nowait(_SPILLED)
+                return
+            self.queue.put_nowait(rows)
+            self.pipeline["max_depth"] = max(self.pipeline["max_depth"], self.queue_depth)
+            return
+        if self.queue.full():
+            if self.backpressure == "drop_oldest":
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.pipeline["dropped"] += 1
+            else:
+                print(f"Pipeline queue for {self.name} is full; waiting for the backends")
+        await self.queue.put(item)
+        self.pipeline["max_depth"] = max(self.pipeline["max_depth"], self.queue_depth)
+
+    def process(self, fetched_at: str, raw_data: Any) -> List[Mapping[str, Any]] | RecordBatch:
+        """Turn a payload into the rows to write (none when there is nothing new to store).
+
+        ``process_data`` may return one row (a dict or ``Sample``), a list of
+        rows (e.g. one per location), a ``RecordBatch`` or None. Without dedup
+        a ``RecordBatch`` is passed on as is, so backends with ``write_many``
+        can insert it column-wise.
+        """
+        processed = self.monitor.process_data(raw_data)
+        if processed is None:
+            return []
+        if isinstance(processed, RecordBatch):
+            if "timestamp" not in processed.schema:
+                processed = processed.with_column("timestamp", fetched_at)
+            if self.dedup is None:
+                return processed
+            processed = list(processed)
+        rows = []
+        for row in processed if isinstance(processed, list) else [processed]:
+            # Add common metadata if not present
+            if "timestamp" not in row:
+                if isinstance(row, Sample):
+                    row = row.with_column("timestamp", fetched_at)
+                else:
+                    row["timestamp"] = fetched_at
+            if self.dedup is not None:
+                row = self.dedup.apply(row)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    async def sink(self):
+        """Process queued payloads and hand them to the backends; replay spilled rows when the queue is empty."""
         while True:
+            item = await self.queue.get()
             try:
-                start_time = asyncio.get_event_loop().time()
-                
-                # Fetch and process data
-                raw_data = await self.monitor.fetch_data()
-                processed_data = self.monitor.process_data(raw_data)
-                
-                # Add common metadata if not present
-                if "timestamp" not in processed_data:
-                    processed_data["timestamp"] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
-                
-                # Write to all backends
-                for backend in self.backends:
-                    await backend.write(processed_data, self.name)
-                
-                # Calculate sleep time to maintain interval
-                elapsed = asyncio.get_event_loop().time() - start_time
-                sleep_time = max(0, self.interval_seconds - elapsed)
-                await asyncio.sleep(sleep_time)
-                
+                if isinstance(item, (list, RecordBatch)):
+                    # Rows already processed by the fetch stage (spill policy)
+                    await self.dispatch(item)
+                elif item is not _SPILLED:
+                    rows = self.process(*item)
+                    self.pipeline["processed"] += 1
+                    if rows:
+                        await self.dispatch(rows)
+                if self.spool is not None and self.queue.empty():
+                    await self.replay_spill()
             except asyncio.CancelledError:
-                print(f"Controller for {self.name} stopped.")
-                break
+                raise
             except Exception as e:
-                print(f"Error in controller for {self.name}: {e}")
-                await asyncio.sleep(min(60, self.interval_seconds)) # Wait before retry
+                print(f"Error processing data for {self.name}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def replay_spill(self):
+        while self.spool.pending and self.queue.empty():
+            batch = await asyncio.to_thread(self.spool.read_batch, 100)
+            written: List[asyncio.Future] = []
+            for _, _, row in batch:
+                written = await self.dispatch([row])
+            # Each backend writes in order: once the last row is written, the batch is
+            await asyncio.gather(*written)
+            if batch:
+                await asyncio.to_thread(self.spool.consume, batch[-1][0])
+
+    async def dispatch(self, rows: List[Mapping[str, Any]] | RecordBatch) -> List[asyncio.Future]:
+        """Queue the rows of one poll for every backend.
+
+        Waits only while a backend's write queue is full. Returns one future
+        per backend that resolves once that backend has written (or given up
+        on) the rows.
+        """
+        if not self.writers:
+            self.writers = [asyncio.create_task(self._writer(backend, queue))
+                            for backend, queue in zip(self.backends, self.write_queues)]
+        loop = asyncio.get_running_loop()
+        futures = []
+        for queue in self.write_queues:
+            written = loop.create_future()
+            await queue.put((rows, written))
+            futures.append(written)
+        return futures
+
+    async def _writer(self, backend: Backend, queue: asyncio.Queue):
+        """Write one backend's rows in the order they were dispatched."""
+        while True:
+            rows, written = await queue.get()
+            try:
+                await self._write(backend, rows)
+            except asyncio.CancelledError:
+                written.cancel()
+                raise
+            else:
+                written.set_result(None)
+            finally:
+                queue.task_done()
+
+    async def _write(self, backend: Backend, rows: List[Mapping[str, Any]] | RecordBatch) -> None:
+        name = self.backend_name(backend)
+        stats = self.stats[name]
+        try:
+            await asyncio.wait_for(self._write_rows(backend, rows), self.write_timeout)
+            stats["writes"] += 1
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            print(f"Write to {name} ({self.name}) timed out after {self.write_timeout}s ({stats['timeouts']} timeouts)")
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"Error writing to {name} ({self.name}): {e} ({stats['errors']} errors)")
+
+    async def _write_rows(self, backend: Backend, rows: List[Mapping[str, Any]] | RecordBatch) -> None:
+        # write_many raises on failure (write only prints), so the stats count real errors;
+        # several rows per poll (e.g. a fleet of meters) also go to the backend as one batch
+        if hasattr(backend, "write_many"):
+            await backend.write_many(rows, self.name)
+        else:
+            for data in rows:
+                await backend.write(data, self.name)
+
+    async def drain(self):
+        """Wait until every backend has written its queued rows (e.g. on shutdown), then stop the writers.
+
+        Each queued write is bounded by ``write_timeout``.
+        """
+        await asyncio.gather(*(queue.join() for queue in self.write_queues))
+        for writer in self.writers:
+            writer.cancel()
+        await asyncio.gather(*self.writers, return_exceptions=True)
+        self.writers = []
+
+class ScheduledJob:
+    """Scheduler bookkeeping for one controller."""
+
+    def __init__(self, controller: PollingController, due: float, offset: float):
+        self.controller = controller
+        self.interval = controller.interval_seconds
+        # Next tick (aligned epoch seconds) and the fixed jitter added when firing it
+        self.due = due
+        self.offset = offset
+        self.task: asyncio.Task | None = None
+        self.backlog: Deque[float] = deque()
+        self.active = True
+
+class Scheduler:
+    """Fires every registered controller on wall-clock boundaries from one timer heap.
+
+    Ticks fall on multiples of each controller's interval since the Unix
+    epoch, so a 1 minute monitor fetches at :00 of every minute and sources
+    with related intervals line up on the same timestamps. ``jitter`` delays
+    each controller's fetches by a fixed, per-name offset of up to that many
+    seconds to spread the load; the row timestamp stays on the boundary.
+
+    A tick that arrives while the previous fetch of that controller is still
+    running, or that was missed because the event loop stalled, is skipped;
+    with ``catch_up`` up to that many missed ticks are kept and fetched in
+    order instead, each with its own timestamp.
+    """
+
+    def __init__(self, jitter: float = 0.0, catch_up: int = 0, clock: Callable[[], float] = time.time):
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.clock = clock
+        self.jobs: Dict[int, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+
+    def add(self, controller: PollingController) -> None:
+        interval = controller.interval_seconds
+        offset = random.Random(controller.name).uniform(0, min(self.jitter, interval)) if self.jitter else 0.0
+        job = ScheduledJob(controller, math.ceil(self.clock() / interval) * interval, offset)
+        self.jobs[id(controller)] = job
+        self._push(job)
+
+    async def remove(self, controller: PollingController) -> None:
+        """Stop scheduling a controller and cancel its running fetch."""
+        job = self.jobs.pop(id(controller), None)
+        if job is None:
+            return
+        job.active = False
+        job.backlog.clear()
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+
+    def _push(self, job: ScheduledJob) -> None:
+        heapq.heappush(self._heap, (job.due + job.offset, next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """Fire due ticks until cancelled."""
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            fire_at, _, job = self._heap[0]
+            delay = fire_at - self.clock()
+            if delay > 0:
+                # Sleep until the earliest tick, or until a new job is added
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            heapq.heappop(self._heap)
+            if not job.active:
+                continue
+            self._fire(job, job.due)
+            job.due = self._next_due(job)
+            heapq.heappush(self._heap, (job.due + job.offset, next(self._seq), job))
+
+    def _next_due(self, job: ScheduledJob) -> float:
+        due = job.due + job.interval
+        missed = math.floor((self.clock() - job.offset - due) / job.interval) + 1
+        if missed > self.catch_up:
+            skipped = missed - self.catch_up
+            job.controller.pipeline["skipped"] += skipped
+            due += skipped * job.interval
+        return due
+
+    def _fire(self, job: ScheduledJob, scheduled: float) -> None:
+        if job.task is not None and not job.task.done():
+            # Previous fetch still running
+            job.backlog.append(scheduled)
+            if len(job.backlog) > self.catch_up:
+                job.backlog.popleft()
+                job.controller.pipeline["skipped"] += 1
+            return
+        job.task = asyncio.create_task(job.controller.fetch(scheduled))
+        job.task.add_done_callback(lambda _: self._fetch_done(job))
+
+    def _fetch_done(self, job: ScheduledJob) -> None:
+        if job.active and job.backlog:
+            self._fire(job, job.backlog.popleft())
 
 class MasterController:
-    """Manages multiple PollingControllers and runs them concurrently."""
+    """Manages multiple PollingControllers and runs them concurrently.
+
+    All controllers share one ``Scheduler``; see there for ``jitter`` and ``catch_up``.
+    """
     
-    def __init__(self):
+    def __init__(self, jitter: float = 0.0, catch_up: int = 0, http: SessionManager | None = None):
+        self.scheduler = Scheduler(jitter=jitter, catch_up=catch_up)
+        self.http = http or SessionManager()
         self.controllers: List[PollingController] = []
+        self.background: List[Callable[[], Awaitable[None]]] = []
         self.tasks: List[asyncio.Task] = []
 
     def add_controller(self, controller: PollingController):
+        """Add a controller; its monitor gets the shared HTTP session pool."""
+        if getattr(controller.monitor, "http", False) is None:
+            controller.monitor.http = self.http
         self.controllers.append(controller)
 
+    def add_background_task(self, task: Callable[[], Awaitable[None]]):
+        """Register a coroutine function (e.g. maintenance) to run alongside the monitors.
+
+        It is started with the controllers and cancelled on shutdown.
+        """
+        self.background.append(task)
+
     async def run_all(self):
         """Run all controllers concurrently."""
         if not self.controllers:
             print("No controllers added.")
             return
 
-        self.tasks = [asyncio.create_task(c.run()) for c in self.controllers]
+        self.tasks = [asyncio.create_task(self.scheduler.run())]
+        self.tasks += [asyncio.create_task(c.run(self.scheduler)) for c in self.controllers]
+        self.tasks += [asyncio.create_task(task()) for task in self.background]
         
         loop = asyncio.get_running_loop()
         stop_event = asyncio.Event()
@@ -85,4 +460,41 @@ class MasterController:
             task.cancel()
         
         await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.close_backends()
+        await self.close_monitors()
         print("All monitors stopped.")
+
+    async def report_status(self, interval: float):
+        """Print every controller's queue depth and write statistics every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            for controller in self.controllers:
+                counts = ", ".join(
+                    f"{name} {c['writes']}/{c['errors']}/{c['timeouts']}" for name, c in controller.stats.items()
+                )
+                print(f"[{controller.name}] {controller.status()}; writes/errors/timeouts: {counts}")
+
+    async def close_backends(self):
+        """Close every distinct backend used by the controllers."""
+        seen = set()
+        for controller in self.controllers:
+            for backend in controller.backends:
+                if id(backend) in seen:
+                    continue
+                seen.add(id(backend))
+                try:
+                    await backend.close()
+                except Exception as e:
+                    print(f"Error closing backend {type(backend).__name__}: {e}")
+
+    async def close_monitors(self):
+        """Let monitors release their clients, then close the shared HTTP session."""
+        for controller in self.controllers:
+            cleanup = getattr(controller.monitor, "cleanup", None)
+            if cleanup is None:
+                continue
+            try:
+                await cleanup()
+            except Exception as e:
+                print(f"Error cleaning up monitor {controller.name}: {e}")
+        await self.http.close()
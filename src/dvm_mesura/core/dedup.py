@@ -0,0 +1,119 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable
+from .helpers import EPOCH_MS_COLUMN, epoch_ms, parse_interval
+
+# Metadata columns that never count as a change
+SUPPRESSED_COLUMN = "suppressed"
+PREV_SEEN_COLUMN = "prev_seen_ms"
+
+def parse_dedup_spec(spec: str) -> Dict[str, float]:
+    """Parse 'evohome=1h;energy=15m' into the maximum gap (heartbeat) in seconds per source."""
+    gaps: Dict[str, float] = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        source, _, gap = part.partition("=")
+        if not source.strip() or not gap.strip():
+            raise ValueError(f"Invalid dedup spec: {part}. Use format like 'evohome=1h'")
+        gaps[source.strip()] = parse_interval(gap.strip())
+    return gaps
+
+class ChangeFilter:
+    """Suppresses rows (or, in ``column`` mode, values) that did not change.
+
+    ``row`` mode drops a row when all its values equal those of the last
+    written row. The next written row carries ``suppressed`` (how many polls
+    were dropped in between) and ``prev_seen_ms`` (when the previous values
+    were last confirmed), so the step series can be rebuilt exactly: the
+    previous values held from their own row until ``prev_seen_ms``.
+
+    ``column`` mode is meant for long-format sources, which store one value
+    per column anyway: only changed columns are passed on, and a missing
+    column means "unchanged".
+
+    In both modes a value is written again after ``max_gap`` seconds
+    without a change (a heartbeat), so gaps in the data stay detectable.
+
+    With ``key`` (e.g. ``system_id``) rows with different values in that
+    column are separate series, each compared only with its own last row.
+    """
+
+    def __init__(self, max_gap: float = 3600.0, mode: str = "row", ignore: Iterable[str] = (), key: str | None = None):
+        if mode not in ("row", "column"):
+            raise ValueError(f"Invalid dedup mode: {mode}. Use 'row' or 'column'")
+        self.max_gap_ms = round(max_gap * 1000)
+        self.mode = mode
+        self.key = key
+        self.ignore = {"timestamp", EPOCH_MS_COLUMN, SUPPRESSED_COLUMN, PREV_SEEN_COLUMN, *ignore}
+        if key is not None:
+            self.ignore.add(key)
+        # One filter per key value
+        self._series: Dict[Any, ChangeFilter] = {}
+        # column -> (value, ts_ms when it was last written)
+        self._written: Dict[str, tuple[Any, int]] = {}
+        self._last_seen_ms: int | None = None
+        self._pending = 0
+        self.suppressed = 0
+
+    def apply(self, row: Dict[str, Any]) -> Dict[str, Any] | None:
+        """Return the row (or the changed part of it) to write, or None to skip it."""
+        if self.key is not None:
+            series = self._series.get(row.get(self.key))
+            if series is None:
+                series = self._series[row.get(self.key)] = ChangeFilter(0, self.mode, self.ignore)
+                series.max_gap_ms = self.max_gap_ms
+            out = series.apply(row)
+            if out is None:
+                self.suppressed += 1
+            return out
+
+        ts_ms = epoch_ms(row.get("timestamp"))
+        if ts_ms is None:
+            return row
+        values = {k: v for k, v in row.items() if k not in self.ignore}
+
+        if self.mode == "row":
+            changed = self._row_changed(values, ts_ms)
+            out = dict(row) if changed else None
+        else:
+            changed_columns = {k: v for k, v in values.items() if self._column_changed(k, v, ts_ms)}
+            out = None
+            if changed_columns:
+                out = {k: v for k, v in row.items() if k in changed_columns or k not in values}
+
+        if out is None:
+            self._pending += 1
+            self.suppressed += 1
+            self._last_seen_ms = ts_ms
+            return None
+
+        if self._pending:
+            out[SUPPRESSED_COLUMN] = self._pending
+            out[PREV_SEEN_COLUMN] = self._last_seen_ms
+        for key, value in out.items():
+            if key not in self.ignore:
+                self._written[key] = (value, ts_ms)
+        if self.mode == "row":
+            # Columns missing from this row are no longer part of the state
+            for key in set(self._written) - set(values):
+                del self._written[key]
+        self._pending = 0
+        self._last_seen_ms = ts_ms
+        return out
+
+    def _row_changed(self, values: Dict[str, Any], ts_ms: int) -> bool:
+        if values.keys() != self._written.keys():
+            return True
+        for key, value in values.items():
+            written, written_ms = self._written[key]
+            if not _same(written, value) or ts_ms - written_ms >= self.max_gap_ms:
+                return True
+        return False
+
+    def _column_changed(self, key: str, value: Any, ts_ms: int) -> bool:
+        written = self._written.get(key)
+        return written is None or not _same(written[0], value) or ts_ms - written[1] >= self.max_gap_ms
+
+def _same(a: Any, b: Any) -> bool:
+    # 1 and 1.0 (or True) compare equal in Python but are stored differently
+    return type(a) is type(b) and a == b
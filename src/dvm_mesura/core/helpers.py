@@ -1,11 +1,20 @@
 from __future__ import annotations
 import re
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+from .record import RecordBatch, Sample, Schema
 
-def parse_interval(interval_str: str) -> float:
-    """Parse interval string (e.g., '1m', '10m', '120m') to seconds."""
-    match = re.match(r"^(\d+)([s|m|h])$", interval_str.lower())
+# Indexed integer column (milliseconds since the Unix epoch, UTC) stored
+# alongside the ISO ``timestamp`` text for fast range queries.
+EPOCH_MS_COLUMN = "ts_ms"
+
+def parse_interval(interval_str: str, minimum: float = 10.0) -> float:
+    """Parse interval string (e.g., '500ms', '1s', '1m', '10m', '120m') to seconds.
+
+    ``minimum`` is the shortest accepted interval in seconds; polling
+    intervals keep the 10 second floor, sampling intervals may go lower.
+    """
+    match = re.match(r"^(\d+)(ms|s|m|h)$", interval_str.lower())
     if not match:
         raise ValueError(f"Invalid interval format: {interval_str}. Use format like '1m', '10m', '120m'")
 
@@ -13,19 +22,13 @@ def parse_interval(interval_str: str) -> float:
     value = int(value)
     
     # Range checks for safety/compatibility
-    if unit == "s" and value < 10:
-        raise ValueError("Interval must be at least 10 seconds")
     if unit == "m" and value > 120:
         raise ValueError("Interval must be at most 120 minutes")
 
-    if unit == "s":
-        return float(value)
-    elif unit == "m":
-        return float(value * 60)
-    elif unit == "h":
-        return float(value * 3600)
-    
-    raise ValueError(f"Invalid unit: {unit}")
+    seconds = float(value) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    if seconds < minimum:
+        raise ValueError(f"Interval must be at least {minimum:g} seconds")
+    return seconds
 
 def format_time_display(timestamp: Any) -> str:
     """Format timestamp for display."""
@@ -42,6 +45,41 @@ def format_time_display(timestamp: Any) -> str:
     except Exception:
         return str(timestamp)
 
+def epoch_ms(timestamp: Any) -> int | None:
+    """Convert an ISO timestamp (naive values are taken as UTC) to epoch milliseconds."""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, datetime):
+        dt = timestamp
+    else:
+        try:
+            dt = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1000)
+
+def with_epoch_ms(data: Mapping[str, Any] | RecordBatch) -> Mapping[str, Any] | RecordBatch:
+    """Return ``data`` (a row or a ``RecordBatch``) with the epoch-millisecond column derived from ``timestamp``."""
+    if isinstance(data, RecordBatch):
+        if EPOCH_MS_COLUMN in data.schema or "timestamp" not in data.schema:
+            return data
+        # Rows of one poll usually share their timestamp: parse each distinct value once
+        parsed: Dict[Any, int | None] = {}
+        column = [parsed[t] if t in parsed else parsed.setdefault(t, epoch_ms(t)) for t in data.column("timestamp")]
+        return data.with_values(EPOCH_MS_COLUMN, column)
+    if EPOCH_MS_COLUMN in data or "timestamp" not in data:
+        return data
+    ts_ms = epoch_ms(data["timestamp"])
+    if ts_ms is None:
+        return data
+    if isinstance(data, Sample):
+        return data.with_column(EPOCH_MS_COLUMN, ts_ms)
+    row = dict(data)
+    row[EPOCH_MS_COLUMN] = ts_ms
+    return row
+
 def flatten_dict(data: Dict[str, Any], exclude_fields: set[str] | None = None) -> Dict[str, Any]:
     """Flatten nested JSON structure to a flat dictionary."""
     if exclude_fields is None:
@@ -74,3 +112,111 @@ def flatten_dict(data: Dict[str, Any], exclude_fields: set[str] | None = None) -
 
     _flatten(data)
     return flattened
+
+class Flattener:
+    """``flatten_dict`` with a compiled plan per payload shape.
+
+    Poll payloads (P1 readings, OpenWeatherMap responses) keep the same
+    shape from one poll to the next. The first payload of a shape is walked
+    as usual and turned into a generated function that reads every leaf
+    with a direct lookup and checks that the nested keys and list lengths
+    still match. Plans are cached by the payload's top-level keys; when a
+    plan no longer matches, the payload is flattened generically and a new
+    plan is compiled. The result is always the same as ``flatten_dict``.
+
+    ``sample()`` returns the result as a ``Sample`` whose ``Schema`` is
+    shared by all payloads of the same shape.
+    """
+
+    # Plans kept per top-level key signature, and signatures kept in total
+    MAX_VARIANTS = 4
+    MAX_SIGNATURES = 64
+
+    def __init__(self, exclude_fields: set[str] | None = None):
+        self.exclude_fields = set(exclude_fields or ())
+        self._plans: Dict[Tuple[Any, ...], List[Tuple[Schema, Callable[[Dict[str, Any]], Tuple[Any, ...] | None]]]] = {}
+        self.stats = {"hits": 0, "compiles": 0, "fallbacks": 0}
+
+    def __call__(self, data: Any) -> Dict[str, Any]:
+        found = self._apply(data)
+        if found is None:
+            return flatten_dict(data, self.exclude_fields)
+        return dict(zip(found[0].columns, found[1]))
+
+    def sample(self, data: Any) -> Sample:
+        found = self._apply(data)
+        if found is None:
+            return Sample.from_dict(flatten_dict(data, self.exclude_fields))
+        return Sample(*found)
+
+    def _apply(self, data: Any) -> Tuple[Schema, Tuple[Any, ...]] | None:
+        """The schema and values of ``data`` from a cached plan, or None after compiling one."""
+        if type(data) is not dict:
+            self.stats["fallbacks"] += 1
+            return None
+        signature = tuple(data)
+        plans = self._plans.get(signature)
+        if plans is not None:
+            for schema, plan in plans:
+                values = plan(data)
+                if values is not None:
+                    self.stats["hits"] += 1
+                    return schema, values
+
+        # New shape: walk it once and compile a plan for next time
+        self.stats["fallbacks"] += 1
+        compiled = self._compile(data)
+        if compiled is not None:
+            self.stats["compiles"] += 1
+            if plans is None:
+                if len(self._plans) >= self.MAX_SIGNATURES:
+                    self._plans.clear()
+                plans = self._plans[signature] = []
+            plans.insert(0, compiled)
+            del plans[self.MAX_VARIANTS:]
+        return None
+
+    def _compile(self, data: Dict[str, Any]) -> Tuple[Schema, Callable[[Dict[str, Any]], Tuple[Any, ...] | None]] | None:
+        checks: List[str] = []
+        # column -> lookup expression; a repeated column keeps its first position and last value
+        leaves: Dict[str, str] = {}
+        exclude = self.exclude_fields
+
+        def walk(obj: Any, expr: str, prefix: str) -> bool:
+            if type(obj) is dict:
+                keys = tuple(obj)
+                if not all(type(key) in (str, int) for key in keys):
+                    return False
+                if expr != "d":
+                    checks.append(f"type({expr}) is dict and tuple({expr}) == {keys!r}")
+                children = [(key, f"{prefix}.{key}" if prefix else key) for key in keys if key not in exclude]
+            elif type(obj) is list:
+                checks.append(f"type({expr}) is list and len({expr}) == {len(obj)}")
+                children = [(i, f"{prefix}[{i}]" if prefix else f"[{i}]") for i in range(len(obj))]
+            else:
+                # dict/list subclasses are left to the generic walk
+                return False
+            for key, column in children:
+                value = obj[key]
+                child = f"{expr}[{key!r}]"
+                if isinstance(value, (dict, list)):
+                    if not walk(value, child, column):
+                        return False
+                else:
+                    leaves[column] = child
+            return True
+
+        if not walk(data, "d", ""):
+            return None
+        condition = " and ".join(checks) or "True"
+        values = "".join(f"{expr}, " for expr in leaves.values())
+        source = (
+            "def plan(d):\n"
+            f"    if not ({condition}):\n"
+            "        return None\n"
+            f"    values = ({values})\n"
+            "    return values if _containers.isdisjoint(map(type, values)) else None\n"
+        )
+        namespace: Dict[str, Any] = {"_containers": {dict, list}}
+        exec(compile(source, "<flatten plan>", "exec"), namespace)
+        return Schema.of(leaves), namespace["plan"]
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Tuple
+import aiohttp
+
+class SessionManager:
+    """One pooled ``aiohttp.ClientSession`` shared by all monitors.
+
+    The session is created lazily inside the running event loop. Its
+    connector keeps idle connections alive between polls (so repeated
+    requests skip the TCP and TLS handshakes) and caches DNS lookups.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, keepalive_timeout: float = 120.0,
+                 dns_cache_ttl: int = 300, timeout: float = 10.0):
+        """
+        Args:
+            limit: Maximum open connections in total.
+            limit_per_host: Maximum open connections per host.
+            keepalive_timeout: Seconds an idle connection is kept for reuse; longer
+                than the usual poll intervals, so each poll reuses the previous connection.
+            dns_cache_ttl: Seconds a resolved host name is cached.
+            timeout: Default total timeout per request in seconds.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    def session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+async def resolve_host(host: str) -> str:
+    """Resolve a host name (including mDNS ``.local`` names) to its first IPv4/IPv6 address."""
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    # Prefer IPv4: link-local IPv6 addresses need a scope id in URLs
+    infos.sort(key=lambda info: info[0] != socket.AF_INET)
+    return infos[0][4][0]
+
+class HostResolver:
+    """Caches host name lookups that are slow or unreliable, such as mDNS.
+
+    A resolved address is used for ``ttl`` seconds; after that, or after
+    ``invalidate()`` (e.g. when a request failed), it is refreshed in the
+    background while the old address stays in use. The last address that
+    worked is kept in ``cache_path`` so a restart does not have to wait for
+    a lookup.
+    """
+
+    def __init__(self, cache_path: str | Path | None = None, ttl: float = 3600.0, timeout: float = 5.0,
+                 resolve: Callable[[str], Awaitable[str]] = resolve_host):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.timeout = timeout
+        self.resolve = resolve
+        # host -> (address, expiry on the monotonic clock)
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._known_good = self._load()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def _load(self) -> Dict[str, str]:
+        if self.cache_path is None:
+            return {}
+        try:
+            return json.loads(self.cache_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def is_address(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+    async def address(self, host: str) -> str:
+        """Return an address for ``host``, resolving it only when nothing usable is cached."""
+        if self.is_address(host):
+            return host
+        cached = self._cache.get(host)
+        if cached is not None:
+            if time.monotonic() >= cached[1]:
+                self.refresh(host)
+            return cached[0]
+        known = self._known_good.get(host)
+        if known is not None:
+            # Use the last address that worked and look the name up meanwhile
+            self._cache[host] = (known, 0.0)
+            self.refresh(host)
+            return known
+        return await self._resolve(host)
+
+    async def _resolve(self, host: str) -> str:
+        address = await asyncio.wait_for(self.resolve(host), self.timeout)
+        self._cache[host] = (address, time.monotonic() + self.ttl)
+        return address
+
+    def refresh(self, host: str) -> None:
+        """Start a background lookup unless one is already running."""
+        task = self._refreshing.get(host)
+        if task is None or task.done():
+            self._refreshing[host] = asyncio.create_task(self._refresh(host))
+
+    async def _refresh(self, host: str) -> None:
+        try:
+            await self._resolve(host)
+        except Exception as e:
+            print(f"Could not resolve {host}: {e!r}; keeping the cached address")
+
+    def invalidate(self, host: str) -> None:
+        """A request to the cached address failed: look the name up again in the background."""
+        if host in self._cache:
+            self.refresh(host)
+
+    def confirm(self, host: str, address: str) -> None:
+        """Remember an address that just worked, on disk as well."""
+        if self._known_good.get(host) == address or self.cache_path is None:
+            return
+        self._known_good[host] = address
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            tmp.write_text(json.dumps(self._known_good, indent=2, sort_keys=True))
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"Could not save {self.cache_path}: {e}")
+
+    async def close(self) -> None:
+        for task in self._refreshing.values():
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        self._refreshing.clear()
@@ -1,15 +1,38 @@
 from __future__ import annotations
-from typing import Any, Dict
+import aiohttp
+from typing import Any, Dict, Optional
 from .base import Backend
-from .helpers import flatten_dict
+from .helpers import Flattener
+from .http import SessionManager
 
 class BaseMonitor:
+    # Column that tells apart the series of a monitor returning several rows per poll
+    series_key: str | None = None
+
     def __init__(self, name: str, interval: str):
         self.name = name
         self.interval_str = interval
+        # Shared HTTP session pool, injected by MasterController
+        self.http: SessionManager | None = None
+        # Flattens payloads with a plan compiled per payload shape
+        self.flattener = Flattener()
+
+    async def get_json(self, url: str, timeout: float = 10, headers: Optional[Dict[str, str]] = None) -> Any:
+        """GET a URL and decode its JSON body, using the shared session when available."""
+        if self.http is None:
+            async with aiohttp.ClientSession() as session:
+                return await self._get_json(session, url, timeout, headers)
+        return await self._get_json(self.http.session(), url, timeout, headers)
+
+    @staticmethod
+    async def _get_json(session: aiohttp.ClientSession, url: str, timeout: float,
+                        headers: Optional[Dict[str, str]]) -> Any:
+        async with session.get(url, timeout=timeout, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json()
         
     async def fetch_data(self) -> Dict[str, Any]:
         raise NotImplementedError
 
     def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        return flatten_dict(data)
+        return self.flattener.sample(data)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+class TokenBucket:
+    """Call budget that refills continuously and survives restarts.
+
+    The bucket holds at most ``capacity`` tokens and gains ``rate`` tokens
+    per second; each call takes one. With ``state_path`` the token count is
+    saved after every call, so restarting the process does not hand out a
+    fresh budget.
+    """
+
+    def __init__(self, capacity: float, rate: float, state_path: str | Path | None = None,
+                 clock: Callable[[], float] = time.time):
+        self.capacity = capacity
+        self.rate = rate
+        self.state_path = Path(state_path) if state_path else None
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._load()
+
+    @classmethod
+    def daily(cls, quota: int, burst: float | None = None, **kwargs) -> TokenBucket:
+        """A bucket that can never exceed ``quota`` calls in any 24 hour window.
+
+        ``burst`` (default: one hour's worth) is the capacity; the refill
+        rate is reduced by it so burst plus a day of refill fits the quota.
+        """
+        burst = max(1.0, quota / 24) if burst is None else burst
+        return cls(burst, max(0.0, quota - burst) / 86400, **kwargs)
+
+    def _load(self) -> None:
+        if self.state_path is None:
+            return
+        try:
+            state = json.loads(self.state_path.read_text())
+            self.tokens = min(self.capacity, float(state["tokens"]))
+            self.updated = float(state["updated"])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save(self) -> None:
+        if self.state_path is None:
+            return
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+            tmp.write_text(json.dumps({"tokens": self.tokens, "updated": self.updated}))
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            print(f"Could not save {self.state_path}: {e}")
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        """Use one token if available."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self._save()
+        return True
+
+    def seconds_until_available(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return float("inf") if self.rate <= 0 else (1 - self.tokens) / self.rate
@@ -0,0 +1,180 @@
+from __future__ import annotations
+import weakref
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+class Schema:
+    """An ordered, interned set of column names shared by many records.
+
+    ``Schema.of(columns)`` returns the same object for the same columns while
+    any record still uses it, so records of one shape share a single schema.
+    Schemas compare and hash by their columns, so backends can cache work
+    (such as the INSERT statement) per schema instead of per row, and the
+    intern table only holds schemas that are still in use.
+    """
+
+    __slots__ = ("columns", "index", "_extended", "_hash", "__weakref__")
+    _interned: weakref.WeakValueDictionary[Tuple[str, ...], Schema] = weakref.WeakValueDictionary()
+
+    def __init__(self, columns: Tuple[str, ...]):
+        self.columns = columns
+        self.index = {column: i for i, column in enumerate(columns)}
+        self._extended: Dict[str, Schema] = {}
+        self._hash = hash(columns)
+
+    @classmethod
+    def of(cls, columns: Iterable[str]) -> Schema:
+        columns = tuple(columns)
+        schema = cls._interned.get(columns)
+        if schema is None:
+            schema = cls._interned[columns] = cls(columns)
+        return schema
+
+    def __eq__(self, other: object) -> bool:
+        return self is other or (isinstance(other, Schema) and self.columns == other.columns)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def extend(self, column: str) -> Schema:
+        """This schema with one more column at the end."""
+        schema = self._extended.get(column)
+        if schema is None:
+            schema = self._extended[column] = Schema.of(self.columns + (column,))
+        return schema
+
+    def __contains__(self, column: object) -> bool:
+        return column in self.index
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __repr__(self) -> str:
+        return f"Schema({self.columns!r})"
+
+class Sample(Mapping):
+    """One row: a shared ``Schema`` plus a tuple of values.
+
+    Behaves as a read-only mapping, so code written for dict rows keeps
+    working; ``to_dict()`` gives a plain dict when one is needed (e.g. for
+    JSON). Use ``with_column`` instead of item assignment.
+    """
+
+    __slots__ = ("schema", "values")
+
+    def __init__(self, schema: Schema, values: Tuple[Any, ...]):
+        self.schema = schema
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> Sample:
+        if isinstance(data, Sample):
+            return data
+        return cls(Schema.of(data), tuple(data.values()))
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values[self.schema.index[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self.schema.index.get(key)
+        return default if i is None else self.values[i]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.schema.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.schema.columns)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def with_column(self, column: str, value: Any) -> Sample:
+        """A copy with ``column`` set (appended when it is new)."""
+        i = self.schema.index.get(column)
+        if i is None:
+            return Sample(self.schema.extend(column), self.values + (value,))
+        return Sample(self.schema, self.values[:i] + (value,) + self.values[i + 1:])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.schema.columns, self.values))
+
+    def __repr__(self) -> str:
+        return f"Sample({self.to_dict()!r})"
+
+def _column_storage(values: List[Any]) -> Sequence[Any]:
+    """Store a column in a typed array when all values allow it."""
+    types = set(map(type, values))
+    try:
+        if types == {float}:
+            return array("d", values)
+        if types == {int}:
+            return array("q", values)
+    except OverflowError:
+        pass
+    return values
+
+class RecordBatch:
+    """Rows of one poll (e.g. a meter fleet) stored column by column.
+
+    All rows share one ``Schema``. Columns holding only floats or only ints
+    are kept in ``array('d')``/``array('q')``; other columns are lists, and
+    rows lacking a column hold None. Iterating yields ``Sample`` rows;
+    ``value_rows()`` gives the value tuples ready for ``executemany``.
+    """
+
+    __slots__ = ("schema", "columns", "length")
+
+    def __init__(self, schema: Schema, columns: List[Sequence[Any]]):
+        if len(columns) != len(schema):
+            raise ValueError(f"Expected {len(schema)} columns, got {len(columns)}")
+        lengths = {len(column) for column in columns}
+        if len(lengths) > 1:
+            raise ValueError("All columns of a RecordBatch must have the same length")
+        self.schema = schema
+        self.columns = columns
+        self.length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> RecordBatch:
+        rows = list(rows)
+        names: Dict[str, None] = {}
+        for row in rows:
+            names.update(dict.fromkeys(row))
+        schema = Schema.of(names)
+        columns = [_column_storage([row.get(name) for row in rows]) for name in schema.columns]
+        return cls(schema, columns)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Sample]:
+        schema = self.schema
+        for values in self.value_rows():
+            yield Sample(schema, values)
+
+    def value_rows(self) -> Iterator[Tuple[Any, ...]]:
+        return zip(*self.columns) if self.columns else iter(())
+
+    def column(self, name: str) -> Sequence[Any]:
+        return self.columns[self.schema.index[name]]
+
+    def with_column(self, name: str, value: Any) -> RecordBatch:
+        """A copy with ``name`` set to ``value`` on every row."""
+        return self.with_values(name, [value] * self.length)
+
+    def with_values(self, name: str, values: List[Any]) -> RecordBatch:
+        """A copy with column ``name`` set to ``values`` (one per row)."""
+        if len(values) != self.length:
+            raise ValueError(f"Expected {self.length} values, got {len(values)}")
+        column = _column_storage(values)
+        i = self.schema.index.get(name)
+        if i is None:
+            return RecordBatch(self.schema.extend(name), self.columns + [column])
+        return RecordBatch(self.schema, self.columns[:i] + [column] + self.columns[i + 1:])
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.schema.columns, values)) for values in self.value_rows()]
+
+    def __repr__(self) -> str:
+        return f"RecordBatch({len(self)} rows, {self.schema.columns!r})"
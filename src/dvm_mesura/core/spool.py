@@ -0,0 +1,124 @@
+from __future__ import annotations
+import json
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Tuple
+
+# Record header: payload length and CRC32 of the payload
+_HEADER = struct.Struct(">II")
+
+class Spool:
+    """Append-only journal of ``(source, row)`` records.
+
+    Records are framed as ``<length><crc32><json>`` and fsynced on append.
+    The read position is kept in ``<journal>.offset``; once every record has
+    been consumed the journal is truncated. A torn or corrupt tail (e.g. after
+    a crash in the middle of an append) is cut off when the spool is opened.
+    """
+
+    # Read buffer for ``read_batch``
+    READ_BUFFER = 64 * 1024
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self._lock = threading.Lock()
+        self.offset = self._load_offset()
+        self.size = self._recover()
+
+    def _load_offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _recover(self) -> int:
+        """Return the end of the last intact record, truncating anything after it."""
+        if not self.path.exists():
+            return 0
+        with open(self.path, "r+b") as f:
+            data = f.read()
+            end = 0
+            for end, _ in self._scan(data, 0):
+                pass
+            if end < self.offset:
+                # Offset points past the valid data; nothing left to replay
+                end = self.offset = len(data)
+            end = max(end, self.offset)
+            if end < len(data):
+                print(f"Spool {self.path.name}: dropping {len(data) - end} bytes of incomplete records")
+                f.truncate(end)
+        return end
+
+    @staticmethod
+    def _scan(data: bytes, offset: int):
+        """Yield ``(end offset, record)`` for each intact record starting at ``offset``."""
+        while offset + _HEADER.size <= len(data):
+            length, crc = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset = start + length
+            yield offset, json.loads(payload)
+
+    @property
+    def pending(self) -> bool:
+        return self.size > self.offset
+
+    def append(self, source_name: str, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            # Sample rows and other mappings are journaled as plain objects
+            data = dict(data)
+        payload = json.dumps([source_name, data], separators=(",", ":"), default=str).encode()
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.size += _HEADER.size + len(payload)
+
+    def read_batch(self, max_rows: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Return up to ``max_rows`` unconsumed ``(end offset, source, row)`` records.
+
+        Reads forward from the offset one record at a time through a buffered
+        file, so the cost depends on the batch, not on the journal's length.
+        """
+        batch = []
+        with self._lock:
+            if not self.pending:
+                return batch
+            offset, size = self.offset, self.size
+            with open(self.path, "rb", buffering=self.READ_BUFFER) as f:
+                f.seek(offset)
+                while len(batch) < max_rows and offset + _HEADER.size <= size:
+                    length, crc = _HEADER.unpack(f.read(_HEADER.size))
+                    end = offset + _HEADER.size + length
+                    if end > size:
+                        break
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        break
+                    source_name, row = json.loads(payload)
+                    batch.append((end, source_name, row))
+                    offset = end
+        return batch
+
+    def consume(self, offset: int) -> None:
+        """Mark every record up to ``offset`` as written."""
+        with self._lock:
+            self.offset = offset
+            if self.offset >= self.size:
+                # Fully replayed: start over with an empty journal
+                with open(self.path, "wb"):
+                    pass
+                self.offset_path.unlink(missing_ok=True)
+                self.offset = self.size = 0
+                return
+            tmp = self.offset_path.with_name(self.offset_path.name + ".tmp")
+            tmp.write_text(str(offset))
+            os.replace(tmp, self.offset_path)
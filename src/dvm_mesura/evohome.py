@@ -30,7 +30,9 @@ def main_cli():
     ]
     
     source_name = "evohome"
-    monitor = EvohomeMonitor(source_name, args.interval, username, password)
+    # Reuse OAuth tokens across restarts instead of logging in with the password every time
+    monitor = EvohomeMonitor(source_name, args.interval, username, password,
+                             token_cache=output_path.parent / "evohome_tokens.json")
     
     controller = PollingController(monitor, backends, args.interval)
     master = MasterController()
@@ -1,48 +1,127 @@
 import sqlite3
 import argparse
 import csv
+import gzip
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from dvm_mesura.core.helpers import EPOCH_MS_COLUMN, epoch_ms
+
+# Printing from several export threads at once
+_print_lock = threading.Lock()
+
+def log(message):
+    with _print_lock:
+        print(message, flush=True)
 
 def get_columns(cursor, table):
     cursor.execute(f"PRAGMA table_info({table})")
     return [row[1] for row in cursor.fetchall()]
 
-def export_table_to_csv(db_path, table_name, csv_path):
-    print(f"Exporting table '{table_name}' from {db_path} to {csv_path}...")
-    
+def parse_time(value):
+    """Parse a --since/--until value (ISO date or date-time, UTC unless an offset is given) to epoch ms."""
+    ts_ms = epoch_ms(value.strip().replace(" ", "T"))
+    if ts_ms is None:
+        raise argparse.ArgumentTypeError(f"Invalid time: {value}. Use format like '2026-01-01' or '2026-01-01T12:00:00Z'")
+    return ts_ms
+
+def range_query(table_name, columns, since=None, until=None):
+    """Build the SELECT for a table, filtering on the indexed ts_ms column when available."""
+    sql = f"SELECT * FROM {table_name}"
+    if since is None and until is None:
+        return sql, []
+    if EPOCH_MS_COLUMN in columns:
+        column, bounds = EPOCH_MS_COLUMN, (since, until)
+    else:
+        # Tables not migrated yet (see mesura-migrate): compare the ISO text instead
+        log(f"Table '{table_name}' has no {EPOCH_MS_COLUMN} column; filtering on timestamp without an index")
+        column = "timestamp"
+        bounds = tuple(None if ts is None else time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts / 1000)) for ts in (since, until))
+    conditions, params = [], []
+    if bounds[0] is not None:
+        conditions.append(f'"{column}" >= ?')
+        params.append(bounds[0])
+    if bounds[1] is not None:
+        conditions.append(f'"{column}" < ?')
+        params.append(bounds[1])
+    return f'{sql} WHERE {" AND ".join(conditions)} ORDER BY "{column}"', params
+
+def export_table_to_csv(db_path, table_name, csv_path, since=None, until=None, chunk_size=10000,
+                        compress=False, progress_interval=5.0):
+    """Stream one table (optionally limited to [since, until) in epoch ms) to a CSV file.
+
+    Rows are fetched ``chunk_size`` at a time, so memory use does not grow
+    with the table. With ``compress`` the file is gzipped. The file is
+    written under a temporary name and renamed when complete. Returns the
+    number of rows exported, or None when the table does not exist.
+    """
+    csv_path = Path(csv_path)
+    if compress and csv_path.suffix != ".gz":
+        csv_path = csv_path.with_name(csv_path.name + ".gz")
+    log(f"Exporting table '{table_name}' from {db_path} to {csv_path}...")
+
     conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    
-    # Check if table exists
-    cur.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}';")
-    if not cur.fetchone():
-        print(f"Table '{table_name}' does not exist in {db_path}. Skipping.\n")
-        conn.close()
-        return
+    try:
+        cur = conn.cursor()
+
+        # Check if table exists
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        if not cur.fetchone():
+            log(f"Table '{table_name}' does not exist in {db_path}. Skipping.\n")
+            return None
 
-    columns = get_columns(cur, table_name)
-    
-    # Export data
-    cur.execute(f"SELECT * FROM {table_name}")
-    rows = cur.fetchall()
-    
-    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(columns)
-        writer.writerows(rows)
-        
-    print(f"Success! Exported {len(rows)} rows to {csv_path}.\n")
-    conn.close()
+        columns = get_columns(cur, table_name)
+        sql, params = range_query(table_name, columns, since, until)
+
+        tmp_path = csv_path.with_name(csv_path.name + ".tmp")
+        opener = gzip.open if compress else open
+        started = last_report = time.monotonic()
+        count = 0
+        try:
+            with opener(tmp_path, "wt", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    count += len(rows)
+                    now = time.monotonic()
+                    if progress_interval and now - last_report >= progress_interval:
+                        last_report = now
+                        log(f"  {table_name}: {count} rows ({count / (now - started):.0f} rows/s)")
+            os.replace(tmp_path, csv_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        elapsed = time.monotonic() - started
+        log(f"Success! Exported {count} rows to {csv_path} in {elapsed:.1f}s "
+            f"({count / elapsed if elapsed > 0 else 0:.0f} rows/s).\n")
+        return count
+    finally:
+        conn.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Export tables from monitor.db to separate CSV files.")
     parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
     parser.add_argument("--source-db", default="monitor.db", help="Source database name (default: monitor.db)")
+    parser.add_argument("--table", action="append", help="Table to export to <table>.csv (repeatable, default: energy, weather, evohome)")
+    parser.add_argument("--since", type=parse_time, help="Only rows at or after this UTC time, e.g. '2026-01-01'")
+    parser.add_argument("--until", type=parse_time, help="Only rows before this UTC time, e.g. '2026-02-01'")
+    parser.add_argument("--gzip", action="store_true", help="Write gzip-compressed <table>.csv.gz files")
+    parser.add_argument("--jobs", type=int, default=1, help="Tables exported in parallel (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows fetched per chunk (default: 10000)")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress reports (0 = off, default: 5)")
     args = parser.parse_args()
-    
+
     data_dir = Path(args.data_dir)
     source_path = data_dir / args.source_db
-    
+
     if not source_path.exists():
         print(f"Database '{source_path}' not found.")
         return
@@ -51,17 +130,22 @@ def main():
         data_dir.mkdir(parents=True, exist_ok=True)
 
     # Map target CSV name -> source table
-    mappings = [
-        ("energy.csv", "energy"),
-        ("weather.csv", "weather"),
-        ("evohome.csv", "evohome"),
-    ]
-    
+    mappings = [(f"{table}.csv", table) for table in args.table or ["energy", "weather", "evohome"]]
+
     print(f"Source Database: {source_path}\n" + "="*40)
-    
-    for csv_name, source_table in mappings:
-        csv_path = data_dir / csv_name
-        export_table_to_csv(str(source_path), source_table, str(csv_path))
+
+    def export(mapping):
+        csv_name, source_table = mapping
+        return export_table_to_csv(str(source_path), source_table, str(data_dir / csv_name), since=args.since,
+                                   until=args.until, chunk_size=args.chunk_size, compress=args.gzip,
+                                   progress_interval=args.progress_interval)
+
+    started = time.monotonic()
+    # Each table has its own connection and output file
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        total = sum(count or 0 for count in pool.map(export, mappings))
+    elapsed = time.monotonic() - started
+    print(f"Exported {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed > 0 else 0:.0f} rows/s).")
 
 if __name__ == "__main__":
     main()
@@ -6,9 +6,18 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from dvm_mesura.core.controller import MasterController, PollingController
+from dvm_mesura.core.dedup import ChangeFilter, parse_dedup_spec
+from dvm_mesura.core.helpers import parse_interval
+from dvm_mesura.core.http import HostResolver
+from dvm_mesura.core.ratelimit import TokenBucket
 from dvm_mesura.backends.sqlite import SQLiteBackend
 from dvm_mesura.backends.csv import CSVBackend
+from dvm_mesura.backends.segments import SegmentBackend
+from dvm_mesura.backends.spool import SpooledBackend
+from dvm_mesura.backends.rollup import RollupTask, parse_rollup_spec
+from dvm_mesura.backends.retention import RetentionTask, parse_retention_spec
 from dvm_mesura.monitors.energy import EnergyMonitor
+from dvm_mesura.monitors.fleet import FleetMonitor, parse_fleet_spec
 from dvm_mesura.monitors.weather import WeatherMonitor
 from dvm_mesura.monitors.evohome import EvohomeMonitor
 from dvm_mesura.setup import setup_wizard
@@ -20,15 +29,39 @@ def main():
     parser = argparse.ArgumentParser(description="Home Automation Monitoring Suite")
     parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "data"), help="Directory for data storage")
     parser.add_argument("--energy-api", default=os.getenv("ENERGY_API_URL", "http://p1meter-231dbe.local./api/v1/data"), help="Energy meter API URL")
+    parser.add_argument("--energy-dns-ttl", type=float, default=float(os.getenv("ENERGY_DNS_TTL", "3600")), help="Seconds to reuse the resolved energy meter address before looking it up again")
+    parser.add_argument("--energy-sample-interval", default=os.getenv("ENERGY_SAMPLE_INTERVAL", ""), help="Sample the energy meter at this rate (e.g. '1s', '500ms') and store min/max/mean per energy interval")
+    parser.add_argument("--energy-fleet", default=os.getenv("ENERGY_FLEET", ""), help="Additional P1 meters polled together as the 'fleet' source: 'id=host,...' or a file with one 'id=host' per line")
+    parser.add_argument("--fleet-concurrency", type=int, default=int(os.getenv("FLEET_CONCURRENCY", "50")), help="Maximum fleet meters read at the same time")
+    parser.add_argument("--fleet-timeout", type=float, default=float(os.getenv("FLEET_TIMEOUT", "5")), help="Seconds to wait for one fleet meter")
     parser.add_argument("--energy-interval", default=os.getenv("ENERGY_INTERVAL", "5m"), help="Energy polling interval")
     parser.add_argument("--weather-interval", default=os.getenv("WEATHER_INTERVAL", "10m"), help="Weather polling interval")
     parser.add_argument("--evohome-interval", default=os.getenv("EVOHOME_INTERVAL", "5m"), help="Evohome polling interval")
+    parser.add_argument("--weather-daily-quota", type=int, default=int(os.getenv("WEATHER_DAILY_QUOTA", "1000")), help="Maximum OpenWeatherMap calls per day (0 = unlimited)")
     parser.add_argument("--lat", default=os.getenv("LATITUDE"), help="Latitude for weather data")
     parser.add_argument("--lon", default=os.getenv("LONGITUDE"), help="Longitude for weather data")
     parser.add_argument("--weather-key", default=os.getenv("OPENWEATHER_API_KEY"), help="OpenWeatherMap API Key")
     parser.add_argument("--evohome-user", default=os.getenv("EVOHOME_USERNAME") or os.getenv("EVOHOME_EMAIL"), help="Evohome Username/Email")
+    parser.add_argument("--evohome-concurrency", type=int, default=int(os.getenv("EVOHOME_CONCURRENCY", "4")), help="Maximum Evohome locations updated at the same time")
     parser.add_argument("--evohome-pass", default=os.getenv("EVOHOME_PASSWORD"), help="Evohome Password")
     parser.add_argument("--separate", action="store_true", default=os.getenv("SEPARATE_DBS", "false").lower() == "true", help="Store each monitor in a separate SQLite database")
+    parser.add_argument("--sqlite-batch-size", type=int, default=int(os.getenv("SQLITE_BATCH_SIZE", "1")), help="Rows to group into one SQLite transaction (1 = commit every row)")
+    parser.add_argument("--sqlite-flush-ms", type=int, default=int(os.getenv("SQLITE_FLUSH_MS", "5000")), help="Maximum time a buffered row waits before it is committed")
+    parser.add_argument("--sqlite-busy-timeout-ms", type=int, default=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")), help="How long SQLite waits for another process's write lock")
+    parser.add_argument("--sqlite-writer-lock", action="store_true", default=os.getenv("SQLITE_WRITER_LOCK", "false").lower() == "true", help="Coordinate writers across processes with a <db>.lock file")
+    parser.add_argument("--rollups", default=os.getenv("ROLLUPS", ""), help="Rollup tables to maintain, e.g. 'energy=1h,1d;weather=1h;evohome=1d'")
+    parser.add_argument("--retention", default=os.getenv("RETENTION", ""), help="Maximum age per table, e.g. 'energy=90d;energy_1h=forever'")
+    parser.add_argument("--long-sources", default=os.getenv("LONG_SOURCES", ""), help="Comma-separated sources stored in long (ts, series, value) format, e.g. 'evohome'")
+    parser.add_argument("--segments", choices=["day", "month"], default=os.getenv("SEGMENT_PARTITION") or None, help="Also write compressed segment files partitioned per day or month")
+    parser.add_argument("--spool", action="store_true", default=os.getenv("SPOOL", "false").lower() == "true", help="Spool failed or slow CSV/SQLite writes to disk and replay them later")
+    parser.add_argument("--write-timeout-ms", type=int, default=int(os.getenv("WRITE_TIMEOUT_MS", "10000")), help="With --spool: how long a write may take before the row is spooled")
+    parser.add_argument("--backend-timeout-ms", type=int, default=int(os.getenv("BACKEND_TIMEOUT_MS", "30000")), help="Maximum time one backend write may take before it is abandoned")
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv("QUEUE_SIZE", "100")), help="Fetched payloads each monitor may queue for its backends")
+    parser.add_argument("--backpressure", choices=["block", "drop_oldest", "spill"], default=os.getenv("BACKPRESSURE", "block"), help="What to do with new payloads when a monitor's queue is full")
+    parser.add_argument("--status-interval", default=os.getenv("STATUS_INTERVAL", ""), help="Print queue depth and write statistics at this interval, e.g. '10m'")
+    parser.add_argument("--jitter", type=float, default=float(os.getenv("SCHEDULE_JITTER", "0")), help="Delay each monitor's aligned fetches by a fixed offset of up to this many seconds")
+    parser.add_argument("--catch-up", type=int, default=int(os.getenv("CATCH_UP", "0")), help="Missed ticks to fetch afterwards after a stall (0 = skip them)")
+    parser.add_argument("--dedup", default=os.getenv("DEDUP", ""), help="Skip unchanged rows, writing a heartbeat at most this far apart, e.g. 'evohome=1h;energy=15m'")
     parser.add_argument("--setup", action="store_true", help="Run interactive setup wizard")
     
     args = parser.parse_args()
@@ -41,36 +74,113 @@ def main():
     data_dir.mkdir(parents=True, exist_ok=True)
     
     # Shared backends
-    csv_backend = CSVBackend(data_dir)
-    shared_sqlite = None if args.separate else SQLiteBackend(data_dir / "monitor.db")
+    spools = []
+
+    def spooled(backend, name: str):
+        if not args.spool:
+            return backend
+        spools.append(SpooledBackend(backend, data_dir / "spool" / f"{name}.journal", timeout=args.write_timeout_ms / 1000))
+        return spools[-1]
+
+    csv_backend = spooled(CSVBackend(data_dir), "csv")
+    sqlite_options = dict(
+        batch_size=args.sqlite_batch_size,
+        flush_interval=args.sqlite_flush_ms / 1000,
+        rollups=parse_rollup_spec(args.rollups),
+        long_sources=[s.strip() for s in args.long_sources.split(",") if s.strip()],
+        # Sources writing one row per location or meter at each timestamp
+        series_keys={"evohome": EvohomeMonitor.series_key, "fleet": FleetMonitor.series_key},
+        busy_timeout=args.sqlite_busy_timeout_ms / 1000,
+        writer_lock=args.sqlite_writer_lock,
+    )
+    for name in sorted(set(sqlite_options["rollups"]) & set(sqlite_options["long_sources"])):
+        # Rollups aggregate wide rows; long-format tables hold one value per row and entity
+        print(f"Warning: '{name}' is stored in long format; its rollups are skipped.")
+        del sqlite_options["rollups"][name]
+    shared_sqlite = None if args.separate else spooled(SQLiteBackend(data_dir / "monitor.db", **sqlite_options), "monitor.db")
+    segment_backend = SegmentBackend(data_dir / "segments", partition=args.segments) if args.segments else None
     
-    master = MasterController()
+    master = MasterController(jitter=args.jitter, catch_up=args.catch_up)
     
     def get_backends(name: str):
         if args.separate:
-            return [csv_backend, SQLiteBackend(data_dir / f"{name}.db")]
-        return [csv_backend, shared_sqlite]
+            backends = [csv_backend, spooled(SQLiteBackend(data_dir / f"{name}.db", **sqlite_options), f"{name}.db")]
+        else:
+            backends = [csv_backend, shared_sqlite]
+        if segment_backend:
+            backends.append(segment_backend)
+        return backends
+
+    dedup = parse_dedup_spec(args.dedup)
+    long_sources = set(sqlite_options["long_sources"])
+
+    def polling_controller(monitor, interval: str):
+        dedup_filter = None
+        if monitor.name in dedup:
+            # Long-format sources store values individually: drop unchanged values, not rows
+            mode = "column" if monitor.name in long_sources else "row"
+            dedup_filter = ChangeFilter(max_gap=dedup[monitor.name], mode=mode, key=monitor.series_key)
+        return PollingController(
+            monitor, get_backends(monitor.name), interval,
+            write_timeout=args.backend_timeout_ms / 1000,
+            queue_size=args.queue_size,
+            backpressure=args.backpressure,
+            spill_path=data_dir / "spool" / f"{monitor.name}.pipeline.journal",
+            dedup=dedup_filter,
+        )
 
     # Energy Monitor
-    energy = EnergyMonitor("energy", args.energy_interval, args.energy_api)
-    master.add_controller(PollingController(energy, get_backends("energy"), args.energy_interval))
+    resolver = HostResolver(data_dir / "hosts.json", ttl=args.energy_dns_ttl)
+    sample_interval = parse_interval(args.energy_sample_interval, minimum=0.1) if args.energy_sample_interval else None
+    energy = EnergyMonitor("energy", args.energy_interval, args.energy_api, resolver=resolver, sample_interval=sample_interval)
+    master.add_controller(polling_controller(energy, args.energy_interval))
+
+    # Meter fleet
+    if args.energy_fleet:
+        fleet = FleetMonitor("fleet", args.energy_interval, parse_fleet_spec(args.energy_fleet),
+                             resolver=HostResolver(data_dir / "fleet_hosts.json", ttl=args.energy_dns_ttl),
+                             max_concurrency=args.fleet_concurrency, timeout=args.fleet_timeout)
+        master.add_controller(polling_controller(fleet, args.energy_interval))
     
     # Weather Monitor
     if args.weather_key:
         lat = args.lat or "50.83172"
         lon = args.lon or "5.76712"
-        weather = WeatherMonitor("weather", args.weather_interval, args.weather_key, lat=lat, lon=lon)
-        master.add_controller(PollingController(weather, get_backends("weather"), args.weather_interval))
+        budget = None
+        if args.weather_daily_quota > 0:
+            budget = TokenBucket.daily(args.weather_daily_quota, state_path=data_dir / "weather_budget.json")
+        weather = WeatherMonitor("weather", args.weather_interval, args.weather_key, lat=lat, lon=lon, budget=budget)
+        master.add_controller(polling_controller(weather, args.weather_interval))
     else:
         print("Warning: OPENWEATHER_API_KEY not found. Weather monitor skipped.")
         
     # Evohome Monitor
     if args.evohome_user and args.evohome_pass:
-        evohome = EvohomeMonitor("evohome", args.evohome_interval, args.evohome_user, args.evohome_pass)
-        master.add_controller(PollingController(evohome, get_backends("evohome"), args.evohome_interval))
+        evohome = EvohomeMonitor("evohome", args.evohome_interval, args.evohome_user, args.evohome_pass,
+                                 token_cache=data_dir / "evohome_tokens.json",
+                                 max_concurrency=args.evohome_concurrency)
+        master.add_controller(polling_controller(evohome, args.evohome_interval))
     else:
         print("Warning: Evohome credentials not found. Evohome monitor skipped.")
         
+    db_paths = [data_dir / f"{c.name}.db" for c in master.controllers] if args.separate else [data_dir / "monitor.db"]
+    if sqlite_options["rollups"]:
+        # Backfill rows written before rollups were enabled; the writers only roll up new rows
+        for db_path in db_paths:
+            master.add_background_task(RollupTask(db_path, sqlite_options["rollups"]).run)
+
+    retention = parse_retention_spec(args.retention)
+    if retention:
+        for db_path in db_paths:
+            master.add_background_task(RetentionTask(db_path, retention).run)
+
+    # Replay rows spooled by a previous run without waiting for the next write
+    for spool in spools:
+        master.add_background_task(spool.run)
+
+    if args.status_interval:
+        master.add_background_task(lambda: master.report_status(parse_interval(args.status_interval)))
+
     print(f"Starting master controller with {len(master.controllers)} monitors...")
     asyncio.run(master.run_all())
 
@@ -0,0 +1,111 @@
+import sqlite3
+import argparse
+from pathlib import Path
+from dvm_mesura.core.helpers import EPOCH_MS_COLUMN
+from dvm_mesura.backends.locking import WriterLock
+
+# julianday() understands the ISO timestamps we store (including a trailing 'Z')
+EPOCH_MS_SQL = "CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)"
+
+def get_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+def migrate_table(db_path, table_name, chunk_size=10000):
+    """Add, backfill and index the epoch-millisecond column of one table."""
+    print(f"Migrating table '{table_name}' in {db_path}...")
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
+    if not cur.fetchone():
+        print(f"Table '{table_name}' does not exist. Skipping.\n")
+        conn.close()
+        return
+
+    columns = get_columns(cur, table_name)
+    if "timestamp" not in columns:
+        print(f"Table '{table_name}' has no timestamp column. Skipping.\n")
+        conn.close()
+        return
+
+    lock = WriterLock(db_path)
+    try:
+        if EPOCH_MS_COLUMN not in columns:
+            with lock:
+                cur.execute(f'ALTER TABLE {table_name} ADD COLUMN "{EPOCH_MS_COLUMN}" INTEGER')
+                conn.commit()
+
+        cur.execute(f"SELECT min(rowid), max(rowid) FROM {table_name}")
+        low, high = cur.fetchone()
+        updated = 0
+        if low is not None:
+            # Walk the table in rowid ranges so each transaction stays short and
+            # the live poller can keep writing in between.
+            start = low - 1
+            while start < high:
+                end = start + chunk_size
+                with lock:
+                    cur.execute(
+                        f'UPDATE {table_name} SET "{EPOCH_MS_COLUMN}" = {EPOCH_MS_SQL} '
+                        f'WHERE rowid > ? AND rowid <= ? AND "{EPOCH_MS_COLUMN}" IS NULL',
+                        (start, end),
+                    )
+                    updated += cur.rowcount
+                    conn.commit()
+                start = end
+                print(f"  ... {min(end, high) - low + 1} / {high - low + 1} rows scanned", end="\r")
+            print()
+
+        with lock:
+            cur.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{table_name}_{EPOCH_MS_COLUMN} ON {table_name} ("{EPOCH_MS_COLUMN}")'
+            )
+            conn.commit()
+    finally:
+        lock.close()
+    print(f"Success! Backfilled {updated} rows and indexed '{EPOCH_MS_COLUMN}'.\n")
+    conn.close()
+
+def enable_incremental_vacuum(db_path):
+    """Switch a database to incremental auto-vacuum (needed by retention) with a one-time VACUUM."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    lock = WriterLock(db_path, timeout=300)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print("auto_vacuum is already incremental.\n")
+            return
+        print("Rewriting the database with incremental auto-vacuum (VACUUM needs free disk space of about its size)...")
+        with lock:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        print("Success! Retention can now give freed pages back to the file system.\n")
+    finally:
+        lock.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Add an indexed epoch-millisecond timestamp column to existing tables.")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--db", default="monitor.db", help="Database file name (default: monitor.db)")
+    parser.add_argument("--table", action="append", help="Table to migrate (repeatable, default: energy, weather, evohome)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows updated per transaction (default: 10000)")
+    parser.add_argument("--vacuum", action="store_true", help="Also switch the file to incremental auto-vacuum (one-time VACUUM)")
+    args = parser.parse_args()
+
+    db_path = Path(args.data_dir) / args.db
+    if not db_path.exists():
+        print(f"Database '{db_path}' not found.")
+        return
+
+    print(f"Database: {db_path}\n" + "="*40)
+
+    for table in args.table or ["energy", "weather", "evohome"]:
+        migrate_table(str(db_path), table, args.chunk_size)
+
+    if args.vacuum:
+        enable_incremental_vacuum(str(db_path))
+
+if __name__ == "__main__":
+    main()
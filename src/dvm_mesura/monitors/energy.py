@@ -1,22 +1,159 @@
 from __future__ import annotations
+import asyncio
 import aiohttp
-from typing import Any, Dict
+from array import array
+from typing import Any, Dict, Iterable
+from yarl import URL
 from ..core.monitor import BaseMonitor
-from ..core.helpers import flatten_dict
+from ..core.helpers import Flattener, parse_interval
+from ..core.record import Sample
+from ..core.http import HostResolver
+
+# Instantaneous readings (power, voltage, current) that are aggregated when
+# sampling; counters such as *_kwh or *_m3 only keep their last value.
+AGGREGATE_SUFFIXES = ("_w", "_v", "_a")
+
+class SampleAggregator:
+    """Accumulates readings between two stored rows.
+
+    Numeric fields ending in one of ``suffixes`` are kept in ``array('d')``
+    buffers (8 bytes per sample) and summarised as ``<field>_min``,
+    ``<field>_max``, ``<field>_mean`` and ``<field>`` (the last value). All
+    other fields keep their last value. ``samples`` counts the readings.
+    """
+
+    def __init__(self, suffixes: Iterable[str] = AGGREGATE_SUFFIXES):
+        self.suffixes = tuple(suffixes)
+        self.samples = 0
+        self._values: Dict[str, array] = {}
+        self._last: Dict[str, Any] = {}
+
+    def add(self, reading: Dict[str, Any]) -> None:
+        self.samples += 1
+        for key, value in reading.items():
+            if (key.endswith(self.suffixes) and isinstance(value, (int, float))
+                    and not isinstance(value, bool)):
+                buffer = self._values.get(key)
+                if buffer is None:
+                    buffer = self._values[key] = array("d")
+                buffer.append(value)
+            self._last[key] = value
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the aggregate row and start a new window."""
+        row = dict(self._last)
+        for key, values in self._values.items():
+            if values:
+                row[f"{key}_min"] = min(values)
+                row[f"{key}_max"] = max(values)
+                row[f"{key}_mean"] = round(sum(values) / len(values), 3)
+        row["samples"] = self.samples
+        self.samples = 0
+        self._values = {}
+        self._last = {}
+        return row
 
 class EnergyMonitor(BaseMonitor):
-    """Monitor for P1 Energy Meter."""
+    """Monitor for P1 Energy Meter.
+
+    With a ``resolver`` the meter's host name (an mDNS ``.local`` name by
+    default) is looked up once and cached; requests go straight to the
+    cached address with the original ``Host`` header. A failed request
+    triggers a background lookup for the next poll.
+
+    With a ``sample_interval`` (seconds, e.g. 1.0) a background task reads
+    the meter at that rate and every poll returns the aggregate of the
+    samples since the previous poll (see ``SampleAggregator``), so short
+    spikes show up in ``*_max`` without storing a row per sample. The first
+    poll waits for an initial reading, at most ``first_sample_timeout``
+    seconds (the storage interval by default).
+    """
     
-    def __init__(self, name: str, interval: str, api_url: str):
+    def __init__(self, name: str, interval: str, api_url: str, resolver: HostResolver | None = None,
+                 sample_interval: float | None = None):
         super().__init__(name, interval)
         self.api_url = api_url
+        self.resolver = resolver
+        self.sample_interval = sample_interval
+        # Exclude "external" field as in original script
+        self.flattener = Flattener(exclude_fields={"external"})
+        self.aggregator = SampleAggregator()
+        self.sample_errors = 0
+        self.first_sample_timeout = parse_interval(interval, minimum=0)
+        self._sampler: asyncio.Task | None = None
 
     async def fetch_data(self) -> Dict[str, Any]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.api_url, timeout=10) as response:
-                response.raise_for_status()
-                return await response.json()
-
-    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        # Flatten data, excluding "external" field as in original script
-        return flatten_dict(data, exclude_fields={"external"})
+        if not self.sample_interval:
+            return await self.read_meter()
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.create_task(self._sample())
+            # First poll: wait for the initial reading instead of returning nothing
+            try:
+                await asyncio.wait_for(self._first_sample(), self.first_sample_timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(
+                    f"No reading from the energy meter within {self.first_sample_timeout:g}s ({self.sample_errors} errors)"
+                ) from None
+        if not self.aggregator.samples:
+            raise RuntimeError(f"No samples from the energy meter in the last interval ({self.sample_errors} errors)")
+        return self.aggregator.summary()
+
+    async def _first_sample(self):
+        while not self.aggregator.samples and not self._sampler.done():
+            await asyncio.sleep(self.sample_interval)
+
+    async def _sample(self):
+        """Read the meter every ``sample_interval`` seconds on a fixed cadence."""
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        failing = False
+        while True:
+            try:
+                reading = self.flattener.sample(await self.read_meter())
+                self.aggregator.add(reading)
+                if failing:
+                    print(f"Energy sampling recovered after {self.sample_errors} errors")
+                    failing = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.sample_errors += 1
+                if not failing:
+                    print(f"Energy sampling failed: {e!r}")
+                    failing = True
+            next_time += self.sample_interval
+            now = loop.time()
+            if next_time < now:
+                # Fell behind (slow meter): skip the missed slots
+                next_time = now
+            await asyncio.sleep(next_time - now)
+
+    async def read_meter(self) -> Dict[str, Any]:
+        """Fetch one reading from the P1 API."""
+        url = URL(self.api_url)
+        if self.resolver is None or url.scheme != "http" or not url.host or self.resolver.is_address(url.host):
+            return await self.get_json(self.api_url)
+
+        host = url.host
+        address = await self.resolver.address(host)
+        try:
+            data = await self.get_json(
+                str(url.with_host(address)),
+                headers={"Host": host if url.is_default_port() else f"{host}:{url.port}"},
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.resolver.invalidate(host)
+            raise
+        self.resolver.confirm(host, address)
+        return data
+
+    def process_data(self, data: Dict[str, Any]) -> Sample:
+        return self.flattener.sample(data)
+
+    async def cleanup(self):
+        if self._sampler is not None:
+            self._sampler.cancel()
+            await asyncio.gather(self._sampler, return_exceptions=True)
+            self._sampler = None
+        if self.resolver is not None:
+            await self.resolver.close()
@@ -1,54 +1,153 @@
 from __future__ import annotations
+import asyncio
+import json
+import os
 import aiohttp
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Any, Dict, List
 from evohomeasync2 import EvohomeClient
 from evohomeasync2.auth import AbstractTokenManager
 from ..core.monitor import BaseMonitor
 
-class SimpleTokenManager(AbstractTokenManager):
-    """Simple token manager that stores tokens in memory."""
-    async def save_access_token(self) -> None: pass
-    async def _load_access_token(self) -> None: pass
+class FileTokenManager(AbstractTokenManager):
+    """Token manager that keeps the OAuth tokens in a private JSON file.
+
+    Tokens are saved (mode 600) whenever the library obtains new ones and
+    loaded on startup, so a restart reuses them instead of logging in with
+    the password. A token is treated as expired ``refresh_ahead`` seconds
+    early, so it is refreshed before requests start failing. Without
+    ``cache_path`` tokens are only kept in memory.
+    """
+
+    def __init__(self, username: str, password: str, websession: aiohttp.ClientSession,
+                 cache_path: str | Path | None = None, refresh_ahead: float = 300.0):
+        super().__init__(username, password, websession)
+        self.username = username
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.refresh_ahead = timedelta(seconds=refresh_ahead)
+
+    def is_token_valid(self) -> bool:
+        # Checked by the library's get_access_token() before every request
+        return bool(self._access_token) and self._access_token_expires > datetime.now(timezone.utc) + self.refresh_ahead
+
+    async def load_cached_tokens(self) -> None:
+        """Restore the tokens saved by an earlier run, if any."""
+        if self.cache_path is None:
+            return
+        try:
+            tokens = json.loads(self.cache_path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring Evohome token cache {self.cache_path}: {e}")
+            return
+        if tokens.get("username") != self.username:
+            # Cached for another account
+            return
+        try:
+            self._import_access_token(tokens)
+        except (KeyError, TypeError, ValueError) as e:
+            self._clear_access_token()
+            print(f"Ignoring Evohome token cache {self.cache_path}: {e}")
+
+    async def save_access_token(self) -> None:
+        if self.cache_path is None:
+            return
+        tokens = {"username": self.username, **self._export_access_token()}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(tokens, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"Could not save Evohome token cache {self.cache_path}: {e}")
 
 class EvohomeMonitor(BaseMonitor):
-    """Monitor for Honeywell Evohome."""
-    
-    def __init__(self, name: str, interval: str, username: str, password: str):
+    """Monitor for Honeywell Evohome.
+
+    Every location of the account is polled on each fetch, at most
+    ``max_concurrency`` at a time. A location that fails or takes longer
+    than ``location_timeout`` seconds is left out of that poll, so one slow
+    site does not hold up the others. ``process_data`` returns one row per
+    temperature control system, tagged with ``location_id``, ``location``
+    and ``system_id``.
+    """
+
+    series_key = "system_id"
+
+    def __init__(self, name: str, interval: str, username: str, password: str,
+                 token_cache: str | Path | None = None, max_concurrency: int = 4,
+                 location_timeout: float = 30.0):
         super().__init__(name, interval)
         self.username = username
         self.password = password
+        self.token_cache = token_cache
+        self.max_concurrency = max_concurrency
+        self.location_timeout = location_timeout
         self.client: EvohomeClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        # Only set when no shared session manager was injected
         self._session: aiohttp.ClientSession | None = None
 
     async def fetch_data(self) -> Dict[str, Any]:
-        if not self._session:
-            self._session = aiohttp.ClientSession()
-            token_manager = SimpleTokenManager(self.username, self.password, self._session)
-            self.client = EvohomeClient(token_manager)
-
-        # Initial update or periodic update
-        await self.client.update()
-        loc = self.client.locations[0]
-        await loc.update()
-        
-        # Return the location/system data structure
-        return {"location": loc}
-
-    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        loc = data["location"]
-        tcs = loc.gateways[0].systems[0]
-        
-        processed: Dict[str, Any] = {
-            "system_mode": str(tcs.mode)
-        }
-        
-        for zone in tcs.zones:
-            col_name = f"_{zone.id}_{zone.name.replace(' ', '_')}"
-            processed[col_name] = zone.temperature
-            
-        return processed
+        if not self.client:
+            if self.http is not None:
+                session = self.http.session()
+            else:
+                session = self._session = aiohttp.ClientSession()
+            token_manager = FileTokenManager(self.username, self.password, session, self.token_cache)
+            # Reuse cached tokens instead of logging in again
+            await token_manager.load_cached_tokens()
+            client = EvohomeClient(token_manager)
+            # Account and installation (locations, gateways, systems, zones) only: the
+            # status of each location is updated by the concurrent pass below
+            await client.update(dont_update_status=True)
+            self.client = client
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        locations = list(self.client.locations)
+        results = await asyncio.gather(*(self._update_location(loc) for loc in locations), return_exceptions=True)
+        updated = []
+        for loc, result in zip(locations, results):
+            if isinstance(result, BaseException):
+                reason = "timed out" if isinstance(result, asyncio.TimeoutError) else result
+                print(f"Evohome location {loc.name} ({loc.id}) skipped: {reason}")
+            else:
+                updated.append(loc)
+        if locations and not updated:
+            raise RuntimeError("No Evohome location could be updated")
+
+        # Return the location/system data structures
+        return {"locations": updated}
+
+    async def _update_location(self, loc: Any) -> None:
+        async with self._semaphore:
+            await asyncio.wait_for(loc.update(), self.location_timeout)
+
+    def process_data(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for loc in data["locations"]:
+            for gateway in loc.gateways:
+                for tcs in gateway.systems:
+                    processed: Dict[str, Any] = {
+                        "location_id": str(loc.id),
+                        "location": str(loc.name),
+                        "system_id": str(tcs.id),
+                        "system_mode": str(tcs.mode),
+                    }
+                    for zone in tcs.zones:
+                        col_name = f"_{zone.id}_{zone.name.replace(' ', '_')}"
+                        processed[col_name] = zone.temperature
+                    rows.append(processed)
+        return rows
 
     async def cleanup(self):
+        # The shared session is closed by its owner
         if self._session:
             await self._session.close()
             self._session = None
+        self.client = None
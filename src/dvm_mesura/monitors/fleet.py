@@ -0,0 +1,94 @@
+from __future__ import annotations
+import asyncio
+from pathlib import Path
+from typing import Any, Dict
+from ..core.monitor import BaseMonitor
+from ..core.http import HostResolver
+from ..core.record import RecordBatch
+from .energy import EnergyMonitor
+
+def parse_fleet_spec(spec: str) -> Dict[str, str]:
+    """Parse meter endpoints into ``{meter_id: api_url}``.
+
+    ``spec`` is either a path to a file or the endpoints themselves, as
+    ``meter_id=host_or_url`` entries separated by commas, whitespace or (in
+    a file) newlines; ``#`` starts a comment. A bare host becomes
+    ``http://<host>/api/v1/data``.
+    """
+    path = Path(spec)
+    if "=" not in spec and path.is_file():
+        spec = path.read_text()
+    meters: Dict[str, str] = {}
+    for line in spec.splitlines():
+        for entry in line.split("#", 1)[0].replace(",", " ").split():
+            meter_id, _, endpoint = entry.partition("=")
+            if not meter_id or not endpoint:
+                raise ValueError(f"Invalid meter entry: {entry}. Use format like 'building-a=192.168.1.20'")
+            if meter_id in meters:
+                raise ValueError(f"Duplicate meter id: {meter_id}")
+            meters[meter_id] = endpoint if "://" in endpoint else f"http://{endpoint}/api/v1/data"
+    return meters
+
+class FleetMonitor(BaseMonitor):
+    """Polls many P1 meters from one controller.
+
+    Every poll reads all meters concurrently, at most ``max_concurrency`` at
+    a time and each bounded by ``timeout`` seconds, through the shared HTTP
+    session. Meters that fail or time out are left out of that poll.
+    ``process_data`` returns a ``RecordBatch`` with one row per meter and a
+    ``meter_id`` column, so the controller writes the whole tick as one batch.
+    """
+
+    series_key = "meter_id"
+
+    def __init__(self, name: str, interval: str, meters: Dict[str, str], resolver: HostResolver | None = None,
+                 max_concurrency: int = 50, timeout: float = 5.0):
+        super().__init__(name, interval)
+        if not meters:
+            raise ValueError("A meter fleet needs at least one meter")
+        self.meters = {meter_id: EnergyMonitor(meter_id, interval, url, resolver=resolver)
+                       for meter_id, url in meters.items()}
+        # Meters of the same model share their payload shape, so they share the compiled plans
+        flattener = next(iter(self.meters.values())).flattener
+        for meter in self.meters.values():
+            meter.flattener = flattener
+        self.resolver = resolver
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.failures: Dict[str, int] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def fetch_data(self) -> Dict[str, Any]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        meter_ids = list(self.meters)
+        results = await asyncio.gather(*(self._read(meter_id) for meter_id in meter_ids), return_exceptions=True)
+        readings: Dict[str, Any] = {}
+        for meter_id, result in zip(meter_ids, results):
+            if isinstance(result, BaseException):
+                # Report a meter once when it starts failing, not on every poll
+                if not self.failures.get(meter_id):
+                    reason = "timed out" if isinstance(result, asyncio.TimeoutError) else repr(result)
+                    print(f"Meter {meter_id} skipped: {reason}")
+                self.failures[meter_id] = self.failures.get(meter_id, 0) + 1
+            else:
+                if self.failures.pop(meter_id, 0):
+                    print(f"Meter {meter_id} recovered")
+                readings[meter_id] = result
+        if not readings:
+            raise RuntimeError(f"None of the {len(meter_ids)} meters could be read")
+        return readings
+
+    async def _read(self, meter_id: str) -> Dict[str, Any]:
+        meter = self.meters[meter_id]
+        meter.http = self.http
+        async with self._semaphore:
+            return await asyncio.wait_for(meter.read_meter(), self.timeout)
+
+    def process_data(self, data: Dict[str, Any]) -> RecordBatch:
+        return RecordBatch.from_rows({"meter_id": meter_id, **self.meters[meter_id].process_data(reading)}
+                                     for meter_id, reading in data.items())
+
+    async def cleanup(self):
+        if self.resolver is not None:
+            await self.resolver.close()
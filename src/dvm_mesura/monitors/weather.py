@@ -1,28 +1,74 @@
 from __future__ import annotations
-import aiohttp
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 from ..core.monitor import BaseMonitor
+from ..core.ratelimit import TokenBucket
 
 class WeatherMonitor(BaseMonitor):
-    """Monitor for OpenWeatherMap API."""
+    """Monitor for OpenWeatherMap API.
+
+    OpenWeatherMap publishes a new ``current`` observation about every
+    ``update_period`` seconds. Until the next one is due (``dt`` plus that
+    period) polls reuse the last response instead of calling the API, and
+    responses whose ``dt`` was already stored are dropped. An optional
+    ``budget`` (``TokenBucket``) caps the number of API calls.
+    """
     
-    def __init__(self, name: str, interval: str, api_key: str, lat: str, lon: str):
+    def __init__(self, name: str, interval: str, api_key: str, lat: str, lon: str,
+                 budget: TokenBucket | None = None, update_period: float = 600.0,
+                 clock: Callable[[], float] = time.time):
         super().__init__(name, interval)
         self.api_key = api_key
         self.lat = lat
         self.lon = lon
         self.api_url = "https://api.openweathermap.org/data/3.0/onecall"
+        self.budget = budget
+        self.update_period = update_period
+        self.clock = clock
+        self.last_dt: int | None = None
+        self.next_update = 0.0
+        self.stats = {"calls": 0, "reused": 0, "duplicates": 0, "over_budget": 0}
+        self._last_response: Dict[str, Any] | None = None
 
     async def fetch_data(self) -> Dict[str, Any]:
+        now = self.clock()
+        if self._last_response is not None and now < self.next_update:
+            # No new observation expected yet: skip the call
+            self.stats["reused"] += 1
+            return self._last_response
+        if self.budget is not None and not self.budget.take():
+            self.stats["over_budget"] += 1
+            if self._last_response is not None:
+                return self._last_response
+            wait = self.budget.seconds_until_available()
+            raise RuntimeError(f"OpenWeatherMap call budget exhausted; next call possible in {wait:.0f}s")
+
         url = f"{self.api_url}?lat={self.lat}&lon={self.lon}&exclude=minutely,hourly,daily,alerts&appid={self.api_key}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
-                response.raise_for_status()
-                return await response.json()
+        data = await self.get_json(url)
+        self.stats["calls"] += 1
+        self._last_response = data
+
+        dt = data.get("current", {}).get("dt")
+        if isinstance(dt, (int, float)) and dt != self.last_dt:
+            # New observation: the next one is due one update period later
+            self.next_update = dt + self.update_period
+        else:
+            # Same observation as before: the provider is late, try again next poll
+            self.next_update = now
+        return data
+
+    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any] | None:
+        """Flatten weather data manually as in original script.
+
+        Returns None for an observation (``current.dt``) that was already stored.
+        """
+        dt = data.get("current", {}).get("dt")
+        if dt is not None and dt == self.last_dt:
+            self.stats["duplicates"] += 1
+            return None
+        self.last_dt = dt
 
-    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Flatten weather data manually as in original script."""
         flattened: Dict[str, Any] = {}
         
         flattened["lat"] = data.get("lat")
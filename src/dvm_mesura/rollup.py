@@ -0,0 +1,35 @@
+import argparse
+from pathlib import Path
+from dvm_mesura.backends.rollup import RollupEngine, parse_rollup_spec
+from dvm_mesura.backends.locking import WriterLock
+from dvm_mesura.backends.sqlite import SQLiteDatabase
+
+DEFAULT_ROLLUPS = "energy=1h,1d;weather=1h,1d;evohome=1h,1d"
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or catch up rollup tables (e.g. energy_1h) from raw sample tables.")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--db", default="monitor.db", help="Database file name (default: monitor.db)")
+    parser.add_argument("--rollups", default=DEFAULT_ROLLUPS, help=f"Rollup spec (default: {DEFAULT_ROLLUPS})")
+    args = parser.parse_args()
+
+    db_path = (Path(args.data_dir) / args.db).absolute()
+    if not db_path.exists():
+        print(f"Database '{db_path}' not found.")
+        return
+
+    engine = RollupEngine(parse_rollup_spec(args.rollups))
+    db = SQLiteDatabase(db_path)
+    lock = WriterLock(db_path, timeout=300)
+    print(f"Database: {db_path}\n" + "="*40)
+    try:
+        for table_name in engine.rollups:
+            # Commits (and advances the watermark) per chunk, taking the lock for each one
+            processed = engine.catch_up(db, table_name, lock)
+            print(f"{table_name}: rolled up {processed} new rows into {', '.join(engine.tables_for(table_name))}")
+    finally:
+        lock.close()
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import pytest
 import asyncio
 import sqlite3
 import random
+import threading
 from pathlib import Path
+from dvm_mesura.backends.locking import WriterLock
 from dvm_mesura.backends.sqlite import SQLiteBackend
 
 @pytest.mark.asyncio
@@ -42,3 +44,112 @@ async def test_sqlite_concurrency(tmp_path):
         for t_id in range(num_tasks):
             cursor.execute("SELECT count(*) FROM stress_test WHERE task_id=?", (t_id,))
             assert cursor.fetchone()[0] == writes_per_task
+
+@pytest.mark.asyncio
+async def test_sqlite_group_commit(tmp_path):
+    """Buffered backends sharing a file commit rows for all tables together."""
+    db_path = tmp_path / "buffered.db"
+    energy = SQLiteBackend(db_path, batch_size=4, flush_interval=60)
+    weather = SQLiteBackend(db_path, batch_size=4, flush_interval=60)
+    assert energy.writer is weather.writer
+
+    await energy.write({"timestamp": "2026-02-23T11:00:00Z", "power": 1}, "energy")
+    await weather.write({"timestamp": "2026-02-23T11:00:00Z", "temp": 2.5}, "weather")
+    await energy.write({"timestamp": "2026-02-23T11:01:00Z", "power": 2}, "energy")
+
+    # Below the batch size and before the flush interval: nothing committed yet
+    with sqlite3.connect(db_path) as conn:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert "energy" not in tables
+
+    await weather.write({"timestamp": "2026-02-23T11:01:00Z", "temp": 3.5}, "weather")
+    await energy.write({"timestamp": "2026-02-23T11:02:00Z", "power": 3}, "energy")
+    await energy.flush()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM energy").fetchone()[0] == 3
+        assert conn.execute("SELECT count(*) FROM weather").fetchone()[0] == 2
+
+@pytest.mark.asyncio
+async def test_sqlite_flush_interval(tmp_path):
+    db_path = tmp_path / "timed.db"
+    backend = SQLiteBackend(db_path, batch_size=100, flush_interval=0.05)
+    await backend.write({"timestamp": "2026-02-23T11:00:00Z", "power": 1}, "energy")
+    await asyncio.sleep(0.2)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM energy").fetchone()[0] == 1
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_writer_thread_futures(tmp_path):
+    """Each database gets one writer thread; submit() resolves once the row is committed."""
+    db_path = tmp_path / "writer.db"
+    first = SQLiteBackend(db_path)
+    second = SQLiteBackend(db_path)
+    other = SQLiteBackend(tmp_path / "other.db")
+    assert first.writer is second.writer
+    assert first.writer is not other.writer
+
+    futures = [first.submit({"timestamp": "2026-02-23T11:00:00Z", "n": i}, "rows") for i in range(50)]
+    await asyncio.gather(*futures)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM rows").fetchone()[0] == 50
+    assert first.writer.stats["rows"] == 50
+
+    writer = first.writer
+    await first.close()
+    assert writer.is_alive()
+    await second.close()
+    assert not writer.is_alive()
+    await other.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_retries_when_another_process_holds_the_lock(tmp_path):
+    """A busy database is retried with backoff instead of dropping the row."""
+    db_path = tmp_path / "busy.db"
+    backend = SQLiteBackend(db_path, busy_timeout=0.01, max_retries=20)
+    await backend.write({"timestamp": "2026-02-23T11:00:00Z", "n": 0}, "busy")
+
+    blocker = sqlite3.connect(db_path, check_same_thread=False)
+    blocker.execute("BEGIN EXCLUSIVE")
+    threading.Timer(0.3, blocker.rollback).start()
+
+    await backend.write({"timestamp": "2026-02-23T11:01:00Z", "n": 1}, "busy")
+    assert backend.writer.stats["busy_retries"] > 0
+    blocker.close()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM busy").fetchone()[0] == 2
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_writer_lock_file(tmp_path):
+    """With the advisory lock enabled, writes wait for the other holder and are counted."""
+    db_path = tmp_path / "locked.db"
+    backend = SQLiteBackend(db_path, writer_lock=True)
+
+    maintenance = WriterLock(db_path)
+    maintenance.acquire()
+    threading.Timer(0.2, maintenance.release).start()
+
+    await backend.write({"timestamp": "2026-02-23T11:00:00Z", "n": 0}, "locked")
+    assert backend.writer.stats["lock_waits"] == 1
+    assert backend.writer.stats["lock_wait_seconds"] > 0
+    maintenance.close()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM locked").fetchone()[0] == 1
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_backends_sharing_a_database(tmp_path, capsys):
+    db_path = tmp_path / "shared.db"
+    first = SQLiteBackend(db_path, rollups={"energy": ["1h"]})
+    second = SQLiteBackend(db_path, batch_size=10, rollups={"energy": ["1d", "1h"], "weather": ["1h"]})
+    assert second.writer is first.writer
+    # The second backend's writer options cannot apply to the shared writer
+    assert "ignoring batch_size=10 (using 1)" in capsys.readouterr().out
+    # Rollup specs are merged, not replaced
+    assert first.db.rollups.tables_for("energy") == ["energy_1h", "energy_1d"]
+    assert first.db.rollups.tables_for("weather") == ["weather_1h"]
+    await first.close()
+    await second.close()
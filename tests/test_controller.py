@@ -0,0 +1,268 @@
+import pytest
+import asyncio
+from dvm_mesura.core.base import Monitor
+from dvm_mesura.core.controller import PollingController, Scheduler
+
+class CountingMonitor(Monitor):
+    def __init__(self):
+        super().__init__("counter")
+        self.polls = []
+
+    async def fetch_data(self):
+        self.polls.append(asyncio.get_running_loop().time())
+        return {"n": len(self.polls)}
+
+class RecordingBackend:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.rows = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def write(self, data, source_name):
+        await self.gate.wait()
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise OSError("disk full")
+        self.rows.append(data["n"])
+
+    async def close(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_slow_backend_does_not_delay_others_or_polls():
+    monitor = CountingMonitor()
+    fast, slow, broken = RecordingBackend(), RecordingBackend(delay=10), RecordingBackend(fail=True)
+    controller = PollingController(monitor, [fast, slow, broken], "10s", write_timeout=0.03)
+    controller.interval_seconds = 0.05
+
+    task = asyncio.create_task(controller.run())
+    await asyncio.sleep(0.28)
+    task.cancel()
+    await task
+
+    # Polls stayed on schedule although every write to `slow` stalled
+    assert len(monitor.polls) >= 5
+    gaps = [b - a for a, b in zip(monitor.polls, monitor.polls[1:])]
+    assert max(gaps) < 0.1
+    assert fast.rows == list(range(1, len(monitor.polls) + 1))
+    assert slow.rows == []
+
+    # Shutdown waited for the in-flight writes to finish or time out
+    assert all(queue.empty() for queue in controller.write_queues) and not controller.writers
+    assert controller.stats["RecordingBackend#1"]["timeouts"] == len(monitor.polls)
+    assert controller.stats["RecordingBackend#2"]["errors"] == len(monitor.polls)
+    assert controller.stats["RecordingBackend#0"]["writes"] == len(monitor.polls)
+
+async def run_stalled(controller, backend, seconds):
+    """Run with the backend stalled, then let it catch up and stop."""
+    backend.gate.clear()
+    task = asyncio.create_task(controller.run())
+    await asyncio.sleep(seconds)
+    backend.gate.set()
+    while len(backend.rows) < controller.pipeline["fetched"] - controller.pipeline["dropped"]:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await task
+
+@pytest.mark.asyncio
+async def test_backpressure_drop_oldest():
+    monitor, backend = CountingMonitor(), RecordingBackend()
+    controller = PollingController(monitor, [backend], "10s", queue_size=3, backpressure="drop_oldest")
+    controller.interval_seconds = 0.02
+    await run_stalled(controller, backend, 0.2)
+
+    gaps = [b - a for a, b in zip(monitor.polls, monitor.polls[1:])]
+    assert max(gaps) < 0.05
+    assert controller.pipeline["dropped"] > 0
+    assert controller.pipeline["max_depth"] == 3
+    # The newest payloads survived, in order
+    assert backend.rows == sorted(backend.rows)
+    assert backend.rows[-1] >= len(monitor.polls) - 1
+
+class OrderRecordingMonitor(CountingMonitor):
+    def __init__(self):
+        super().__init__()
+        self.processed = []
+
+    def process_data(self, data):
+        self.processed.append(data["n"])
+        return data
+
+@pytest.mark.asyncio
+async def test_backpressure_spill(tmp_path):
+    monitor, backend = OrderRecordingMonitor(), RecordingBackend()
+    controller = PollingController(monitor, [backend], "10s", queue_size=2, backpressure="spill",
+                                   spill_path=tmp_path / "counter.journal")
+    controller.interval_seconds = 0.02
+    await run_stalled(controller, backend, 0.2)
+
+    gaps = [b - a for a, b in zip(monitor.polls, monitor.polls[1:])]
+    assert max(gaps) < 0.05
+    assert controller.pipeline["spilled"] > 0
+    assert not controller.spool.pending
+    assert backend.rows == list(range(1, controller.pipeline["fetched"] + 1))
+    # Queued and spilled payloads alike were processed once, in tick order
+    assert monitor.processed == backend.rows
+
+def test_backpressure_policy_validation(tmp_path):
+    with pytest.raises(ValueError):
+        PollingController(CountingMonitor(), [], "10s", backpressure="ignore")
+    with pytest.raises(ValueError):
+        PollingController(CountingMonitor(), [], "10s", backpressure="spill")
+
+class RecordingController(PollingController):
+    def __init__(self, monitor, interval):
+        super().__init__(monitor, [RecordingBackend()], "10s")
+        self.interval_seconds = interval
+        self.ticks = []
+
+    async def fetch(self, scheduled):
+        self.ticks.append(scheduled)
+        await super().fetch(scheduled)
+
+class StallingMonitor(CountingMonitor):
+    """The first fetch hangs for a bit more than three 50 ms ticks."""
+
+    async def fetch_data(self):
+        if not self.polls:
+            await asyncio.sleep(0.17)
+        return await super().fetch_data()
+
+async def run_scheduled(scheduler, controllers, seconds):
+    runner = asyncio.create_task(scheduler.run())
+    tasks = [asyncio.create_task(c.run(scheduler)) for c in controllers]
+    await asyncio.sleep(seconds)
+    for task in tasks + [runner]:
+        task.cancel()
+    await asyncio.gather(*tasks, runner, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_scheduler_aligns_controllers_on_wall_clock():
+    scheduler = Scheduler()
+    fast = RecordingController(CountingMonitor(), 0.05)
+    slow = RecordingController(CountingMonitor(), 0.1)
+    await run_scheduled(scheduler, [fast, slow], 0.33)
+
+    for controller in (fast, slow):
+        assert len(controller.ticks) >= 3
+        interval = controller.interval_seconds
+        for tick in controller.ticks:
+            assert abs(tick - round(tick / interval) * interval) < 1e-4
+        gaps = [b - a for a, b in zip(controller.ticks, controller.ticks[1:])]
+        assert all(abs(g - interval) < 1e-4 for g in gaps)
+    # Every tick of the slower source coincides with a tick of the faster one
+    assert {round(t, 3) for t in slow.ticks} <= {round(t, 3) for t in fast.ticks}
+    assert not scheduler.jobs
+
+@pytest.mark.asyncio
+async def test_scheduler_skips_or_catches_up_after_overrun():
+    skipping = RecordingController(StallingMonitor(), 0.05)
+    await run_scheduled(Scheduler(), [skipping], 0.4)
+    gaps = [round((b - a) / 0.05) for a, b in zip(skipping.ticks, skipping.ticks[1:])]
+    # The three ticks during the stall are skipped, then the schedule resumes
+    assert gaps[0] == 4 and set(gaps[1:]) == {1}
+    assert skipping.pipeline["skipped"] == 3
+
+    catching_up = RecordingController(StallingMonitor(), 0.05)
+    await run_scheduled(Scheduler(catch_up=2), [catching_up], 0.4)
+    gaps = [round((b - a) / 0.05) for a, b in zip(catching_up.ticks, catching_up.ticks[1:])]
+    # The two most recent missed ticks are fetched afterwards with their own timestamps
+    assert gaps[0] == 2 and set(gaps[1:]) == {1}
+    assert catching_up.pipeline["skipped"] == 1
+
+def test_scheduler_jitter_is_deterministic():
+    first, second = Scheduler(jitter=5, clock=lambda: 1000.0), Scheduler(jitter=5, clock=lambda: 1000.0)
+    for scheduler in (first, second):
+        scheduler.add(RecordingController(CountingMonitor(), 60))
+    [job1], [job2] = first.jobs.values(), second.jobs.values()
+    assert job1.offset == job2.offset
+    assert 0 <= job1.offset <= 5
+    # Ticks stay on the boundary; only the firing time is shifted
+    assert job1.due == 1020.0
+
+@pytest.mark.asyncio
+async def test_monitors_share_one_keepalive_session():
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from dvm_mesura.core.controller import MasterController
+    from dvm_mesura.monitors.energy import EnergyMonitor
+
+    peers = []
+
+    async def handler(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({"active_power_w": 350})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/data", handler)
+    async with TestServer(app) as server:
+        master = MasterController()
+        monitors = [EnergyMonitor(f"energy{i}", "1m", str(server.make_url("/api/v1/data"))) for i in range(2)]
+        for monitor in monitors:
+            master.add_controller(PollingController(monitor, [], "1m"))
+        assert all(m.http is master.http for m in monitors)
+
+        for _ in range(3):
+            for monitor in monitors:
+                assert (await monitor.fetch_data())["active_power_w"] == 350
+        # All six requests went over a single kept-alive connection
+        assert len(set(peers)) == 1
+
+        await master.close_monitors()
+        assert master.http._session is None
+
+@pytest.mark.asyncio
+async def test_monitor_may_return_several_rows():
+    class SitesMonitor(CountingMonitor):
+        def process_data(self, data):
+            return [{"n": (data["n"], site)} for site in ("a", "b")]
+
+    backend = RecordingBackend()
+    controller = PollingController(SitesMonitor(), [backend], "10s")
+    await controller.fetch(1771840800)
+    sink = asyncio.create_task(controller.sink())
+    await controller.queue.join()
+    sink.cancel()
+    await controller.drain()
+    assert backend.rows == [(1, "a"), (1, "b")]
+
+@pytest.mark.asyncio
+async def test_failed_backend_writes_are_counted(tmp_path):
+    from dvm_mesura.backends.sqlite import SQLiteBackend
+
+    class BadRowMonitor(CountingMonitor):
+        def process_data(self, data):
+            # SQLite cannot bind a list: the insert fails
+            return {"n": data["n"], "bad": [1]} if data["n"] == 2 else data
+
+    backend = SQLiteBackend(tmp_path / "stats.db")
+    monitor = BadRowMonitor()
+    controller = PollingController(monitor, [backend], "10s")
+    for _ in range(3):
+        await monitor.fetch_data()
+        rows = controller.process("2026-02-23T10:00:00Z", {"n": len(monitor.polls)})
+        await asyncio.gather(*await controller.dispatch(rows))
+    await controller.drain()
+    await backend.close()
+    assert controller.stats["SQLiteBackend"] == {"writes": 2, "errors": 1, "timeouts": 0}
+
+@pytest.mark.asyncio
+async def test_stalled_backend_does_not_hold_up_the_others():
+    monitor = CountingMonitor()
+    fast, stalled = RecordingBackend(), RecordingBackend()
+    stalled.gate.clear()
+    controller = PollingController(monitor, [fast, stalled], "10s", write_timeout=5)
+    for tick in range(5):
+        await controller.fetch(1771840800 + tick * 10)
+    sink = asyncio.create_task(controller.sink())
+    await asyncio.wait_for(controller.queue.join(), 1)
+    await asyncio.sleep(0.01)
+    # The stalled backend keeps its rows queued, in order; the other one wrote them all
+    assert fast.rows == [1, 2, 3, 4, 5]
+    assert stalled.rows == []
+    stalled.gate.set()
+    await controller.drain()
+    sink.cancel()
+    assert stalled.rows == [1, 2, 3, 4, 5]
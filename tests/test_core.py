@@ -2,8 +2,9 @@ import pytest
 import asyncio
 import sqlite3
 import csv
+import gzip
 from pathlib import Path
-from dvm_mesura.core.helpers import parse_interval, flatten_dict, format_time_display
+from dvm_mesura.core.helpers import parse_interval, flatten_dict, format_time_display, epoch_ms, Flattener
 from dvm_mesura.backends.sqlite import SQLiteBackend
 from dvm_mesura.backends.csv import CSVBackend
 
@@ -19,6 +20,23 @@ def test_flatten_dict():
     assert flattened["a.b"] == 1
     assert flattened["c[0]"] == 1
 
+def test_flattener_matches_flatten_dict_across_shape_changes():
+    flattener = Flattener({"external"})
+    payloads = [
+        {"a": 1, "b": {"c": [1, {"x": 2}], "d": None}, "external": [{"t": 1}], "e": []},
+        {"a": 2, "b": {"c": [1, {"x": 3}], "d": "y"}, "external": [], "e": []},
+        {"a": 3, "b": {"c": [1, {"x": 4}, 5], "d": None}, "external": [], "e": []},  # longer list
+        {"a": {"z": 1}, "b": {"c": [], "d": None}, "external": [], "e": []},  # leaf became a dict
+        {"b": {"d": 1}, "a": 4, "external": [], "e": [7]},  # other key order
+        {"a": 5, "b": {"c": [1, {"x": 5}], "d": None}, "external": [{"t": 1}], "e": []},
+    ]
+    for payload in payloads:
+        assert flattener(payload) == flatten_dict(payload, {"external"})
+    # The first shape came back and was served by its cached plan
+    assert flattener.stats["hits"] == 2
+    assert flattener.stats["compiles"] == 4
+    assert flattener([1, 2]) == flatten_dict([1, 2])
+
 @pytest.mark.asyncio
 async def test_sqlite_backend(tmp_path):
     db_path = tmp_path / "test.db"
@@ -38,6 +56,7 @@ async def test_csv_backend(tmp_path):
     data = {"timestamp": "2026-02-23T10:00:00Z", "val": 1.5}
     
     await backend.write(data, "test_source")
+    await backend.flush()
     
     csv_file = tmp_path / "test_source.csv"
     assert csv_file.exists()
@@ -45,3 +64,78 @@ async def test_csv_backend(tmp_path):
         reader = csv.DictReader(f)
         row = next(reader)
         assert float(row["val"]) == 1.5
+
+@pytest.mark.asyncio
+async def test_csv_backend_schema_drift_and_rotation(tmp_path):
+    backend = CSVBackend(tmp_path)
+    await backend.write({"timestamp": "2026-02-23T10:00:00Z", "a": 1, "b": 2}, "energy")
+    # A missing key keeps the header; a new key starts a new file
+    await backend.write({"timestamp": "2026-02-23T10:01:00Z", "b": 3}, "energy")
+    await backend.write({"timestamp": "2026-02-23T10:02:00Z", "a": 4, "c": 5}, "energy")
+    # First row of a new day rotates the live file
+    await backend.write({"timestamp": "2026-02-24T00:00:00Z", "a": 6, "c": 7}, "energy")
+    await backend.close()
+
+    def read(path):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", newline="") as f:
+            return list(csv.DictReader(f))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "energy.2026-02-23.1.csv.gz", "energy.2026-02-23.csv.gz", "energy.csv",
+    ]
+    assert read(tmp_path / "energy.2026-02-23.csv.gz") == [
+        {"timestamp": "2026-02-23T10:00:00Z", "a": "1", "b": "2"},
+        {"timestamp": "2026-02-23T10:01:00Z", "a": "", "b": "3"},
+    ]
+    assert [r["c"] for r in read(tmp_path / "energy.2026-02-23.1.csv.gz")] == ["5"]
+    assert read(tmp_path / "energy.csv") == [{"timestamp": "2026-02-24T00:00:00Z", "a": "6", "c": "7"}]
+
+    # A restart keeps appending under the existing header
+    backend = CSVBackend(tmp_path)
+    await backend.write({"timestamp": "2026-02-24T00:01:00Z", "c": 8}, "energy")
+    await backend.close()
+    assert [r["c"] for r in read(tmp_path / "energy.csv")] == ["7", "8"]
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_caches_schema(tmp_path):
+    db_path = tmp_path / "cache.db"
+    backend = SQLiteBackend(db_path)
+
+    await backend.write({"timestamp": "2026-02-23T10:00:00Z", "val": 1.5}, "cached")
+    await backend.write({"timestamp": "2026-02-23T10:01:00Z", "val": 2.5}, "cached")
+
+    schema = backend.db.schemas["cached"]
+    assert list(schema.columns) == ["timestamp", "val", "ts_ms"]
+    # One compiled INSERT for the one column set seen so far
+    assert len(schema._inserts) == 1
+
+    # A new key evolves the table through the cache
+    await backend.write({"timestamp": "2026-02-23T10:02:00Z", "val": 3.5, "extra": 7}, "cached")
+    assert "extra" in schema.columns
+
+    # A table dropped behind our back is recreated on the next write
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE cached")
+    await backend.write({"timestamp": "2026-02-23T10:03:00Z", "val": 4.5}, "cached")
+
+    await backend.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT val FROM cached").fetchall() == [(4.5,)]
+
+def test_epoch_ms():
+    assert epoch_ms("1970-01-01T00:00:01Z") == 1000
+    assert epoch_ms("2026-02-23T10:00:00Z") == epoch_ms("2026-02-23T10:00:00")
+    assert epoch_ms("garbage") is None
+    assert epoch_ms(None) is None
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_epoch_ms_index(tmp_path):
+    db_path = tmp_path / "indexed.db"
+    backend = SQLiteBackend(db_path)
+    await backend.write({"timestamp": "2026-02-23T10:00:00Z", "val": 1.5}, "energy")
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT ts_ms FROM energy").fetchone()[0] == epoch_ms("2026-02-23T10:00:00Z")
+        indexes = [r[1] for r in conn.execute("PRAGMA index_list(energy)")]
+        assert "idx_energy_ts_ms" in indexes
@@ -0,0 +1,54 @@
+import pytest
+from dvm_mesura.core.dedup import ChangeFilter, parse_dedup_spec
+
+def ts(minute):
+    return f"2026-02-23T10:{minute:02d}:00Z"
+
+def test_parse_dedup_spec():
+    assert parse_dedup_spec("evohome=1h; energy=15m") == {"evohome": 3600.0, "energy": 900.0}
+    assert parse_dedup_spec("") == {}
+    with pytest.raises(ValueError):
+        parse_dedup_spec("evohome")
+
+def test_row_mode_suppresses_and_records_steps():
+    dedup = ChangeFilter(max_gap=30 * 60)
+    temps = [20.5, 20.5, 20.5, 21.0, 21.0] + [21.0] * 30
+    written = [dedup.apply({"timestamp": ts(m), "zone": t}) for m, t in enumerate(temps)]
+    written = [w for w in written if w is not None]
+
+    assert written[0] == {"timestamp": ts(0), "zone": 20.5}
+    # The change carries how long the previous value was confirmed
+    assert written[1] == {"timestamp": ts(3), "zone": 21.0, "suppressed": 2, "prev_seen_ms": 1771840920000}
+    # Heartbeat after 30 minutes without a change
+    assert written[2]["timestamp"] == ts(33)
+    assert written[2]["suppressed"] == 29
+    assert len(written) == 3
+    assert dedup.suppressed == 32
+
+    # Type changes and new or missing columns count as a change
+    assert dedup.apply({"timestamp": ts(34), "zone": 21}) is not None
+    assert dedup.apply({"timestamp": ts(35), "zone": 21, "mode": "Auto"}) is not None
+    assert dedup.apply({"timestamp": ts(36), "zone": 21}) is not None
+
+def test_column_mode_keeps_only_changed_values():
+    dedup = ChangeFilter(max_gap=10 * 60, mode="column")
+    assert dedup.apply({"timestamp": ts(0), "living": 20.5, "bedroom": 18.0}) == {
+        "timestamp": ts(0), "living": 20.5, "bedroom": 18.0,
+    }
+    assert dedup.apply({"timestamp": ts(1), "living": 20.5, "bedroom": 18.0}) is None
+    assert dedup.apply({"timestamp": ts(2), "living": 21.0, "bedroom": 18.0}) == {
+        "timestamp": ts(2), "living": 21.0, "suppressed": 1, "prev_seen_ms": 1771840860000,
+    }
+    # bedroom's heartbeat is due 10 minutes after it was written, living's is not
+    assert dedup.apply({"timestamp": ts(10), "living": 21.0, "bedroom": 18.0}) == {
+        "timestamp": ts(10), "bedroom": 18.0,
+    }
+
+def test_change_filter_keeps_series_apart():
+    """With a key, rows of different locations do not count as changes of each other."""
+    dedup = ChangeFilter(max_gap=3600, key="system_id")
+    assert dedup.apply({"timestamp": ts(0), "system_id": "1", "t": 20.0}) is not None
+    assert dedup.apply({"timestamp": ts(0), "system_id": "2", "t": 18.0}) is not None
+    assert dedup.apply({"timestamp": ts(5), "system_id": "1", "t": 20.0}) is None
+    assert dedup.apply({"timestamp": ts(5), "system_id": "2", "t": 18.5}) is not None
+    assert dedup.suppressed == 1
@@ -80,3 +80,133 @@ async def test_write_to_sqlite(tmp_path):
         cursor.execute("SELECT new_utility_field FROM energy WHERE timestamp=?", ("2026-02-23T10:10:00Z",))
         val = cursor.fetchone()[0]
         assert val == 42.5
+
+class FakeDNS:
+    def __init__(self, address="127.0.0.1", delay=0.0):
+        self.address = address
+        self.delay = delay
+        self.lookups = 0
+
+    async def __call__(self, host):
+        self.lookups += 1
+        await asyncio.sleep(self.delay)
+        if self.address is None:
+            raise OSError("mDNS lookup timed out")
+        return self.address
+
+@pytest.mark.asyncio
+async def test_host_resolver_caches_and_refreshes(tmp_path):
+    from dvm_mesura.core.http import HostResolver
+    dns = FakeDNS("192.168.1.20")
+    resolver = HostResolver(tmp_path / "hosts.json", ttl=3600, resolve=dns)
+    assert await resolver.address("p1meter.local.") == "192.168.1.20"
+    assert await resolver.address("p1meter.local.") == "192.168.1.20"
+    assert dns.lookups == 1
+    assert await resolver.address("10.0.0.1") == "10.0.0.1"
+
+    # A failure re-resolves in the background; the old address stays in use until then
+    dns.address = "192.168.1.21"
+    resolver.invalidate("p1meter.local.")
+    assert await resolver.address("p1meter.local.") == "192.168.1.20"
+    await asyncio.gather(*resolver._refreshing.values())
+    assert await resolver.address("p1meter.local.") == "192.168.1.21"
+    resolver.confirm("p1meter.local.", "192.168.1.21")
+    await resolver.close()
+
+    # After a restart the last known good address is used without waiting for mDNS
+    slow_dns = FakeDNS(None, delay=0.05)
+    restarted = HostResolver(tmp_path / "hosts.json", resolve=slow_dns)
+    assert await restarted.address("p1meter.local.") == "192.168.1.21"
+    await asyncio.gather(*restarted._refreshing.values())
+    assert slow_dns.lookups == 1
+    assert await restarted.address("p1meter.local.") == "192.168.1.21"
+    await restarted.close()
+
+@pytest.mark.asyncio
+async def test_energy_monitor_uses_resolved_address(tmp_path):
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from dvm_mesura.core.http import HostResolver
+
+    hosts = []
+
+    async def handler(request):
+        hosts.append(request.headers["Host"])
+        return web.json_response({"active_power_w": 350, "external": [{"type": "gas"}]})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/data", handler)
+    async with TestServer(app, host="127.0.0.1") as server:
+        port = server.port
+        dns = FakeDNS("127.0.0.1")
+        resolver = HostResolver(tmp_path / "hosts.json", resolve=dns)
+        monitor = EnergyMonitor("energy", "10s", f"http://p1meter-231dbe.local.:{port}/api/v1/data", resolver)
+        for _ in range(3):
+            assert monitor.process_data(await monitor.fetch_data()) == {"active_power_w": 350}
+        await monitor.cleanup()
+
+    assert dns.lookups == 1
+    assert hosts == [f"p1meter-231dbe.local.:{port}"] * 3
+    assert "127.0.0.1" in (tmp_path / "hosts.json").read_text()
+
+def test_parse_interval_sub_second():
+    from dvm_mesura.core.helpers import parse_interval
+    assert parse_interval("500ms", minimum=0.1) == 0.5
+    assert parse_interval("1s", minimum=0.1) == 1.0
+    with pytest.raises(ValueError, match="at least 10 seconds"):
+        parse_interval("500ms")
+    with pytest.raises(ValueError, match="at least 0.1 seconds"):
+        parse_interval("50ms", minimum=0.1)
+
+def test_sample_aggregator():
+    from dvm_mesura.monitors.energy import SampleAggregator
+    aggregator = SampleAggregator()
+    for power in (300, 2400, 310, 290):
+        aggregator.add({"active_power_w": power, "total_power_import_kwh": 10.5, "wifi_ssid": "home"})
+    row = aggregator.summary()
+    assert row == {
+        "active_power_w": 290, "active_power_w_min": 290.0, "active_power_w_max": 2400.0,
+        "active_power_w_mean": 825.0, "total_power_import_kwh": 10.5, "wifi_ssid": "home", "samples": 4,
+    }
+    assert aggregator.summary() == {"samples": 0}
+
+@pytest.mark.asyncio
+async def test_energy_monitor_high_frequency_sampling():
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    readings = iter(range(1, 10_000))
+
+    async def handler(request):
+        n = next(readings)
+        # A short spike on the fifth reading
+        return web.json_response({"active_power_w": 5000 if n == 5 else 100 + n, "total_gas_m3": 1.5})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/data", handler)
+    async with TestServer(app) as server:
+        monitor = EnergyMonitor("energy", "10s", str(server.make_url("/api/v1/data")), sample_interval=0.01)
+        first = monitor.process_data(await monitor.fetch_data())
+        await asyncio.sleep(0.12)
+        second = monitor.process_data(await monitor.fetch_data())
+        await monitor.cleanup()
+
+    assert first["samples"] >= 1
+    assert second["samples"] >= 5
+    assert second["active_power_w_max"] == 5000
+    assert second["active_power_w_min"] <= second["active_power_w_mean"] <= second["active_power_w_max"]
+    assert second["total_gas_m3"] == 1.5
+    assert "total_gas_m3_max" not in second
+
+@pytest.mark.asyncio
+async def test_energy_monitor_sampling_unreachable_meter():
+    # Nothing listens on the discard port: every sample fails
+    monitor = EnergyMonitor("energy", "10s", "http://127.0.0.1:9/api/v1/data", sample_interval=0.01)
+    monitor.first_sample_timeout = 0.1
+    with pytest.raises(RuntimeError, match="No reading from the energy meter"):
+        await asyncio.wait_for(monitor.fetch_data(), 2)
+    assert monitor.sample_errors >= 1
+    # The sampler keeps trying in the background; later polls report the empty interval
+    with pytest.raises(RuntimeError, match="No samples"):
+        await monitor.fetch_data()
+    await monitor.cleanup()
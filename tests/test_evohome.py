@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 import sqlite3
+import json
 import os
 from pathlib import Path
 import sqlite3
@@ -99,6 +100,119 @@ async def test_evohome_monitor_logic():
     mock_loc = MagicMock()
     mock_loc.gateways = [MagicMock(systems=[mock_system])]
     
-    processed = monitor.process_data({"location": mock_loc})
+    processed = monitor.process_data({"locations": [mock_loc]})[0]
     assert processed["_123_Test"] == 20.5
     assert processed["system_mode"] == "Auto"
+
+@pytest.mark.asyncio
+async def test_evohome_token_cache(tmp_path):
+    """Tokens are persisted privately and reused; they count as expired before they are."""
+    pytest.importorskip("evohomeasync2.auth")
+    from datetime import datetime, timedelta, timezone
+    from dvm_mesura.monitors.evohome import FileTokenManager
+
+    cache = tmp_path / "evohome_tokens.json"
+    manager = FileTokenManager("user", "pass", MagicMock(), cache)
+    manager._access_token = "access"
+    manager._access_token_expires = datetime.now(timezone.utc) + timedelta(minutes=30)
+    manager._refresh_token = "refresh"
+    await manager.save_access_token()
+    assert cache.stat().st_mode & 0o777 == 0o600
+
+    restarted = FileTokenManager("user", "pass", MagicMock(), cache)
+    await restarted.load_cached_tokens()
+    assert restarted.access_token == "access"
+    assert restarted.refresh_token == "refresh"
+    assert restarted.is_token_valid()
+
+    # Tokens of another account are not used
+    other = FileTokenManager("someone-else", "pass", MagicMock(), cache)
+    await other.load_cached_tokens()
+    assert not other.is_token_valid()
+
+@pytest.mark.asyncio
+async def test_evohome_token_refreshed_ahead_of_expiry(tmp_path):
+    """The library's get_access_token() refreshes a token that expires within 5 minutes."""
+    pytest.importorskip("evohomeasync2.auth")
+    from datetime import datetime, timedelta, timezone
+    from dvm_mesura.monitors.evohome import FileTokenManager
+
+    manager = FileTokenManager("user", "pass", MagicMock(), tmp_path / "evohome_tokens.json")
+    manager._access_token = "old"
+    manager._access_token_expires = datetime.now(timezone.utc) + timedelta(minutes=2)
+    manager._refresh_token = "refresh"
+
+    async def fetch(credentials):
+        assert credentials["refresh_token"] == "refresh"
+        manager._access_token = "new"
+        manager._access_token_expires = datetime.now(timezone.utc) + timedelta(minutes=30)
+
+    with patch.object(manager, "_fetch_access_token", side_effect=fetch) as fetched:
+        assert await manager.get_access_token() == "new"
+        # Still valid for long enough: no second refresh
+        assert await manager.get_access_token() == "new"
+    assert fetched.call_count == 1
+    assert json.loads((tmp_path / "evohome_tokens.json").read_text())["access_token"] == "new"
+
+@pytest.mark.asyncio
+async def test_evohome_polls_all_locations_concurrently():
+    """Locations are updated concurrently under the cap; a slow one is skipped."""
+    pytest.importorskip("evohomeasync2.auth")
+    from dvm_mesura.monitors.evohome import EvohomeMonitor
+
+    running = []
+    peak = []
+
+    def location(loc_id, delay):
+        zone = MagicMock(id=loc_id * 10, temperature=20.0)
+        zone.name = f"Zone {loc_id}"
+        loc = MagicMock(id=loc_id, gateways=[MagicMock(systems=[MagicMock(id=loc_id * 100, mode="Auto", zones=[zone])])])
+        loc.name = f"Site {loc_id}"
+
+        async def update():
+            running.append(loc_id)
+            peak.append(len(running))
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                running.remove(loc_id)
+        loc.update = update
+        return loc
+
+    monitor = EvohomeMonitor("evohome", "5m", "user", "pass", max_concurrency=2, location_timeout=0.2)
+    monitor.client = MagicMock(locations=[location(1, 0.01), location(2, 5), location(3, 0.01), location(4, 0.01)])
+    monitor._semaphore = asyncio.Semaphore(2)
+
+    data = await monitor.fetch_data()
+    assert max(peak) == 2
+    rows = monitor.process_data(data)
+    assert [row["location_id"] for row in rows] == ["1", "3", "4"]
+    assert rows[1]["system_id"] == "300"
+    assert rows[1]["_30_Zone_3"] == 20.0
+
+@pytest.mark.asyncio
+async def test_evohome_first_poll_updates_each_location_once():
+    """The first poll loads the installation without status; each location is then updated once."""
+    pytest.importorskip("evohomeasync2.auth")
+    from dvm_mesura.monitors.evohome import EvohomeMonitor
+
+    updates = []
+    locations = []
+    for loc_id in (1, 2):
+        loc = MagicMock(id=loc_id, gateways=[])
+        loc.update = AsyncMock(side_effect=lambda loc_id=loc_id: updates.append(loc_id))
+        locations.append(loc)
+
+    class FakeClient:
+        def __init__(self, token_manager):
+            self.locations = locations
+
+        async def update(self, dont_update_status=False):
+            assert dont_update_status
+
+    monitor = EvohomeMonitor("evohome", "5m", "user", "pass")
+    with patch("dvm_mesura.monitors.evohome.EvohomeClient", FakeClient):
+        data = await monitor.fetch_data()
+    await monitor.cleanup()
+    assert sorted(updates) == [1, 2]
+    assert data["locations"] == locations
@@ -0,0 +1,49 @@
+import pytest
+import csv
+import gzip
+import sqlite3
+import sys
+from dvm_mesura import export_csv
+from dvm_mesura.core.helpers import epoch_ms
+
+def make_db(path, rows=25_000):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE energy (timestamp TEXT, power REAL, ts_ms INTEGER)")
+        conn.execute("CREATE INDEX idx_energy_ts_ms ON energy (ts_ms)")
+        start = epoch_ms("2026-01-01T00:00:00Z")
+        conn.executemany("INSERT INTO energy VALUES (?, ?, ?)", (
+            (f"2026-01-{1 + n // 1440:02d}T{n // 60 % 24:02d}:{n % 60:02d}:00Z", n * 0.5, start + n * 60_000)
+            for n in range(rows)
+        ))
+        conn.execute("CREATE TABLE weather (timestamp TEXT, temp REAL)")
+        conn.executemany("INSERT INTO weather VALUES (?, ?)", [("2026-01-01T10:00:00Z", 1.0), ("2026-01-02T10:00:00Z", 2.0)])
+
+def test_export_streams_range_in_chunks(tmp_path):
+    make_db(tmp_path / "monitor.db")
+    count = export_csv.export_table_to_csv(
+        str(tmp_path / "monitor.db"), "energy", str(tmp_path / "energy.csv"),
+        since=export_csv.parse_time("2026-01-02"), until=export_csv.parse_time("2026-01-03"), chunk_size=100,
+    )
+    assert count == 1440
+    with open(tmp_path / "energy.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["timestamp", "power", "ts_ms"]
+    assert rows[1][0] == "2026-01-02T00:00:00Z" and rows[-1][0] == "2026-01-02T23:59:00Z"
+
+    # Without ts_ms the ISO timestamp text is compared instead
+    count = export_csv.export_table_to_csv(str(tmp_path / "monitor.db"), "weather", str(tmp_path / "weather.csv"),
+                                           since=export_csv.parse_time("2026-01-02"))
+    assert count == 1
+    assert export_csv.export_table_to_csv(str(tmp_path / "monitor.db"), "missing", str(tmp_path / "missing.csv")) is None
+
+def test_export_cli_gzip_and_jobs(tmp_path, monkeypatch, capsys):
+    make_db(tmp_path / "monitor.db")
+    monkeypatch.setattr(sys, "argv", ["mesura-export-csv", "--data-dir", str(tmp_path), "--gzip", "--jobs", "2",
+                                      "--table", "energy", "--table", "weather", "--until", "2026-01-01T12:00:00Z"])
+    export_csv.main()
+    with gzip.open(tmp_path / "energy.csv.gz", "rt", newline="") as f:
+        assert len(list(csv.reader(f))) == 1 + 720
+    with gzip.open(tmp_path / "weather.csv.gz", "rt", newline="") as f:
+        assert len(list(csv.reader(f))) == 1 + 1
+    assert not list(tmp_path.glob("*.tmp"))
+    assert "Exported 721 rows" in capsys.readouterr().out
@@ -0,0 +1,65 @@
+import pytest
+import asyncio
+import sqlite3
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from dvm_mesura.monitors.fleet import FleetMonitor, parse_fleet_spec
+from dvm_mesura.backends.sqlite import SQLiteBackend
+from dvm_mesura.core.controller import PollingController
+from dvm_mesura.core.http import SessionManager
+
+def test_parse_fleet_spec(tmp_path):
+    assert parse_fleet_spec("a=10.0.0.5, b=http://meter-b.local./api/v1/data") == {
+        "a": "http://10.0.0.5/api/v1/data",
+        "b": "http://meter-b.local./api/v1/data",
+    }
+    fleet_file = tmp_path / "meters.txt"
+    fleet_file.write_text("# building A\na1=10.0.0.1\na2=10.0.0.2  # basement\n\nb1=10.0.0.3\n")
+    assert list(parse_fleet_spec(str(fleet_file))) == ["a1", "a2", "b1"]
+    with pytest.raises(ValueError, match="Duplicate"):
+        parse_fleet_spec("a=1.2.3.4,a=1.2.3.5")
+    with pytest.raises(ValueError, match="Invalid meter entry"):
+        parse_fleet_spec("a=")
+
+@pytest.mark.asyncio
+async def test_fleet_polls_concurrently_and_writes_one_batch(tmp_path):
+    """All meters of a tick are read concurrently and committed in one transaction."""
+    running = []
+    peak = []
+
+    async def handler(request):
+        meter = int(request.match_info["meter"])
+        running.append(meter)
+        peak.append(len(running))
+        try:
+            await asyncio.sleep(5 if meter == 3 else 0.02)
+        finally:
+            running.remove(meter)
+        return web.json_response({"active_power_w": meter * 100, "external": []})
+
+    app = web.Application()
+    app.router.add_get("/{meter}/api/v1/data", handler)
+    async with TestServer(app, host="127.0.0.1") as server:
+        meters = {f"m{n}": str(server.make_url(f"/{n}/api/v1/data")) for n in range(20)}
+        monitor = FleetMonitor("fleet", "1m", meters, max_concurrency=8, timeout=0.5)
+        monitor.http = SessionManager()
+        backend = SQLiteBackend(tmp_path / "fleet.db")
+        controller = PollingController(monitor, [backend], "1m")
+
+        commits = backend.writer.stats["commits"]
+        await controller.fetch(1771840800)
+        sink = asyncio.create_task(controller.sink())
+        await controller.queue.join()
+        sink.cancel()
+        await controller.drain()
+        await monitor.http.close()
+
+    assert max(peak) == 8
+    assert monitor.failures == {"m3": 1}
+    assert backend.writer.stats["commits"] - commits == 1
+    await backend.close()
+    with sqlite3.connect(tmp_path / "fleet.db") as conn:
+        rows = conn.execute("SELECT meter_id, active_power_w FROM fleet ORDER BY active_power_w").fetchall()
+    assert len(rows) == 19
+    assert ("m3", 300) not in rows
+    assert rows[-1] == ("m19", 1900)
@@ -0,0 +1,90 @@
+import pytest
+import sqlite3
+from dvm_mesura.backends.retention import RetentionTask
+from dvm_mesura.backends.sqlite import SQLiteBackend
+from dvm_mesura.core.helpers import epoch_ms
+
+@pytest.mark.asyncio
+async def test_long_format_round_trip(tmp_path):
+    db_path = tmp_path / "rooms.db"
+    backend = SQLiteBackend(db_path, long_sources=["evohome"])
+
+    await backend.write({"timestamp": "2026-02-23T10:00:00Z", "system_mode": "Auto", "_1_Living": 21.5}, "evohome")
+    # New zone: no ALTER TABLE, just a new series
+    await backend.write({
+        "timestamp": "2026-02-23T10:05:00Z", "system_mode": "Auto", "_1_Living": 22.0, "_2_Bedroom": 18.5,
+    }, "evohome")
+    await backend.write({"timestamp": "2026-02-23T10:10:00Z", "system_mode": "Eco", "_1_Living": None}, "evohome")
+
+    with sqlite3.connect(db_path) as conn:
+        names = [r[0] for r in conn.execute("SELECT name FROM evohome_series ORDER BY series_id")]
+        assert names == ["system_mode", "_1_Living", "_2_Bedroom"]
+        # Nulls are not stored
+        assert conn.execute("SELECT count(*) FROM evohome_samples").fetchone()[0] == 6
+
+        # The compatibility view has the old wide shape
+        rows = conn.execute(
+            'SELECT timestamp, system_mode, "_1_Living", "_2_Bedroom" FROM evohome ORDER BY ts_ms'
+        ).fetchall()
+        assert rows == [
+            ("2026-02-23T10:00:00Z", "Auto", 21.5, None),
+            ("2026-02-23T10:05:00Z", "Auto", 22.0, 18.5),
+            ("2026-02-23T10:10:00Z", "Eco", None, None),
+        ]
+
+    # Retention on the source name expires the narrow samples
+    task = RetentionTask(db_path, {"evohome": 60_000}, pause=0)
+    assert task.enforce(now_ms=epoch_ms("2026-02-23T10:06:00Z")) == {"evohome": 2}
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_long_format_next_to_existing_wide_table(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    wide = SQLiteBackend(db_path)
+    await wide.write({"timestamp": "2026-02-23T10:00:00Z", "_1_Living": 20.0}, "evohome")
+    await wide.close()
+
+    backend = SQLiteBackend(db_path, long_sources=["evohome"])
+    await backend.write({"timestamp": "2026-02-23T10:05:00Z", "_1_Living": 21.0}, "evohome")
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('SELECT "_1_Living" FROM evohome_wide').fetchall() == [(21.0,)]
+        assert conn.execute('SELECT "_1_Living" FROM evohome').fetchall() == [(20.0,)]
+
+@pytest.mark.asyncio
+async def test_long_format_keeps_locations_apart(tmp_path):
+    db_path = tmp_path / "rooms.db"
+    backend = SQLiteBackend(db_path, long_sources=["evohome"], series_keys={"evohome": "system_id"})
+
+    # Two locations polled in the same tick write the same timestamp and zone names
+    await backend.write_many([
+        {"timestamp": "2026-02-23T10:00:00Z", "system_id": "111", "system_mode": "Auto", "_1_Living": 21.5},
+        {"timestamp": "2026-02-23T10:00:00Z", "system_id": "222", "system_mode": "Eco", "_1_Living": 18.0},
+    ], "evohome")
+    await backend.write({"timestamp": "2026-02-23T10:05:00Z", "system_id": "222", "_1_Living": 18.5}, "evohome")
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM evohome_samples").fetchone()[0] == 5
+        rows = conn.execute(
+            'SELECT timestamp, system_id, system_mode, "_1_Living" FROM evohome ORDER BY ts_ms, system_id'
+        ).fetchall()
+        assert rows == [
+            ("2026-02-23T10:00:00Z", "111", "Auto", 21.5),
+            ("2026-02-23T10:00:00Z", "222", "Eco", 18.0),
+            ("2026-02-23T10:05:00Z", "222", None, 18.5),
+        ]
+    await backend.close()
+
+def test_long_format_upgrades_series_without_entity(tmp_path):
+    db_path = tmp_path / "rooms.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE evohome_series (series_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        conn.execute("INSERT INTO evohome_series VALUES (7, '_1_Living')")
+
+    from dvm_mesura.backends.sqlite import SQLiteDatabase
+    db = SQLiteDatabase(db_path)
+    db.long.tables.add("evohome")
+    db.long.insert(db, "evohome", {"ts_ms": epoch_ms("2026-02-23T10:00:00Z"), "_1_Living": 20.0})
+    db.conn.commit()
+    assert db.conn.execute("SELECT series_id FROM evohome_samples").fetchall() == [(7,)]
+    assert db.conn.execute('SELECT "_1_Living" FROM evohome').fetchall() == [(20.0,)]
+    db.close()
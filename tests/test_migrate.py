@@ -0,0 +1,29 @@
+import pytest
+import sqlite3
+from dvm_mesura.core.helpers import epoch_ms
+from dvm_mesura.migrate import migrate_table
+
+def test_migrate_backfills_and_indexes(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    timestamps = [f"2026-02-23T10:{m:02d}:00Z" for m in range(25)] + ["not a date"]
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE energy ("timestamp" TEXT, "power" REAL)')
+        conn.executemany("INSERT INTO energy VALUES (?, 1.0)", [(t,) for t in timestamps])
+
+    migrate_table(str(db_path), "energy", chunk_size=7)
+    # Running it again is a no-op
+    migrate_table(str(db_path), "energy", chunk_size=7)
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT timestamp, ts_ms FROM energy").fetchall()
+        for ts, ts_ms in rows[:-1]:
+            assert ts_ms == epoch_ms(ts)
+        assert rows[-1][1] is None
+
+        indexes = [r[1] for r in conn.execute("PRAGMA index_list(energy)")]
+        assert "idx_energy_ts_ms" in indexes
+
+def test_migrate_missing_table(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    sqlite3.connect(db_path).close()
+    migrate_table(str(db_path), "weather")
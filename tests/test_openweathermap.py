@@ -67,3 +67,57 @@ async def test_weather_write_to_sqlite(tmp_path):
         cursor = conn.cursor()
         cursor.execute("SELECT temp_c FROM weather")
         assert cursor.fetchone()[0] == 15.5
+
+@pytest.mark.asyncio
+async def test_weather_skips_duplicates_and_respects_budget(tmp_path):
+    """Polls before the next observation is due reuse the last response; duplicates are dropped."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from dvm_mesura.core.ratelimit import TokenBucket
+
+    start = 1700000000
+    now = [float(start)]
+    calls = []
+
+    async def onecall(request):
+        minute = int(now[0] - start) // 60
+        calls.append(minute)
+        # A new observation every 10 minutes, but the one of minute 10 is published a minute late
+        dt = start + 600 * (minute // 10) if minute != 10 else start
+        return web.json_response({"lat": 50.8, "current": {"dt": dt, "temp": 283.15}})
+
+    app = web.Application()
+    app.router.add_get("/data/3.0/onecall", onecall)
+    async with TestServer(app) as server:
+        clock = lambda: now[0]
+        budget = TokenBucket.daily(48, burst=4, state_path=tmp_path / "budget.json", clock=clock)
+        monitor = WeatherMonitor("weather", "1m", "key", "50.8", "5.7", budget=budget, clock=clock)
+        monitor.api_url = str(server.make_url("/data/3.0/onecall"))
+
+        rows = []
+        for minute in range(40):
+            now[0] = start + minute * 60.0
+            rows.append(monitor.process_data(await monitor.fetch_data()))
+
+    # Budget: 4 calls plus one per ~33 minutes of refill, so the call due at minute 30 has to wait
+    assert calls[:4] == [0, 10, 11, 20]
+    assert calls[4] > 30
+    assert [minute for minute, row in enumerate(rows) if row is not None] == [0, 11, 20, calls[4]]
+    assert monitor.stats["calls"] == 5
+    assert monitor.stats["over_budget"] == calls[4] - 30
+
+    # The remaining budget is persisted across restarts
+    reopened = TokenBucket.daily(48, burst=4, state_path=tmp_path / "budget.json", clock=lambda: now[0])
+    assert reopened.tokens == pytest.approx(budget.tokens, abs=0.01)
+
+def test_token_bucket_daily_quota():
+    from dvm_mesura.core.ratelimit import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket.daily(1000, clock=lambda: now[0])
+    taken = 0
+    for second in range(0, 86400, 10):
+        now[0] = second
+        taken += bucket.take()
+    assert 990 <= taken <= 1000
+    assert not bucket.take()
+    assert bucket.seconds_until_available() > 0
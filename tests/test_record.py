@@ -0,0 +1,99 @@
+import pytest
+import sqlite3
+from array import array
+from dvm_mesura.core.record import RecordBatch, Sample, Schema
+from dvm_mesura.core.helpers import Flattener, with_epoch_ms
+from dvm_mesura.backends.sqlite import SQLiteBackend
+
+def test_sample_behaves_like_a_read_only_dict():
+    sample = Sample.from_dict({"a": 1, "b": None})
+    assert sample == {"a": 1, "b": None}
+    assert dict(sample) == {"a": 1, "b": None}
+    assert sample["a"] == 1 and sample.get("c", 3) == 3 and "b" in sample
+    assert list(sample.items()) == [("a", 1), ("b", None)]
+    with pytest.raises(KeyError):
+        sample["c"]
+    with pytest.raises(TypeError):
+        sample["a"] = 2
+    with pytest.raises(AttributeError):
+        sample.extra = 1  # slotted: no per-instance __dict__
+
+    stamped = sample.with_column("timestamp", "2026-02-23T10:00:00Z")
+    assert list(stamped) == ["a", "b", "timestamp"] and "timestamp" not in sample
+    assert stamped.with_column("a", 5)["a"] == 5
+    # Records of one shape share one schema object
+    assert stamped.schema is Sample.from_dict({"a": 2, "b": 3}).with_column("timestamp", "").schema
+    assert with_epoch_ms(stamped)["ts_ms"] == 1771840800000
+
+def test_flattener_samples_share_schema():
+    flattener = Flattener()
+    first = flattener.sample({"x": {"y": 1.5}, "z": "a"})
+    second = flattener.sample({"x": {"y": 2.5}, "z": "b"})
+    assert first == {"x.y": 1.5, "z": "a"}
+    assert second.schema is first.schema
+    assert second.values == (2.5, "b")
+
+def test_record_batch_is_columnar_and_typed():
+    batch = RecordBatch.from_rows([
+        {"meter_id": "a", "power_w": 1.5, "count": 1},
+        {"meter_id": "b", "power_w": 2.5, "count": 2, "gas_m3": 3.0},
+    ])
+    assert batch.schema is Schema.of(("meter_id", "power_w", "count", "gas_m3"))
+    assert isinstance(batch.column("power_w"), array) and batch.column("power_w").typecode == "d"
+    assert batch.column("count").typecode == "q"
+    assert batch.column("gas_m3") == [None, 3.0]
+    assert list(batch.value_rows()) == [("a", 1.5, 1, None), ("b", 2.5, 2, 3.0)]
+    stamped = batch.with_column("timestamp", "2026-02-23T10:00:00Z")
+    assert [row["timestamp"] for row in stamped] == ["2026-02-23T10:00:00Z"] * 2
+    assert stamped.rows()[1] == {"meter_id": "b", "power_w": 2.5, "count": 2, "gas_m3": 3.0,
+                                 "timestamp": "2026-02-23T10:00:00Z"}
+
+@pytest.mark.asyncio
+async def test_sqlite_writes_samples(tmp_path):
+    batch = RecordBatch.from_rows(
+        {"timestamp": f"2026-02-23T10:0{n}:00Z", "meter_id": f"m{n}", "power_w": n * 1.5} for n in range(5)
+    )
+    backend = SQLiteBackend(tmp_path / "records.db")
+    await backend.write_many(list(batch), "fleet")
+    await backend.write(Sample.from_dict({"timestamp": "2026-02-23T10:09:00Z", "meter_id": "m9", "extra": 1}), "fleet")
+    await backend.close()
+    with sqlite3.connect(tmp_path / "records.db") as conn:
+        rows = conn.execute("SELECT meter_id, power_w, extra, ts_ms FROM fleet ORDER BY ts_ms").fetchall()
+    assert rows[1] == ("m1", 1.5, None, 1771840860000)
+    assert rows[-1] == ("m9", None, 1, 1771841340000)
+
+@pytest.mark.asyncio
+async def test_sqlite_inserts_record_batch_column_wise(tmp_path):
+    batch = RecordBatch.from_rows(
+        {"meter_id": f"m{n}", "power_w": n * 1.5, **({"gas_m3": 2.0} if n == 3 else {})} for n in range(4)
+    ).with_column("timestamp", "2026-02-23T10:00:00Z")
+    backend = SQLiteBackend(tmp_path / "records.db")
+    seen = []
+    insert_many = backend.db.insert_many
+
+    def spy(rows):
+        seen.extend(type(data) for _, data in rows)
+        insert_many(rows)
+
+    backend.db.insert_many = spy
+    await backend.write_many(batch, "fleet")
+    await backend.close()
+    # The batch reached the database as one columnar item
+    assert seen == [RecordBatch]
+    with sqlite3.connect(tmp_path / "records.db") as conn:
+        rows = conn.execute("SELECT meter_id, power_w, gas_m3, ts_ms FROM fleet ORDER BY meter_id").fetchall()
+        types = {r[1]: r[2] for r in conn.execute("PRAGMA table_info(fleet)")}
+    assert rows[0] == ("m0", 0.0, None, 1771840800000)
+    assert rows[3] == ("m3", 4.5, 2.0, 1771840800000)
+    assert types["gas_m3"] == "REAL"
+
+def test_schema_intern_table_only_keeps_live_schemas():
+    import gc
+    columns = ("intern_test_a", "intern_test_b")
+    sample = Sample.from_dict(dict.fromkeys(columns))
+    assert Schema.of(columns) is sample.schema
+    # Schemas compare by their columns, so caches keyed on them survive re-interning
+    assert Schema(columns) == sample.schema and hash(Schema(columns)) == hash(sample.schema)
+    del sample
+    gc.collect()
+    assert columns not in Schema._interned
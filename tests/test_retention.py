@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+import sqlite3
+from dvm_mesura.backends.retention import RetentionTask, parse_retention_spec
+from dvm_mesura.core.helpers import epoch_ms
+from dvm_mesura.migrate import enable_incremental_vacuum
+
+DAY_MS = 86_400_000
+
+def test_parse_retention_spec():
+    policy = parse_retention_spec("energy=90d; energy_1h=forever;weather=48h")
+    assert policy == {"energy": 90 * DAY_MS, "energy_1h": None, "weather": 48 * 3_600_000}
+    with pytest.raises(ValueError):
+        parse_retention_spec("energy=90")
+
+def test_retention_deletes_in_batches(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    now_ms = epoch_ms("2026-06-01T00:00:00Z")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute('CREATE TABLE energy ("timestamp" TEXT, "ts_ms" INTEGER, "power" REAL)')
+        conn.executemany(
+            "INSERT INTO energy VALUES ('x', ?, 1.0)",
+            [(now_ms - d * DAY_MS,) for d in range(0, 200)],
+        )
+        # Legacy table without ts_ms falls back to the ISO timestamp
+        conn.execute('CREATE TABLE weather ("timestamp" TEXT)')
+        conn.executemany("INSERT INTO weather VALUES (?)", [("2025-01-01T00:00:00Z",), ("2026-05-31T00:00:00Z",)])
+        conn.execute('CREATE TABLE energy_1h ("ts_ms" INTEGER)')
+        conn.execute("INSERT INTO energy_1h VALUES (0)")
+
+    task = RetentionTask(db_path, parse_retention_spec("energy=90d;weather=30d;energy_1h=forever"), batch_size=7, pause=0)
+    deleted = task.enforce(now_ms=now_ms)
+    assert deleted == {"energy": 109, "weather": 1}
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*), min(ts_ms) FROM energy").fetchone() == (91, now_ms - 90 * DAY_MS)
+        assert conn.execute("SELECT count(*) FROM weather").fetchone()[0] == 1
+        assert conn.execute("SELECT count(*) FROM energy_1h").fetchone()[0] == 1
+
+def test_retention_warns_once_without_incremental_vacuum(tmp_path, capsys):
+    db_path = tmp_path / "old.db"
+    now_ms = epoch_ms("2026-06-01T00:00:00Z")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE energy ("ts_ms" INTEGER)')
+        conn.executemany("INSERT INTO energy VALUES (?)", [(now_ms - d * DAY_MS,) for d in range(10)])
+
+    task = RetentionTask(db_path, {"energy": 5 * DAY_MS}, pause=0)
+    assert task.enforce(now_ms=now_ms) == {"energy": 4}
+    assert task.enforce(now_ms=now_ms + DAY_MS) == {"energy": 1}
+    assert capsys.readouterr().out.count("mesura-migrate --vacuum") == 1
+
+    enable_incremental_vacuum(db_path)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert conn.execute("SELECT count(*) FROM energy").fetchone()[0] == 5
+
+@pytest.mark.asyncio
+async def test_retention_task_stops_between_batches_when_cancelled(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE energy ("ts_ms" INTEGER)')
+        conn.executemany("INSERT INTO energy VALUES (?)", [(d * DAY_MS,) for d in range(50)])
+
+    task = RetentionTask(db_path, {"energy": DAY_MS}, batch_size=5, pause=0.2)
+    runner = asyncio.create_task(task.run())
+    await asyncio.sleep(0.1)
+    runner.cancel()
+    await asyncio.wait_for(runner, 1)
+
+    # The thread has finished by the time run() returns: no batch is deleted afterwards
+    await asyncio.sleep(0.3)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM energy").fetchone()[0] == 45
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+import sqlite3
+from dvm_mesura.backends.rollup import RollupTask, parse_resolution, parse_rollup_spec
+from dvm_mesura.backends.sqlite import SQLiteBackend
+
+def test_parse_rollup_spec():
+    assert parse_resolution("1h") == 3_600_000
+    assert parse_rollup_spec("energy=1h,1d; weather=1h") == {"energy": ["1h", "1d"], "weather": ["1h"]}
+    with pytest.raises(ValueError):
+        parse_rollup_spec("energy=1x")
+    with pytest.raises(ValueError):
+        parse_rollup_spec("energy=")
+
+def _row(minute, power, **extra):
+    return {"timestamp": f"2026-02-23T10:{minute:02d}:00Z", "power": power, "mode": "Auto", **extra}
+
+@pytest.mark.asyncio
+async def test_incremental_rollup(tmp_path):
+    db_path = tmp_path / "monitor.db"
+    backend = SQLiteBackend(db_path, rollups={"energy": ["1h"]})
+
+    for minute, power in [(0, 10), (1, 30), (2, 20)]:
+        await backend.write(_row(minute, power), "energy")
+    # A new numeric field is picked up from schema evolution
+    await backend.write(_row(3, 40, gas=1.5), "energy")
+
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute(
+            "SELECT timestamp, samples, power_min, power_max, power_avg, power_last, power_count, gas_last, gas_count FROM energy_1h"
+        ).fetchone()
+        assert row == ("2026-02-23T10:00:00Z", 4, 10, 40, 25.0, 40, 4, 1.5, 1)
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(energy_1h)")]
+        assert "mode_min" not in cols
+
+@pytest.mark.asyncio
+async def test_rollup_catch_up_resumes_from_watermark(tmp_path):
+    db_path = tmp_path / "history.db"
+    plain = SQLiteBackend(db_path)
+    for minute, power in [(0, 10), (30, 20)]:
+        await plain.write(_row(minute, power), "weather")
+    await plain.close()
+
+    # The live writer does not backfill: with older rows waiting, its rows are left to the catch-up pass
+    backend = SQLiteBackend(db_path, rollups={"weather": ["1h", "1d"]})
+    await backend.write({"timestamp": "2026-02-23T11:15:00Z", "power": 60}, "weather")
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT count(*) FROM sqlite_master WHERE name='weather_1h'").fetchone()[0] == 0
+
+    # One chunk per hour: each chunk commits and advances the watermark
+    task = RollupTask(db_path, {"weather": ["1h", "1d"]}, chunk_ms=3_600_000, pause=0)
+    assert task.catch_up() == {"weather": 3}
+    with sqlite3.connect(db_path) as conn:
+        watermark = conn.execute("SELECT watermark_ms FROM _rollup_state WHERE source='weather'").fetchone()[0]
+        assert watermark == conn.execute("SELECT max(ts_ms) FROM weather").fetchone()[0]
+
+    # Caught up: the writer now rolls up its rows as they are inserted
+    await backend.write({"timestamp": "2026-02-23T11:45:00Z", "power": 80}, "weather")
+    assert task.catch_up() == {"weather": 0}
+
+    with sqlite3.connect(db_path) as conn:
+        hourly = conn.execute("SELECT samples, power_avg FROM weather_1h ORDER BY ts_ms").fetchall()
+        assert hourly == [(2, 15.0), (2, 70.0)]
+        daily = conn.execute("SELECT samples, power_min, power_max, power_last FROM weather_1d").fetchall()
+        assert daily == [(4, 10, 80, 80)]
+        watermark = conn.execute("SELECT watermark_ms FROM _rollup_state WHERE source='weather'").fetchone()[0]
+        assert watermark == conn.execute("SELECT max(ts_ms) FROM weather").fetchone()[0]
+    await backend.close()
+
+def test_rollup_catch_up_keeps_finished_chunks(tmp_path, monkeypatch):
+    db_path = tmp_path / "history.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE energy (ts_ms INTEGER, timestamp TEXT, power REAL)')
+        conn.executemany("INSERT INTO energy VALUES (?, NULL, ?)", [(h * 3_600_000, float(h)) for h in range(1, 4)])
+
+    task = RollupTask(db_path, {"energy": ["1h"]}, chunk_ms=3_600_000, pause=0)
+    write_buckets = task.engine._write_buckets
+    calls = []
+
+    def failing_third_chunk(*args):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        write_buckets(*args)
+
+    monkeypatch.setattr(task.engine, "_write_buckets", failing_third_chunk)
+    with pytest.raises(RuntimeError):
+        task.catch_up()
+    with sqlite3.connect(db_path) as conn:
+        # The first two chunks were committed, the failed one can be resumed
+        assert conn.execute("SELECT watermark_ms FROM _rollup_state").fetchone()[0] == 2 * 3_600_000
+        assert conn.execute("SELECT count(*) FROM energy_1h").fetchone()[0] == 2
+
+    monkeypatch.undo()
+    assert RollupTask(db_path, {"energy": ["1h"]}, pause=0).catch_up() == {"energy": 1}
+
+@pytest.mark.asyncio
+async def test_rollup_task_stops_between_chunks_when_cancelled(tmp_path):
+    db_path = tmp_path / "history.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE energy (ts_ms INTEGER, timestamp TEXT, power REAL)')
+        conn.executemany("INSERT INTO energy VALUES (?, NULL, ?)", [(h * 3_600_000, float(h)) for h in range(1, 25)])
+
+    task = RollupTask(db_path, {"energy": ["1h"]}, chunk_ms=3_600_000, pause=0.2)
+    runner = asyncio.create_task(task.run())
+    await asyncio.sleep(0.1)
+    runner.cancel()
+    await asyncio.wait_for(runner, 1)
+
+    # The thread has finished by the time run() returns: no chunk is committed afterwards
+    with sqlite3.connect(db_path) as conn:
+        watermark = conn.execute("SELECT watermark_ms FROM _rollup_state").fetchone()[0]
+    await asyncio.sleep(0.3)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT watermark_ms FROM _rollup_state").fetchone()[0] == watermark == 3_600_000
+
+    # The next pass resumes from the watermark
+    assert RollupTask(db_path, {"energy": ["1h"]}, pause=0).catch_up() == {"energy": 23}
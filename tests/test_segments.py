@@ -0,0 +1,94 @@
+import pytest
+import math
+import random
+from dvm_mesura.backends.segments import (
+    BitReader, BitWriter, SegmentBackend, decode_floats, decode_timestamps,
+    encode_block, encode_floats, encode_timestamps, iter_blocks, _bits_to_value,
+)
+from dvm_mesura.core.helpers import epoch_ms
+
+def test_timestamp_round_trip():
+    base = 1_771_840_800_000
+    timestamps = [base + i * 60_000 + random.choice([0, 0, 3, -2, 150, -900, 5_000, 40_000_000]) for i in range(500)]
+    timestamps[10] = timestamps[9]  # duplicates and large jumps
+    timestamps.append(timestamps[-1] + 10 ** 12)
+    bits = BitWriter()
+    encode_timestamps(bits, timestamps)
+    assert decode_timestamps(BitReader(bits.to_bytes()), len(timestamps)) == timestamps
+
+def test_float_round_trip():
+    values = [0.0, 1.5, 1.5, -3.25, None, float("inf"), 1e-300, 123456.789, None, 2 ** 52, -0.0]
+    values += [random.uniform(-1e6, 1e6) for _ in range(200)]
+    bits = BitWriter()
+    encode_floats(bits, values)
+    decoded = [_bits_to_value(raw, "f") for raw in decode_floats(BitReader(bits.to_bytes()), len(values))]
+    assert decoded == values
+    nan_bits = BitWriter()
+    encode_floats(nan_bits, [float("nan")])
+    assert math.isnan(_bits_to_value(decode_floats(BitReader(nan_bits.to_bytes()), 1)[0], "f"))
+
+def test_block_round_trip_and_compression():
+    timestamps = [1_771_840_800_000 + i * 60_000 for i in range(1440)]
+    rows = [{
+        "total_power_import_kwh": round(12345.678 + i * 0.004, 3),
+        "total_gas_m3": round(4321.5 + (i // 30) * 0.01, 3),
+        "active_tariff": 1 + (i // 720),
+        "wifi_ssid": "home",
+        "active_power_w": None if i % 100 == 0 else 350 + (i % 7),
+    } for i in range(1440)]
+    block = encode_block(timestamps, rows)
+
+    [(header, decoded_ts, columns)] = list(iter_blocks(block))
+    assert decoded_ts == timestamps
+    assert columns["total_power_import_kwh"] == [r["total_power_import_kwh"] for r in rows]
+    assert columns["active_tariff"] == [r["active_tariff"] for r in rows]
+    assert isinstance(columns["active_tariff"][0], int)
+    assert columns["active_power_w"] == [r["active_power_w"] for r in rows]
+    assert columns["wifi_ssid"] == ["home"] * 1440
+
+    # Versus 8 bytes per timestamp and per numeric value
+    raw_size = 1440 * 8 * 5
+    assert raw_size / len(block) > 4
+
+    # Range filtering skips the block entirely
+    assert list(iter_blocks(block, start_ms=timestamps[-1] + 1)) == []
+
+def test_block_with_non_finite_values():
+    timestamps = [1_771_840_800_000, 1_771_840_860_000, 1_771_840_920_000]
+    rows = [
+        {"status": float("nan"), "temperature": 21.5, "power": 3},
+        {"status": "text", "temperature": float("inf"), "power": 4},
+        {"status": None, "temperature": None, "power": 5},
+    ]
+    [(header, decoded_ts, columns)] = list(iter_blocks(encode_block(timestamps, rows)))
+    assert decoded_ts == timestamps
+    # A non-finite value does not decide the encoding before the rest of the column is seen
+    assert math.isnan(columns["status"][0]) and columns["status"][1:] == ["text", None]
+    assert columns["temperature"] == [21.5, float("inf"), None]
+    assert columns["power"] == [3, 4, 5]
+
+@pytest.mark.asyncio
+async def test_segment_backend_partitions_and_range_reads(tmp_path):
+    backend = SegmentBackend(tmp_path / "segments", partition="day", block_size=10)
+    for hour in range(48):
+        day = 23 + hour // 24
+        await backend.write({
+            "timestamp": f"2026-02-{day:02d}T{hour % 24:02d}:00:00Z",
+            "power": float(hour), "mode": "Auto" if hour % 2 else "Eco",
+        }, "energy")
+    await backend.close()
+
+    source_dir = tmp_path / "segments" / "energy"
+    assert sorted(p.name for p in source_dir.glob("*.seg")) == ["2026-02-23.seg", "2026-02-24.seg"]
+    index = SegmentBackend.load_index(source_dir)
+    assert index["2026-02-23.seg"][2] == 24
+
+    start, end = epoch_ms("2026-02-23T22:00:00Z"), epoch_ms("2026-02-24T01:00:00Z")
+    rows = backend.read_range("energy", start, end)
+    assert [r["power"] for r in rows] == [22.0, 23.0, 24.0, 25.0]
+    assert rows[0]["timestamp"] == "2026-02-23T22:00:00Z"
+    assert rows[1]["mode"] == "Auto"
+
+    columns = backend.read_columns("energy")
+    assert len(columns["ts_ms"]) == 48
+    assert columns["ts_ms"] == sorted(columns["ts_ms"])
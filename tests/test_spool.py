@@ -0,0 +1,115 @@
+import pytest
+import asyncio
+import sqlite3
+from dvm_mesura.backends.spool import Spool, SpooledBackend
+from dvm_mesura.backends.sqlite import SQLiteBackend
+
+class FlakyBackend:
+    """Fails (or hangs) while ``down`` is set."""
+
+    def __init__(self):
+        self.down = None
+        self.rows = []
+        self.calls = 0
+
+    async def write_many(self, rows, source_name):
+        self.calls += 1
+        if self.down == "error":
+            raise OSError("No space left on device")
+        if self.down == "slow":
+            await asyncio.sleep(10)
+        self.rows.extend((source_name, row["n"]) for row in rows)
+
+    async def close(self):
+        pass
+
+def test_spool_journal_recovers_torn_tail(tmp_path):
+    spool = Spool(tmp_path / "test.journal")
+    for n in range(5):
+        spool.append("energy", {"n": n})
+    batch = spool.read_batch(3)
+    assert [row["n"] for _, _, row in batch] == [0, 1, 2]
+    spool.consume(batch[-1][0])
+
+    # Simulate a crash in the middle of an append
+    with open(tmp_path / "test.journal", "ab") as f:
+        f.write(b"\x00\x00\x01\x00garbage")
+
+    reopened = Spool(tmp_path / "test.journal")
+    assert [row["n"] for _, _, row in reopened.read_batch(100)] == [3, 4]
+    reopened.consume(reopened.read_batch(100)[-1][0])
+    assert not reopened.pending
+    assert (tmp_path / "test.journal").stat().st_size == 0
+
+@pytest.mark.asyncio
+async def test_spooled_backend_replays_in_order(tmp_path):
+    inner = FlakyBackend()
+    backend = SpooledBackend(inner, tmp_path / "flaky.journal", timeout=0.05, batch_size=4, retry_interval=0.01)
+
+    await backend.write({"n": 0}, "energy")
+    inner.down = "error"
+    await backend.write({"n": 1}, "energy")
+    inner.down = "slow"
+    await backend.write({"n": 2}, "weather")
+    assert backend.spool.pending
+    for n in range(3, 10):
+        await backend.write({"n": n}, "energy" if n % 3 else "weather")
+
+    inner.down = None
+    await backend._replay_task
+    assert not backend.spool.pending
+    assert [n for _, n in inner.rows] == list(range(10))
+    assert ("weather", 2) in inner.rows
+    assert backend.spooled == 9
+    await backend.close()
+
+@pytest.mark.asyncio
+async def test_spooled_sqlite_survives_restart(tmp_path):
+    journal = tmp_path / "spool" / "monitor.db.journal"
+    spool = Spool(journal)
+    spool.append("energy", {"timestamp": "2026-02-23T11:00:00Z", "power": 1})
+    spool.append("energy", {"timestamp": "2026-02-23T11:01:00Z", "power": 2})
+
+    backend = SpooledBackend(SQLiteBackend(tmp_path / "monitor.db"), journal)
+    await backend.write({"timestamp": "2026-02-23T11:02:00Z", "power": 3}, "energy")
+    await backend._replay_task
+    await backend.close()
+
+    with sqlite3.connect(tmp_path / "monitor.db") as conn:
+        assert [r[0] for r in conn.execute("SELECT power FROM energy ORDER BY ts_ms")] == [1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_spooled_backend_replays_without_new_writes(tmp_path):
+    journal = tmp_path / "flaky.journal"
+    Spool(journal).append("energy", {"n": 0})
+
+    # A backlog from a previous run is replayed as soon as the backend is created
+    inner = FlakyBackend()
+    backend = SpooledBackend(inner, journal, check_interval=0.01)
+    await backend._replay_task
+    assert inner.rows == [("energy", 0)]
+
+    # run() picks up rows that reached the spool without a write starting the replay
+    backend.spool.append("energy", {"n": 1})
+    runner = asyncio.create_task(backend.run())
+    await asyncio.sleep(0.05)
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    assert inner.rows == [("energy", 0), ("energy", 1)]
+    assert not backend.spool.pending
+    await backend.close()
+
+def test_spool_reads_batches_from_offset(tmp_path):
+    spool = Spool(tmp_path / "big.journal")
+    spool.READ_BUFFER = 256
+    for n in range(50):
+        # Some records are larger than the read buffer
+        spool.append("energy", {"n": n, "pad": "x" * (1000 if n % 7 == 0 else 10)})
+
+    seen = []
+    while spool.pending:
+        batch = spool.read_batch(8)
+        assert 0 < len(batch) <= 8
+        seen += [row["n"] for _, _, row in batch]
+        spool.consume(batch[-1][0])
+    assert seen == list(range(50))